@@ -0,0 +1,188 @@
+# backend/cache.py
+"""
+Caché de respuestas para los listados de catálogo y disponibilidad.
+
+Cada viewset con `RespuestaCacheadaMixin` declara de qué grupos de datos
+depende (`cache_grupos`). La clave de una respuesta combina la vista, la
+versión actual de esos grupos, el alcance del usuario (rol y, donde el
+contenido depende de él, su perfil) y la ruta con el query string.
+
+Invalidar no borra nada: `invalidar()` sube la versión del grupo y las
+claves antiguas dejan de usarse hasta que caducan (`TTL`). Las señales de
+`practicas.signals` lo hacen en cada post_save/post_delete; las escrituras
+en bloque (bulk_create, UPDATE) lo llaman a mano. Dentro de una
+transacción la versión se sube ya y otra vez al hacer commit, para que
+nadie guarde con la versión nueva lo que leyó antes del commit.
+
+Cuando muchas peticiones fallan a la vez la misma clave, solo la que
+consigue el candado (`cache.add`) calcula la respuesta; el resto espera a
+que aparezca en la caché durante `ESPERA` segundos como mucho.
+
+La invalidación solo funciona si todos los workers ven la misma caché
+(Redis, con `REDIS_URL`). Con LocMem cada proceso tendría sus propias
+versiones y los demás seguirían sirviendo lo antiguo hasta el `TTL`, así
+que el mixin solo cachea con `CACHE_RESPUESTAS` (Redis, o desarrollo y
+tests, que corren en un único proceso).
+
+`CacheLocal` es lo contrario: datos pequeños y casi fijos (el orden de
+fases, el mapa de alias de zona) que se guardan en la memoria del propio
+proceso para leerlos sin consultas.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from usuarios.roles import rol_de
+
+TTL = 300
+ESPERA = 5          # segundos que un worker espera a otro antes de calcular
+PAUSA = 0.05
+PREFIJO = 'api'
+
+
+def _clave_version(grupo):
+    return f'{PREFIJO}:v:{grupo}'
+
+
+def versiones(grupos):
+    """Versión actual de cada grupo; los que no existen nacen ahora."""
+    claves = [_clave_version(g) for g in grupos]
+    actuales = cache.get_many(claves)
+    for clave in claves:
+        if clave not in actuales:
+            # time_ns: no repite una versión anterior si la clave se perdió
+            cache.add(clave, time.time_ns(), None)
+            actuales[clave] = cache.get(clave)
+    return [actuales[c] for c in claves]
+
+
+def _subir(grupos):
+    for grupo in grupos:
+        clave = _clave_version(grupo)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, time.time_ns(), None)
+
+
+def invalidar(*grupos):
+    """Sube la versión de `grupos` ahora y, si hay transacción, al hacer commit."""
+    _subir(grupos)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _subir(grupos))
+
+
+def obtener(clave, calcular):
+    """
+    Valor de `clave` o, si falta, el de `calcular()`. Solo un worker
+    calcula a la vez; los demás esperan a su resultado.
+    """
+    valor = cache.get(clave)
+    if valor is not None:
+        return valor, True
+
+    candado = f'{clave}:calculando'
+    if not cache.add(candado, 1, ESPERA):
+        limite = time.monotonic() + ESPERA
+        while time.monotonic() < limite:
+            time.sleep(PAUSA)
+            valor = cache.get(clave)
+            if valor is not None:
+                return valor, True
+    try:
+        valor = calcular()
+        if valor is not None:
+            cache.set(clave, valor, TTL)
+    finally:
+        cache.delete(candado)
+    return valor, False
+
+
+class RespuestaCacheadaMixin:
+    """
+    Cachea `list` y `retrieve`. Los permisos ya se comprobaron en
+    `initial()`, así que una respuesta cacheada nunca salta la autorización.
+    """
+    cache_grupos = ()
+
+    def alcance_cache(self, request):
+        """Parte de la clave que depende del usuario; por defecto, su rol."""
+        if request.user.is_staff:
+            return 'admin'
+        return rol_de(request.user).nombre
+
+    def _cacheada(self, request, vista):
+        if not getattr(settings, 'CACHE_RESPUESTAS', False):
+            return vista()
+        ruta = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        version = '.'.join(str(v) for v in versiones(self.cache_grupos))
+        clave = (f'{PREFIJO}:r:{self.basename}:{self.action}:{version}:'
+                 f'{self.alcance_cache(request)}:{ruta}')
+
+        sin_cachear = []
+
+        def calcular():
+            response = vista()
+            if response.status_code != 200:
+                # Solo se guardan las respuestas correctas
+                sin_cachear.append(response)
+                return None
+            return response.data
+
+        datos, acierto = obtener(clave, calcular)
+        if sin_cachear:
+            return sin_cachear[0]
+        response = Response(datos)
+        response['X-Cache'] = 'HIT' if acierto else 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        vista = super().list
+        return self._cacheada(request, lambda: vista(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        vista = super().retrieve
+        return self._cacheada(request, lambda: vista(request, *args, **kwargs))
+
+
+class CacheLocal:
+    """
+    Valor que `cargar()` calcula una vez por proceso y que después se lee
+    sin consultas. Los receptores de señales llaman a `invalidar` al
+    cambiar los datos, pero eso solo alcanza al worker que hizo el cambio:
+    cada proceso tiene su propia copia, así que además caduca a los `ttl`
+    segundos y los demás recargan como mucho con ese retraso.
+    """
+
+    def __init__(self, cargar, ttl=TTL):
+        self._cargar = cargar
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._valor = None
+        self._cargado_en = None
+
+    @property
+    def cargado(self):
+        return self._cargado_en is not None
+
+    def _caducado(self):
+        return (self._cargado_en is None
+                or time.monotonic() - self._cargado_en > self.ttl)
+
+    def obtener(self):
+        if self._caducado():
+            with self._lock:
+                if self._caducado():
+                    self._valor = self._cargar()
+                    self._cargado_en = time.monotonic()
+        return self._valor
+
+    def invalidar(self, **kwargs):
+        """La próxima lectura recarga; sirve directamente como receptor."""
+        with self._lock:
+            self._cargado_en = None
@@ -0,0 +1,175 @@
+# backend/instrumentacion.py
+"""
+Consultas y tiempo de base de datos por petición.
+
+`InstrumentacionMiddleware` envuelve la ejecución de SQL de todas las
+conexiones (`execute_wrapper`) mientras dura la petición y, al terminar:
+
+- Añade `Server-Timing: db;dur=..;desc="N consultas", total;dur=..`,
+  que el navegador muestra en la pestaña de red. Solo con DEBUG o para
+  staff: a cualquier otro le diría cuánto tarda la BD en cada ruta.
+- Escribe una línea en el logger `backend.consultas` (INFO) con método,
+  ruta, vista, acción, consultas, ms de BD y ms totales también como
+  atributos del registro (`extra`), para formateadores JSON.
+- Avisa (WARNING) si la misma sentencia se repite `REPETIDAS_AVISO` veces
+  o más (el patrón típico de un N+1) y si la vista supera su presupuesto.
+- Registra las consultas de más de `INSTRUMENTACION_LENTA_MS`, como mucho
+  `MAX_EXPLAIN` por petición. El plan (`EXPLAIN`, solo de los SELECT) no
+  lo pide el middleware sino el filtro `PlanMuestreado` del logger: solo
+  si el aviso llega a emitirse y solo para la fracción
+  `INSTRUMENTACION_MUESTREO_EXPLAIN` de ellos, para no duplicar en cada
+  petición lenta la consulta que ya era lenta.
+
+Cada vista puede declarar cuántas consultas le caben con
+`presupuesto_consultas`: un entero o un dict por acción del viewset, con
+'*' para el resto, p. ej. `{"list": 1, "*": 4}`. `backend.testing` hace
+que cualquier test que lo supere falle.
+
+En las respuestas en streaming solo se mide lo que pasa hasta que la vista
+devuelve la respuesta; las filas que se leen al enviar el cuerpo no.
+"""
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.dispatch import Signal
+
+logger = logging.getLogger('backend.consultas')
+
+REPETIDAS_AVISO = 5
+MAX_EXPLAIN = 3
+
+# Se envía al terminar cada petición medida (sender = clase de la vista o None)
+peticion_medida = Signal()
+
+
+def presupuesto_de(vista, accion):
+    """Consultas que admite `accion` de `vista`, o None si no declara."""
+    presupuesto = getattr(vista, 'presupuesto_consultas', None)
+    if isinstance(presupuesto, dict):
+        return presupuesto.get(accion, presupuesto.get('*'))
+    return presupuesto
+
+
+class Medicion:
+    """`execute_wrapper` que cuenta las consultas y su duración."""
+
+    def __init__(self, lenta_ms):
+        self.lenta = lenta_ms / 1000
+        self.consultas = 0
+        self.segundos = 0.0
+        self.sentencias = Counter()
+        self.lentas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.consultas += 1
+            self.segundos += duracion
+            self.sentencias[sql] += 1
+            if duracion >= self.lenta and not many:
+                self.lentas.append((context['connection'], sql, params, duracion))
+
+    @property
+    def repetida(self):
+        """(veces, sql) de la sentencia que más se repite."""
+        if not self.sentencias:
+            return 0, None
+        sql, veces = self.sentencias.most_common(1)[0]
+        return veces, sql
+
+
+def explicar(connection, sql, params):
+    """Plan de una consulta, en texto; None si no se puede obtener."""
+    if not sql.lstrip()[:6].upper().startswith(('SELECT', 'WITH')):
+        return None
+    try:
+        prefijo = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefijo} {sql}', params)
+            return '\n'.join(str(fila[-1]) for fila in cursor.fetchall())
+    except DatabaseError as exc:  # p. ej. transacción abortada
+        return f'(sin plan: {exc})'
+
+
+class PlanMuestreado(logging.Filter):
+    """
+    Filtro del logger `backend.consultas`: añade el plan a una parte de los
+    avisos de consulta lenta. Corre en el hilo de la petición, con su
+    conexión, y solo para los registros que superan el nivel del logger.
+    """
+
+    def filter(self, record):
+        consulta = record.__dict__.pop('consulta', None)
+        muestreo = getattr(settings, 'INSTRUMENTACION_MUESTREO_EXPLAIN', 1.0)
+        if consulta is not None and random.random() < muestreo:
+            record.msg = f'{record.msg}\n%s'
+            record.args = (*record.args, explicar(*consulta) or '(sin plan)')
+        return True
+
+
+class InstrumentacionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = Medicion(getattr(settings, 'INSTRUMENTACION_LENTA_MS', 200))
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for connection in connections.all():
+                pila.enter_context(connection.execute_wrapper(medicion))
+            response = self.get_response(request)
+        total = time.perf_counter() - inicio
+
+        user = getattr(request, 'user', None)
+        if getattr(settings, 'INSTRUMENTACION_SERVER_TIMING', True) and (
+                settings.DEBUG or getattr(user, 'is_staff', False)):
+            response['Server-Timing'] = (
+                f'db;dur={medicion.segundos * 1000:.1f};desc="{medicion.consultas} consultas", '
+                f'total;dur={total * 1000:.1f}')
+        self.registrar(request, response, medicion, total)
+        return response
+
+    def registrar(self, request, response, medicion, total):
+        match = getattr(request, 'resolver_match', None)
+        vista = getattr(match and match.func, 'cls', None)
+        accion = getattr(match and match.func, 'actions', {}).get(request.method.lower())
+        nombre = vista.__name__ if vista else (match.view_name if match else '-')
+        datos = {
+            'metodo': request.method,
+            'ruta': request.path,
+            'estado': response.status_code,
+            'vista': nombre,
+            'accion': accion,
+            'consultas': medicion.consultas,
+            'bd_ms': round(medicion.segundos * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }
+        logger.info(
+            '%(metodo)s %(ruta)s %(estado)s: %(consultas)s consultas, '
+            '%(bd_ms)s ms de BD en %(total_ms)s ms', datos, extra=datos)
+
+        veces, sql = medicion.repetida
+        if veces >= REPETIDAS_AVISO:
+            logger.warning('%s %s: la misma consulta %s veces (¿N+1?): %s',
+                           request.method, request.path, veces, sql, extra=datos)
+
+        presupuesto = presupuesto_de(vista, accion)
+        if presupuesto is not None and medicion.consultas > presupuesto:
+            logger.warning('%s.%s: %s consultas, presupuesto %s',
+                           nombre, accion, medicion.consultas, presupuesto, extra=datos)
+
+        for connection, sql, params, duracion in medicion.lentas[:MAX_EXPLAIN]:
+            logger.warning('Consulta lenta (%.0f ms) en %s %s: %s',
+                           duracion * 1000, request.method, request.path, sql,
+                           extra=datos | {'consulta': (connection, sql, params)})
+
+        peticion_medida.send(sender=vista, request=request, accion=accion,
+                             medicion=medicion, presupuesto=presupuesto)
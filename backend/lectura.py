@@ -0,0 +1,123 @@
+# backend/lectura.py
+"""
+Listados de solo lectura sobre `.values()`.
+
+Un `ModelSerializer` con `many=True` crea una instancia del modelo por fila
+(más las relacionadas del select_related) y pasa cada valor por su campo
+de serializer. En los listados grandes eso cuesta bastante más CPU que la
+propia consulta.
+
+Una `LecturaRapida` declara las columnas que necesita (`campos`, rutas de
+`.values()`) y convierte cada fila, un dict, en la misma salida que su
+serializer (`serializer_class`): mismas claves, en el mismo orden y con
+los mismos formatos. Las claves se pueden pedir sin filas con `columnas()`.
+Los textos de las opciones (`get_estado_display`) se calculan una vez por
+listado con `opciones()`.
+
+`ListadoRapidoMixin` la usa en la acción `list` de un viewset. El queryset
+sigue saliendo de `get_queryset()`/`filter_queryset()`, así que los
+filtros por dueño no cambian, y la paginación por cursor acepta dicts
+siempre que el primer campo de `ordering` esté en `campos`. El resto de
+acciones (detalle, escrituras) siguen con el serializer normal.
+"""
+from django.utils.encoding import force_str
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+
+def opciones(choices):
+    """{valor: texto} de unas choices, como lo devuelve get_FOO_display."""
+    return {valor: force_str(texto) for valor, texto in choices}
+
+
+def _es_iso(formato):
+    return formato is not None and formato.lower() == ISO_8601
+
+
+def formato_fecha_hora():
+    """
+    `DateTimeField().to_representation` con la zona horaria resuelta una
+    sola vez; lo que no sea el caso normal (ISO 8601, valor con zona) lo
+    formatea el propio campo de DRF.
+    """
+    campo = serializers.DateTimeField()
+    zona = campo.default_timezone()
+    if not _es_iso(api_settings.DATETIME_FORMAT) or zona is None:
+        return campo.to_representation
+
+    def formatear(valor):
+        if valor is None:
+            return None
+        if valor.tzinfo is None:
+            return campo.to_representation(valor)
+        texto = valor.astimezone(zona).isoformat()
+        return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+    return formatear
+
+
+def formato_fecha():
+    campo = serializers.DateField()
+    if not _es_iso(api_settings.DATE_FORMAT):
+        return campo.to_representation
+    return lambda valor: None if valor is None else valor.isoformat()
+
+
+def nombre_completo(nombre, apellidos):
+    """`AbstractUser.get_full_name` sin la instancia."""
+    return f'{nombre} {apellidos}'.strip()
+
+
+def _claves(serializer, prefijo=''):
+    for nombre, campo in serializer.fields.items():
+        if campo.write_only:
+            continue
+        if isinstance(campo, serializers.Serializer):
+            yield from _claves(campo, f'{prefijo}{nombre}.')
+        else:
+            yield f'{prefijo}{nombre}'
+
+
+class LecturaRapida:
+    """
+    Base de las lecturas rápidas. Las subclases definen `campos`,
+    `serializer_class` y `representar(fila)`; los formateadores se
+    preparan en `__init__`, una vez por listado.
+    """
+    campos = ()
+    serializer_class = None
+
+    @classmethod
+    def columnas(cls):
+        """
+        Claves de `representar()`, en orden y con los anidados como
+        'padre.hijo', sacadas de los campos de lectura del serializer.
+        """
+        return list(_claves(cls.serializer_class()))
+
+    def __init__(self):
+        self.fecha_hora = formato_fecha_hora()
+        self.fecha = formato_fecha()
+
+    def representar(self, fila):
+        raise NotImplementedError
+
+    def serializar(self, filas):
+        representar = self.representar
+        return [representar(fila) for fila in filas]
+
+
+class ListadoRapidoMixin:
+    """Sirve `list` con `lectura_class` en vez de con el serializer."""
+    lectura_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.lectura_class is None:
+            return super().list(request, *args, **kwargs)
+        lectura = self.lectura_class()
+        filas = self.filter_queryset(self.get_queryset()).values(*lectura.campos)
+
+        page = self.paginate_queryset(filas)
+        if page is not None:
+            return self.get_paginated_response(lectura.serializar(page))
+        return Response(lectura.serializar(filas))
@@ -0,0 +1,109 @@
+# backend/middleware.py
+"""
+Compresión de las respuestas de la API con Brotli o gzip.
+
+Se elige la codificación según `Accept-Encoding` (br antes que gzip, con
+los valores q del cliente) y solo se comprimen respuestas JSON de al menos
+`COMPRESION_MINIMO` bytes. Las respuestas en streaming, las
+ya comprimidas (p. ej. estáticos de WhiteNoise) y las que crecerían se
+devuelven tal cual.
+
+Ajustes:
+- `COMPRESION_MINIMO` (bytes, 1024 por defecto)
+- `COMPRESION_CALIDAD_BR` (0-11, 4 por defecto: casi tan rápido como gzip
+  y bastante más pequeño; 11 es para estáticos precomprimidos)
+- `COMPRESION_NIVEL_GZIP` (1-9, 6 por defecto)
+
+El HTML (admin de Django, API navegable de DRF) no se comprime: usa la
+cookie de sesión y lleva el token CSRF en la página, junto a texto que
+puede controlar un tercero, justo lo que aprovecha BREACH. La API en JSON
+se autentica con el JWT de la cabecera Authorization, sin cookies ni CSRF.
+"""
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # sin Brotli solo se ofrece gzip
+    brotli = None
+
+# application/json y sus variantes (problem+json, vnd.*+json)
+TIPOS_COMPRIMIBLES = re.compile(r'^application/(json|[\w.+-]+\+json)\s*(;|$)')
+
+
+def _ajuste(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def comprimir_br(contenido):
+    return brotli.compress(contenido, quality=_ajuste('COMPRESION_CALIDAD_BR', 4))
+
+
+def comprimir_gzip(contenido):
+    # mtime=0: mismo contenido, mismos bytes (ETag y cachés estables)
+    return gzip.compress(
+        contenido, compresslevel=_ajuste('COMPRESION_NIVEL_GZIP', 6), mtime=0)
+
+
+COMPRESORES = {'gzip': comprimir_gzip}
+if brotli is not None:
+    COMPRESORES = {'br': comprimir_br, **COMPRESORES}
+
+
+def elegir_codificacion(accept_encoding):
+    """Primera codificación soportada con q > 0, por preferencia del cliente."""
+    aceptadas = {}
+    for parte in accept_encoding.split(','):
+        nombre, _, parametros = parte.strip().partition(';')
+        q = 1.0
+        if (m := re.search(r'q=([\d.]+)', parametros)):
+            try:
+                q = float(m.group(1))
+            except ValueError:
+                q = 0.0
+        aceptadas[nombre.strip().lower()] = q
+    comodin = aceptadas.get('*', 0.0)
+
+    candidatas = [(aceptadas.get(nombre, comodin), -i, nombre)
+                  for i, nombre in enumerate(COMPRESORES)]
+    q, _, nombre = max(candidatas)
+    return nombre if q > 0 else None
+
+
+class CompresionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.comprimir(request, response)
+
+    def comprimir(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not TIPOS_COMPRIMIBLES.match(response.get('Content-Type', '')):
+            return response
+
+        # A partir de aquí la respuesta depende de Accept-Encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < _ajuste('COMPRESION_MINIMO', 1024):
+            return response
+        codificacion = elegir_codificacion(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if codificacion is None:
+            return response
+
+        comprimido = COMPRESORES[codificacion](response.content)
+        if len(comprimido) >= len(response.content):
+            return response
+
+        response.content = comprimido
+        response['Content-Length'] = str(len(comprimido))
+        response['Content-Encoding'] = codificacion
+        # Misma semántica que GZipMiddleware: la ETag fuerte deja de valer
+        if (etag := response.get('ETag')) and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,76 @@
+# backend/pagination.py
+"""
+Paginación por cursor para todos los listados de la API.
+
+`PageNumberPagination` hacía un COUNT(*) por página y un OFFSET que crece
+con el histórico. Con cursor cada página es un WHERE sobre el primer campo
+del orden (que tiene índice) más un LIMIT, así que la página 1000 cuesta lo
+mismo que la primera.
+
+Cada viewset declara su orden en el atributo `ordering`, por ejemplo
+`("fecha_inscripcion", "id")`. El cursor de DRF guarda solo el valor del
+primer campo: el resto ordena pero no entra en el WHERE, y las filas que
+comparten ese valor se saltan con OFFSET. Por eso el primer campo tiene
+que ser único o casi (fechas con hora, `id`); un campo con muchas
+repeticiones, como la fecha de una salida, vuelve a un OFFSET que crece
+dentro de cada valor.
+
+El total no se calcula. Con `?total=1` la respuesta incluye
+`total_estimado`, que en PostgreSQL sale de las estadísticas del
+planificador (EXPLAIN) y en el resto de motores es null.
+"""
+import json
+
+from django.db import connections
+from rest_framework.pagination import CursorPagination
+
+
+def estimar_total(queryset):
+    """Filas estimadas por el planificador, sin recorrer la tabla."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CursorPaginacion(CursorPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('id',)
+    total_query_param = 'total'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.total_estimado = None
+        if request.query_params.get(self.total_query_param) in ('1', 'true'):
+            self.total_estimado = estimar_total(queryset)
+            self.incluir_total = True
+        else:
+            self.incluir_total = False
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.incluir_total:
+            response.data['total_estimado'] = self.total_estimado
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['total_estimado'] = {
+            'type': 'integer',
+            'nullable': True,
+            'example': 1200,
+        }
+        return schema
@@ -0,0 +1,77 @@
+# backend/renderers.py
+"""
+Renderer y parser JSON de la API sobre orjson, si está instalado.
+
+La salida es idéntica byte a byte a la de `rest_framework.renderers.
+JSONRenderer` con la configuración por defecto (compacta, UTF-8 sin
+escapar, \\u2028 y \\u2029 escapados):
+
+- Fechas, horas, Decimal, UUID, cadenas perezosas de traducción, bytes,
+  querysets... no los formatea orjson sino el mismo `JSONEncoder`
+  de DRF, que orjson llama como `default`.
+- Si orjson no puede con algo (enteros de más de 64 bits, claves raras)
+  se repite con el renderer de DRF, que da su salida o su error de siempre.
+- Con sangría (`; indent=4`, API navegable) se usa directamente DRF.
+
+Diferencias que quedan, ninguna alcanzable con los modelos actuales:
+floats en notación exponencial (`1e16` en vez de `1e+16`) y NaN/Infinity,
+que orjson escribe como null en vez de fallar.
+
+El parser lee con orjson y, si falla o el cuerpo trae números de 19 cifras
+o más (que orjson convertiría en float), repite con el de DRF, así que
+acepta lo mismo y devuelve los mismos valores y mensajes de error.
+"""
+import io
+import re
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # sin orjson todo va por la librería estándar
+    orjson = None
+
+if orjson is not None:
+    OPCIONES = (orjson.OPT_PASSTHROUGH_DATETIME
+                | orjson.OPT_PASSTHROUGH_DATACLASS
+                | orjson.OPT_NON_STR_KEYS)
+
+_ENCODER = JSONEncoder()
+
+# orjson lee los enteros de más de 64 bits como float; json, como int
+_NUMERO_LARGO = re.compile(rb'\d{19}')
+
+
+class JSONRapidoRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_ENCODER.default, option=OPCIONES)
+        except TypeError:  # orjson.JSONEncodeError es un TypeError
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class JSONRapidoParser(JSONParser):
+    renderer_class = JSONRapidoRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        contenido = stream.read()
+        if _NUMERO_LARGO.search(contenido):
+            return super().parse(io.BytesIO(contenido), media_type, parser_context)
+        try:
+            return orjson.loads(contenido)
+        except orjson.JSONDecodeError:
+            # El mensaje de error (o lo que orjson no acepta) lo decide DRF
+            return super().parse(io.BytesIO(contenido), media_type, parser_context)
+
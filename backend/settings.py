@@ -62,8 +62,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Consultas y tiempo de BD por petición (Server-Timing y logs)
+    'backend.instrumentacion.InstrumentacionMiddleware',
     # Middleware para CORS
     'corsheaders.middleware.CorsMiddleware',
+    # Compresión br/gzip de las respuestas (antes que cualquiera que lea el cuerpo)
+    'backend.middleware.CompresionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -112,6 +116,28 @@ DATABASES = {
     )
 
 }
+
+# Caché (respuestas de la API, ver backend/cache.py)
+# Con REDIS_URL se comparte entre workers; si no, memoria local del proceso
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Caché de respuestas: las versiones de backend/cache.py tienen que verlas
+# todos los workers. LocMem es de un solo proceso, así que sin Redis solo
+# se activa en desarrollo (runserver, tests).
+CACHE_RESPUESTAS = bool(REDIS_URL) or DEBUG
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -166,22 +192,72 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         # 🔥 Usar JWT en lugar de sesión
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT con el rol en los claims: sin consulta de usuario por petición
+        'usuarios.authentication.JWTConRol',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         # Solo usuarios autenticados pueden acceder a la API
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # JSON con orjson si está instalado (misma salida que el de DRF)
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.renderers.JSONRapidoRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'backend.renderers.JSONRapidoParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     # ———————— Paginación ————————
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Por cursor sobre el campo `ordering` de cada viewset (sin COUNT ni OFFSET);
+    # ?page_size= hasta 100 y ?total=1 para un total estimado
+    'DEFAULT_PAGINATION_CLASS': 'backend.pagination.CursorPaginacion',
     'PAGE_SIZE': 10,  # Número de items por página (ajusta a tu necesidad)
 
 }
 
+# Compresión de respuestas (backend/middleware.py)
+COMPRESION_MINIMO = 1024          # bytes; por debajo no compensa
+COMPRESION_CALIDAD_BR = 4         # 0-11
+COMPRESION_NIVEL_GZIP = 6         # 1-9
+
+# Instrumentación de consultas (backend/instrumentacion.py)
+INSTRUMENTACION_LENTA_MS = 200    # a partir de aquí se registra
+# Fracción de consultas lentas registradas que llevan su EXPLAIN
+INSTRUMENTACION_MUESTREO_EXPLAIN = 1.0 if DEBUG else 0.05
+INSTRUMENTACION_SERVER_TIMING = True   # solo con DEBUG o para staff
+# Los tests fallan si una vista supera su `presupuesto_consultas`
+TEST_RUNNER = 'backend.testing.PresupuestoRunner'
+
+# Registro: avisos de consultas lentas, repetidas o fuera de presupuesto;
+# LOG_CONSULTAS=INFO añade una línea por petición
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'plan_consultas': {'()': 'backend.instrumentacion.PlanMuestreado'},
+    },
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'backend.consultas': {
+            'handlers': ['consola'],
+            'filters': ['plan_consultas'],
+            'level': os.environ.get('LOG_CONSULTAS', 'WARNING'),
+        },
+    },
+}
+
 # Configuración de JWT
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Añade rol, is_staff, profesor_id y alumno_id a los tokens
+    'TOKEN_OBTAIN_SERIALIZER': 'usuarios.serializers.TokenConRolSerializer',
+    # Y los vuelve a leer de la BD en cada refresco
+    'TOKEN_REFRESH_SERIALIZER': 'usuarios.serializers.TokenRefrescoConRolSerializer',
 
 }
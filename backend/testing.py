@@ -0,0 +1,53 @@
+# backend/testing.py
+"""
+Presupuesto de consultas en los tests.
+
+Con `TEST_RUNNER = 'backend.testing.PresupuestoRunner'`, cualquier
+petición de un test (cliente de Django o de DRF, que pasan por
+`backend.instrumentacion.InstrumentacionMiddleware`) que haga más
+consultas que el `presupuesto_consultas` de su vista hace fallar el test
+en esa misma petición, con la vista, la acción y las sentencias.
+
+Para un caso que a propósito se pasa (p. ej. medir el coste sin caché),
+`with sin_presupuesto(): ...`.
+"""
+from contextlib import contextmanager
+
+from django.test.runner import DiscoverRunner
+
+from backend.instrumentacion import peticion_medida
+
+_desactivado = [0]
+
+
+class PresupuestoSuperado(AssertionError):
+    pass
+
+
+@contextmanager
+def sin_presupuesto():
+    _desactivado[0] += 1
+    try:
+        yield
+    finally:
+        _desactivado[0] -= 1
+
+
+def comprobar_presupuesto(sender, request, accion, medicion, presupuesto, **kwargs):
+    if _desactivado[0] or presupuesto is None or medicion.consultas <= presupuesto:
+        return
+    sentencias = '\n'.join(f'  {veces}× {sql}'
+                           for sql, veces in medicion.sentencias.most_common())
+    raise PresupuestoSuperado(
+        f'{request.method} {request.path} ({sender.__name__}.{accion}): '
+        f'{medicion.consultas} consultas, presupuesto {presupuesto}\n{sentencias}')
+
+
+class PresupuestoRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        peticion_medida.connect(comprobar_presupuesto, dispatch_uid='presupuesto_consultas')
+
+    def teardown_test_environment(self, **kwargs):
+        peticion_medida.disconnect(dispatch_uid='presupuesto_consultas')
+        super().teardown_test_environment(**kwargs)
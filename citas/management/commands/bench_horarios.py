@@ -0,0 +1,98 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from citas.models import HorarioDisponible, ClasePractica
+from usuarios.models import User, Profesor
+
+
+class Command(BaseCommand):
+    help = ('Compara la búsqueda de huecos libres antigua (NOT IN) con '
+            '`HorarioDisponible.objects.disponibles` sobre datos sintéticos')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horarios', type=int, default=100_000)
+        parser.add_argument('--profesores', type=int, default=50)
+        parser.add_argument('--ocupacion', type=float, default=0.6,
+                            help='Fracción de huecos con clase reservada')
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Todo se deshace al terminar
+        with transaction.atomic():
+            profesores = self._sembrar(options)
+            self._medir(options, profesores)
+            transaction.set_rollback(True)
+
+    def _sembrar(self, options):
+        rnd = random.Random(options['semilla'])
+        sufijo = f'{rnd.getrandbits(32):08x}'
+        n, p = options['horarios'], options['profesores']
+
+        User.objects.bulk_create(
+            [User(username=f'bench-{sufijo}-p{i}', password='!',
+                  rol=User.Roles.PROFESOR) for i in range(p)]
+            + [User(username=f'bench-{sufijo}-alumno', password='!')])
+        usuarios = list(User.objects.filter(
+            username__startswith=f'bench-{sufijo}-p').values_list('id', flat=True))
+        alumno = User.objects.get(username=f'bench-{sufijo}-alumno')
+        Profesor.objects.bulk_create([Profesor(usuario_id=u) for u in usuarios])
+        profesores = list(Profesor.objects.filter(usuario_id__in=usuarios))
+
+        # Huecos de una hora repartidos en el pasado y el futuro
+        inicio = timezone.now().replace(minute=0, second=0, microsecond=0)
+        por_profesor = n // p
+        HorarioDisponible.objects.bulk_create([
+            HorarioDisponible(
+                profesor=profesor,
+                fecha_hora_inicio=inicio + timedelta(hours=h - por_profesor // 2),
+                fecha_hora_fin=inicio + timedelta(hours=h + 1 - por_profesor // 2))
+            for profesor in profesores for h in range(por_profesor)
+        ], batch_size=2000)
+        ids = list(HorarioDisponible.objects
+                   .filter(profesor__in=profesores).values_list('id', flat=True))
+        ClasePractica.objects.bulk_create([
+            ClasePractica(alumno=alumno, horario_id=h)
+            for h in rnd.sample(ids, int(len(ids) * options['ocupacion']))
+        ], batch_size=2000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(f'🌱 {len(ids)} huecos de {len(profesores)} profesores.')
+        return profesores
+
+    def _medir(self, options, profesores):
+        ahora = timezone.now()
+        semana = ahora + timedelta(days=7)
+        base = HorarioDisponible.objects.order_by('fecha_hora_inicio', 'id')
+        reservados = ClasePractica.objects.values_list('horario', flat=True)
+        casos = {
+            'NOT IN (antes)': lambda: base.exclude(id__in=reservados),
+            'NOT IN + semana': lambda: base.filter(
+                fecha_hora_inicio__gte=ahora, fecha_hora_inicio__lt=semana
+            ).exclude(id__in=reservados),
+            'disponibles()': lambda: base.disponibles(),
+            'disponibles(semana)': lambda: base.disponibles(hasta=semana),
+            'disponibles(semana, profesor)': lambda: base.disponibles(
+                hasta=semana, profesor=profesores[0]),
+        }
+        for nombre, consulta in casos.items():
+            # Primera página (LIMIT 10) y recuento de todo el resultado
+            tiempos, totales = [], []
+            for _ in range(options['repeticiones']):
+                t = time.perf_counter()
+                list(consulta()[:10].values_list('id', flat=True))
+                tiempos.append(time.perf_counter() - t)
+                t = time.perf_counter()
+                total = consulta().count()
+                totales.append(time.perf_counter() - t)
+            tiempos.sort()
+            totales.sort()
+            self.stdout.write(
+                f'{nombre:32} {total:7} huecos  '
+                f'página {tiempos[len(tiempos) // 2] * 1000:7.2f} ms  '
+                f'total {totales[len(totales) // 2] * 1000:7.2f} ms')
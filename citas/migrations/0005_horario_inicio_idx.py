@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0004_alter_horariodisponible_profesor_and_more'),
+        ('usuarios', '0003_alumno_zona_activa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='horariodisponible',
+            index=models.Index(fields=['fecha_hora_inicio'], name='horario_inicio_idx'),
+        ),
+    ]
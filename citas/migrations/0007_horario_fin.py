@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Least
+
+
+def rellenar_fin(apps, schema_editor):
+    # Cada hueco dura una hora o hasta el siguiente del mismo profesor, lo
+    # que llegue antes: con huecos a menos de 60 minutos un fin fijo
+    # solaparía y la restricción de exclusión no se podría crear.
+    HorarioDisponible = apps.get_model('citas', 'HorarioDisponible')
+    una_hora = F('fecha_hora_inicio') + timedelta(minutes=60)
+    siguiente = (HorarioDisponible.objects
+                 .filter(profesor_id=OuterRef('profesor_id'),
+                         fecha_hora_inicio__gt=OuterRef('fecha_hora_inicio'))
+                 .order_by('fecha_hora_inicio')
+                 .values('fecha_hora_inicio')[:1])
+    HorarioDisponible.objects.update(
+        fecha_hora_fin=Least(una_hora, Coalesce(Subquery(siguiente), una_hora)))
+
+
+def crear_exclusion(apps, schema_editor):
+    # Solo PostgreSQL tiene restricciones de exclusión; en el resto de
+    # motores el solape lo comprueban HorarioDisponible.objects.solapados
+    # y el barrido de citas.services.generar_horarios.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        'ALTER TABLE citas_horariodisponible ADD CONSTRAINT horario_sin_solape '
+        'EXCLUDE USING gist (profesor_id WITH =, '
+        "tstzrange(fecha_hora_inicio, fecha_hora_fin, '[)') WITH &&)")
+
+
+def borrar_exclusion(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE citas_horariodisponible DROP CONSTRAINT IF EXISTS horario_sin_solape')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0006_peticionidempotente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='horariodisponible',
+            name='fecha_hora_fin',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(rellenar_fin, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='horariodisponible',
+            name='fecha_hora_fin',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddConstraint(
+            model_name='horariodisponible',
+            constraint=models.CheckConstraint(condition=models.Q(('fecha_hora_fin__gt', models.F('fecha_hora_inicio'))), name='horario_fin_posterior_inicio'),
+        ),
+        migrations.RunPython(crear_exclusion, borrar_exclusion),
+    ]
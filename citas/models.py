@@ -1,26 +1,87 @@
+from datetime import timedelta
+
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Q
 from django.conf import settings
+from django.utils import timezone
 from usuarios.models import Profesor
 
 
+class HorarioDisponibleQuerySet(models.QuerySet):
+    def disponibles(self, desde=None, hasta=None, profesor=None):
+        """
+        Huecos sin clase reservada que empiezan en [desde, hasta).
+        `desde` es ahora por defecto, así que los huecos pasados no salen.
+        El rango usa el índice de `fecha_hora_inicio` (o el de
+        `unique_horario_por_profesor` si se filtra por profesor) y el
+        NOT EXISTS se resuelve con el índice único de `ClasePractica.horario`.
+        """
+        qs = self.filter(fecha_hora_inicio__gte=desde or timezone.now())
+        if hasta is not None:
+            qs = qs.filter(fecha_hora_inicio__lt=hasta)
+        if profesor is not None:
+            qs = qs.filter(profesor=profesor)
+        return qs.filter(~Exists(
+            ClasePractica.objects.filter(horario_id=OuterRef('pk'))))
+
+    def solapados(self, profesor, inicio, fin):
+        """
+        Huecos de `profesor` que se solapan con [inicio, fin). Como ningún
+        hueco dura más de DURACION_MAXIMA, el inicio queda acotado por los
+        dos lados y la búsqueda es un rango del índice
+        `unique_horario_por_profesor`.
+        """
+        return self.filter(
+            profesor=profesor,
+            fecha_hora_inicio__gt=inicio - HorarioDisponible.DURACION_MAXIMA,
+            fecha_hora_inicio__lt=fin,
+            fecha_hora_fin__gt=inicio,
+        )
+
+
 class HorarioDisponible(models.Model):
+    DURACION_DEFECTO = timedelta(minutes=60)
+    DURACION_MAXIMA = timedelta(hours=8)
+    # Dueño (ver citas.permissions.propios)
+    RUTA_PROFESOR = 'profesor'
+
     profesor = models.ForeignKey(
         Profesor,
         on_delete=models.CASCADE,
         related_name="horarios"
     )
     fecha_hora_inicio = models.DateTimeField()
+    fecha_hora_fin = models.DateTimeField()
+
+    objects = HorarioDisponibleQuerySet.as_manager()
 
     class Meta:
         constraints = [
             models.UniqueConstraint(
                 fields=['profesor', 'fecha_hora_inicio'],
                 name='unique_horario_por_profesor'
-            )
+            ),
+            models.CheckConstraint(
+                condition=Q(fecha_hora_fin__gt=F('fecha_hora_inicio')),
+                name='horario_fin_posterior_inicio'
+            ),
+            # En PostgreSQL además hay una restricción de exclusión
+            # (horario_sin_solape, migración 0007) que impide solapes.
+        ]
+        indexes = [
+            models.Index(fields=['fecha_hora_inicio'], name='horario_inicio_idx'),
         ]
 
+    def save(self, *args, **kwargs):
+        if self.fecha_hora_fin is None and self.fecha_hora_inicio:
+            self.fecha_hora_fin = self.fecha_hora_inicio + self.DURACION_DEFECTO
+        super().save(*args, **kwargs)
+
 
 class ClasePractica(models.Model):
+    RUTA_PROFESOR = 'horario__profesor'
+    RUTA_ALUMNO = 'alumno'
+
     alumno = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -33,3 +94,25 @@ class ClasePractica(models.Model):
 
     def __str__(self):
         return f"{self.alumno.username} - {self.horario.fecha_hora_inicio}"
+
+
+class PeticionIdempotente(models.Model):
+    """Respuesta guardada de una petición con cabecera Idempotency-Key"""
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="peticiones_idempotentes"
+    )
+    clave = models.CharField(max_length=255)
+    huella = models.CharField(max_length=64)
+    estado = models.PositiveSmallIntegerField()
+    respuesta = models.JSONField()
+    creada = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'clave'],
+                name='unique_idempotencia_por_usuario'
+            )
+        ]
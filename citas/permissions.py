@@ -1,9 +1,19 @@
 # 📌 Explicación:
 # ✅ EsAdmin → Solo los administradores (is_staff=True) pueden usar ciertos endpoints.
 # ✅ EsProfesor → Solo los usuarios que sean profesores pueden acceder a sus horarios.
+# ✅ EsProfesorDueño / EsAlumnoDueño → dueño según la ruta declarada en el modelo.
+#
+# Cada modelo con dueño declara de quién es:
+#   RUTA_PROFESOR = 'salida__profesor'   → FK a Profesor
+#   RUTA_ALUMNO = 'alumno'               → FK al usuario alumno
+# `propios()` convierte esas rutas en un filtro del queryset, así que listado,
+# detalle y acciones autorizan en la misma consulta que carga el objeto; los
+# permisos de objeto solo comparan ids ya cargados (select_related).
 
 from rest_framework import permissions
 
+from usuarios.roles import rol_de
+
 
 class EsAdmin(permissions.BasePermission):
     """Permiso que permite acceso solo a administradores"""
@@ -16,11 +26,44 @@ class EsProfesor(permissions.BasePermission):
     """Permite acceso solo a profesores para sus propios horarios"""
 
     def has_permission(self, request, view):
-        # Verifica si el usuario es un profesor
-        return hasattr(request.user, 'profesor')
+        # Verifica si el usuario es un profesor (claims del token, sin consulta)
+        return rol_de(request.user).es_profesor
+
+
+def _id_por_ruta(obj, ruta):
+    """Id al final de `ruta` ('salida__profesor' → obj.salida.profesor_id)."""
+    *saltos, ultimo = ruta.split('__')
+    for salto in saltos:
+        obj = getattr(obj, salto)
+    return getattr(obj, f'{ultimo}_id')
+
+
+def propios(queryset, user):
+    """
+    Restringe `queryset` a lo que `user` posee según las rutas del modelo.
+    El staff lo ve todo; sin ruta aplicable no se ve nada.
+    """
+    if user.is_staff:
+        return queryset
+    modelo, rol = queryset.model, rol_de(user)
+    ruta = getattr(modelo, 'RUTA_PROFESOR', None)
+    if rol.es_profesor and ruta:
+        return queryset.filter(**{f'{ruta}_id': rol.profesor_id})
+    ruta = getattr(modelo, 'RUTA_ALUMNO', None)
+    if ruta:
+        return queryset.filter(**{f'{ruta}_id': user.pk})
+    return queryset.none()
 
 
 class EsProfesorDueño(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         # obj puede ser una ClasePractica, HorarioDisponible, etc.
-        return hasattr(request.user, 'profesor') and obj.profesor == request.user.profesor
+        rol = rol_de(request.user)
+        ruta = getattr(obj, 'RUTA_PROFESOR', None)
+        return bool(ruta) and rol.es_profesor and _id_por_ruta(obj, ruta) == rol.profesor_id
+
+
+class EsAlumnoDueño(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        ruta = getattr(obj, 'RUTA_ALUMNO', None)
+        return bool(ruta) and _id_por_ruta(obj, ruta) == request.user.pk
@@ -1,6 +1,14 @@
+from datetime import datetime, timedelta
+
 from rest_framework import serializers
+
+from backend.lectura import LecturaRapida
+from usuarios.roles import rol_de
 from .models import Profesor, HorarioDisponible, ClasePractica
 
+MAX_HORARIOS_POR_PETICION = 5000
+SOLAPE = "El hueco se solapa con otro horario del profesor."
+
 
 class ProfesorSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,21 +20,53 @@ class HorarioDisponibleSerializer(serializers.ModelSerializer):
     class Meta:
         model = HorarioDisponible
         # El profesor se asigna en create()
-        fields = ['id', 'fecha_hora_inicio']
+        fields = ['id', 'fecha_hora_inicio', 'fecha_hora_fin']
+        extra_kwargs = {'fecha_hora_fin': {'required': False}}
 
     def validate(self, data):
         """Validar que el usuario que intenta crear el horario es un profesor"""
         request = self.context.get('request')
-        if not request or not hasattr(request.user, 'profesor'):
+        if not request or not rol_de(request.user).es_profesor:
             raise serializers.ValidationError(
                 "Solo los profesores pueden definir horarios.")
+
+        instancia = self.instance
+        inicio = data.get('fecha_hora_inicio', instancia and instancia.fecha_hora_inicio)
+        fin = data.get('fecha_hora_fin')
+        if fin is None:
+            fin = (instancia.fecha_hora_fin if instancia and 'fecha_hora_inicio' not in data
+                   else inicio + HorarioDisponible.DURACION_DEFECTO)
+        if not inicio < fin <= inicio + HorarioDisponible.DURACION_MAXIMA:
+            raise serializers.ValidationError(
+                {'fecha_hora_fin': "El hueco debe terminar después de empezar y durar 8 horas como mucho."})
+        data['fecha_hora_fin'] = fin
+
+        profesor = instancia.profesor_id if instancia else rol_de(request.user).profesor_id
+        solapados = HorarioDisponible.objects.solapados(profesor, inicio, fin)
+        if instancia:
+            solapados = solapados.exclude(pk=instancia.pk)
+        if solapados.exists():
+            raise serializers.ValidationError(SOLAPE)
         return data
 
     def create(self, validated_data):
         """Asignar el profesor a partir del usuario autenticado"""
         request = self.context.get('request')
-        profesor = request.user.profesor
-        return HorarioDisponible.objects.create(profesor=profesor, **validated_data)
+        validated_data.setdefault('profesor_id', rol_de(request.user).profesor_id)
+        return HorarioDisponible.objects.create(**validated_data)
+
+
+class HorarioDisponibleLectura(LecturaRapida):
+    """`HorarioDisponibleSerializer` para listados, sobre `.values()`."""
+    serializer_class = HorarioDisponibleSerializer
+    campos = ('id', 'fecha_hora_inicio', 'fecha_hora_fin')
+
+    def representar(self, fila):
+        return {
+            'id': fila['id'],
+            'fecha_hora_inicio': self.fecha_hora(fila['fecha_hora_inicio']),
+            'fecha_hora_fin': self.fecha_hora(fila['fecha_hora_fin']),
+        }
 
 
 class ClasePracticaSerializer(serializers.ModelSerializer):
@@ -39,3 +79,78 @@ class ClasePracticaSerializer(serializers.ModelSerializer):
         model = ClasePractica
         fields = ['id', 'alumno', 'alumno_username',
                   'horario', 'fecha_hora_inicio']
+
+
+class ClasePracticaLectura(LecturaRapida):
+    """`ClasePracticaSerializer` sobre `.values()` (exportaciones)."""
+    serializer_class = ClasePracticaSerializer
+    campos = ('id', 'alumno_id', 'alumno__username', 'horario_id',
+              'horario__fecha_hora_inicio')
+
+    def representar(self, fila):
+        return {
+            'id': fila['id'],
+            'alumno': fila['alumno_id'],
+            'alumno_username': fila['alumno__username'],
+            'horario': fila['horario_id'],
+            'fecha_hora_inicio': self.fecha_hora(fila['horario__fecha_hora_inicio']),
+        }
+
+
+class BloqueSerializer(serializers.Serializer):
+    inicio = serializers.TimeField()
+    fin = serializers.TimeField()
+
+    def validate(self, data):
+        if data['fin'] <= data['inicio']:
+            raise serializers.ValidationError("El bloque termina antes de empezar.")
+        return data
+
+
+class PatronHorariosSerializer(serializers.Serializer):
+    """
+    Patrón semanal de huecos: días de la semana (0 = lunes), horas de
+    inicio sueltas y/o bloques que se trocean en huecos de
+    `duracion_minutos`, rango de fechas y días excluidos.
+    """
+    profesor = serializers.PrimaryKeyRelatedField(
+        queryset=Profesor.objects.all(), required=False)
+    dias_semana = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6),
+        allow_empty=False)
+    horas = serializers.ListField(
+        child=serializers.TimeField(), required=False, default=list)
+    bloques = BloqueSerializer(many=True, required=False, default=list)
+    duracion_minutos = serializers.IntegerField(
+        min_value=15, max_value=480, default=60)
+    fecha_inicio = serializers.DateField()
+    fecha_fin = serializers.DateField()
+    excluir = serializers.ListField(
+        child=serializers.DateField(), required=False, default=list)
+
+    def validate(self, data):
+        if data['fecha_fin'] < data['fecha_inicio']:
+            raise serializers.ValidationError(
+                {'fecha_fin': "La fecha de fin es anterior a la de inicio."})
+        if (data['fecha_fin'] - data['fecha_inicio']).days > 366:
+            raise serializers.ValidationError(
+                {'fecha_fin': "El rango no puede superar un año."})
+
+        horas = set(data['horas'])
+        paso = timedelta(minutes=data['duracion_minutos'])
+        for bloque in data['bloques']:
+            inicio = datetime.combine(data['fecha_inicio'], bloque['inicio'])
+            fin = datetime.combine(data['fecha_inicio'], bloque['fin'])
+            while inicio + paso <= fin:
+                horas.add(inicio.time())
+                inicio += paso
+        if not horas:
+            raise serializers.ValidationError(
+                "Indica al menos una hora de inicio o un bloque.")
+        data['horas'] = sorted(horas)
+
+        semanas = (data['fecha_fin'] - data['fecha_inicio']).days // 7 + 1
+        if semanas * len(set(data['dias_semana'])) * len(horas) > MAX_HORARIOS_POR_PETICION:
+            raise serializers.ValidationError(
+                f"El patrón genera más de {MAX_HORARIOS_POR_PETICION} huecos.")
+        return data
@@ -0,0 +1,159 @@
+# citas/services.py
+"""
+Reserva de clases prácticas.
+
+`agendar_clase` inserta la `ClasePractica` directamente y deja que la
+restricción única de `horario` decida quién se queda el hueco: no hay
+consulta previa que pueda quedarse obsoleta entre el SELECT y el INSERT.
+
+Con la cabecera `Idempotency-Key` la respuesta se guarda en la misma
+transacción que la reserva, de modo que un reintento del móvil devuelve
+la respuesta original en lugar de reservar otra vez.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from usuarios.models import Profesor
+from .models import ClasePractica, HorarioDisponible, PeticionIdempotente
+
+LOTE = 500
+
+
+class AgendaError(Exception):
+    """Error de negocio al reservar una clase."""
+
+
+class HorarioOcupadoError(AgendaError):
+    pass
+
+
+class ClaveReutilizadaError(AgendaError):
+    pass
+
+
+def agendar_clase(horario, alumno):
+    """Crea la clase de `alumno` en `horario` o lanza HorarioOcupadoError."""
+    try:
+        with transaction.atomic():
+            return ClasePractica.objects.create(alumno=alumno, horario=horario)
+    except IntegrityError:
+        raise HorarioOcupadoError("Horario ya reservado")
+
+
+# ───────────────────── Idempotency-Key ───────────────────── #
+def huella(datos):
+    """Resumen del cuerpo de la petición para detectar claves reutilizadas."""
+    texto = json.dumps(datos, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def respuesta_guardada(usuario, clave, huella_peticion):
+    """(status, datos) de una petición ya atendida con esta clave, o None."""
+    previa = (PeticionIdempotente.objects
+              .filter(usuario=usuario, clave=clave)
+              .values_list('huella', 'estado', 'respuesta')
+              .first())
+    if previa is None:
+        return None
+    if previa[0] != huella_peticion:
+        raise ClaveReutilizadaError(
+            "La Idempotency-Key ya se usó con otra petición.")
+    return previa[1], previa[2]
+
+
+def guardar_respuesta(usuario, clave, huella_peticion, estado, respuesta):
+    """Debe llamarse dentro de la transacción que hizo el cambio."""
+    PeticionIdempotente.objects.create(
+        usuario=usuario, clave=clave, huella=huella_peticion,
+        estado=estado, respuesta=respuesta)
+
+
+# ───────────────────── Generación de horarios ───────────────────── #
+def bloquear_profesores(ids):
+    """
+    SELECT ... FOR UPDATE de los perfiles de profesor, en orden de id para
+    no provocar interbloqueos. Debe llamarse dentro de una transacción.
+    Quien crea o mueve huecos o salidas de un profesor lo bloquea antes de
+    leer los existentes, así que las escrituras de un mismo profesor van
+    una detrás de otra y lo leído sigue valiendo al insertar.
+    """
+    list(Profesor.objects.select_for_update()
+         .filter(pk__in=ids).order_by('pk').values_list('pk', flat=True))
+
+
+def expandir_patron(dias_semana, horas, duracion, fecha_inicio, fecha_fin, excluir=()):
+    """
+    Intervalos (inicio, fin) aware, en la zona horaria actual, del patrón
+    semanal entre `fecha_inicio` y `fecha_fin`, ambas incluidas, salvo los
+    días de `excluir`. `horas` son objetos `time` y `duracion` un timedelta.
+    """
+    dias_semana, excluir = set(dias_semana), set(excluir)
+    dia = fecha_inicio
+    while dia <= fecha_fin:
+        if dia.weekday() in dias_semana and dia not in excluir:
+            for hora in horas:
+                inicio = timezone.make_aware(datetime.combine(dia, hora))
+                yield inicio, inicio + duracion
+        dia += timedelta(days=1)
+
+
+def generar_horarios(profesor_id, intervalos):
+    """
+    Crea en bloque los huecos (inicio, fin) del profesor `profesor_id`.
+
+    Con el profesor bloqueado (`bloquear_profesores`), los huecos ya
+    guardados en el rango se leen con una consulta. Después un barrido
+    sobre los intervalos ordenados por inicio descarta, sin más consultas,
+    los que coinciden con uno existente (omitidos) y los que se solapan
+    con uno existente o con otro del mismo lote (solapados). El resto se
+    inserta en la misma transacción, así que `creados` es exactamente lo
+    insertado; si alguien que no bloquea (el admin) crea un hueco que
+    choca entre medias, la restricción lanza IntegrityError y no se
+    guarda nada.
+    """
+    intervalos = sorted(set(intervalos))
+    resultado = {'creados': 0, 'omitidos': [], 'solapados': []}
+    if not intervalos:
+        return resultado
+
+    with transaction.atomic():
+        bloquear_profesores([profesor_id])
+        _barrer_e_insertar(profesor_id, intervalos, resultado)
+    return resultado
+
+
+def _barrer_e_insertar(profesor_id, intervalos, resultado):
+    existentes = list(
+        HorarioDisponible.objects
+        .filter(profesor_id=profesor_id,
+                fecha_hora_inicio__gt=intervalos[0][0] - HorarioDisponible.DURACION_MAXIMA,
+                fecha_hora_inicio__lt=max(fin for _, fin in intervalos))
+        .order_by('fecha_hora_inicio')
+        .values_list('fecha_hora_inicio', 'fecha_hora_fin'))
+    inicios_existentes = {inicio for inicio, _ in existentes}
+
+    nuevos, j, ocupado_hasta = [], 0, None
+    for inicio, fin in intervalos:
+        # Los existentes que empiezan antes ocupan hasta su fin
+        while j < len(existentes) and existentes[j][0] <= inicio:
+            if ocupado_hasta is None or existentes[j][1] > ocupado_hasta:
+                ocupado_hasta = existentes[j][1]
+            j += 1
+        if inicio in inicios_existentes:
+            resultado['omitidos'].append(inicio)
+            continue
+        siguiente = existentes[j][0] if j < len(existentes) else None
+        if (ocupado_hasta is not None and inicio < ocupado_hasta) or (
+                siguiente is not None and siguiente < fin):
+            resultado['solapados'].append(inicio)
+            continue
+        nuevos.append(HorarioDisponible(
+            profesor_id=profesor_id, fecha_hora_inicio=inicio, fecha_hora_fin=fin))
+        ocupado_hasta = fin if ocupado_hasta is None else max(ocupado_hasta, fin)
+
+    HorarioDisponible.objects.bulk_create(nuevos, batch_size=LOTE)
+    resultado['creados'] = len(nuevos)
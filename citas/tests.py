@@ -1,9 +1,20 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
+
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
-from .models import Profesor, HorarioDisponible, ClasePractica
+from usuarios.models import User as Usuario
+from usuarios.serializers import TokenConRolSerializer
+from .models import Profesor, HorarioDisponible, HorarioDisponibleQuerySet, ClasePractica
+from .serializers import SOLAPE
+from .services import generar_horarios, ClaveReutilizadaError
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 
 class CitaTests(TestCase):
@@ -63,3 +74,319 @@ class CitaTests(TestCase):
             '/api/clases/', {'horario': horario.id, 'alumno': otro_alumno.id})
 
         self.assertEqual(response.status_code, 400)  # Debería fallar
+
+
+class HuecosLibresTests(TestCase):
+    """`HorarioDisponible.objects.disponibles` y filtros del listado."""
+
+    def setUp(self):
+        self.profes = [
+            Profesor.objects.create(usuario=Usuario.objects.create(
+                username=f'profe{i}', rol=Usuario.Roles.PROFESOR))
+            for i in range(2)]
+        self.alumno = Usuario.objects.create(username='alumno')
+        ahora = timezone.now()
+        self.horarios = {}
+        for profe in self.profes:
+            for horas in (-5, 2, 30, 200):
+                self.horarios[profe.pk, horas] = HorarioDisponible.objects.create(
+                    profesor=profe, fecha_hora_inicio=ahora + timedelta(hours=horas))
+        ClasePractica.objects.create(
+            alumno=self.alumno, horario=self.horarios[self.profes[0].pk, 2])
+
+        # Token con claims de rol, como en producción: sin consultas de auth
+        token = TokenConRolSerializer.get_token(self.alumno).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_disponibles_excluye_pasados_y_reservados(self):
+        ids = set(HorarioDisponible.objects.disponibles().values_list('id', flat=True))
+        esperados = {self.horarios[p.pk, h].pk for p in self.profes
+                     for h in (2, 30, 200)} - {self.horarios[self.profes[0].pk, 2].pk}
+        self.assertEqual(ids, esperados)
+
+    def test_alumno_filtra_por_rango_y_profesor(self):
+        hasta = (timezone.now() + timedelta(hours=48)).isoformat()
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                '/api/v1/horarios-disponibles/',
+                {'hasta': hasta, 'profesor': self.profes[1].pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [h['id'] for h in response.data['results']],
+            [self.horarios[self.profes[1].pk, h].pk for h in (2, 30)])
+
+        response = self.client.get('/api/v1/horarios-disponibles/?desde=ayer')
+        self.assertEqual(response.status_code, 400)
+
+
+class AgendarTests(TestCase):
+    """Reserva atómica e idempotente de clases."""
+
+    def setUp(self):
+        profe = Profesor.objects.create(usuario=Usuario.objects.create(
+            username='profe', rol=Usuario.Roles.PROFESOR))
+        self.horario = HorarioDisponible.objects.create(
+            profesor=profe, fecha_hora_inicio=timezone.now() + timedelta(days=1))
+        self.clientes = []
+        for i in range(2):
+            client = APIClient()
+            client.force_authenticate(
+                user=Usuario.objects.create(username=f'alumno{i}'))
+            self.clientes.append(client)
+
+    def _agendar(self, client, clave=None, horario=None):
+        cabeceras = {'HTTP_IDEMPOTENCY_KEY': clave} if clave else {}
+        return client.post(
+            '/api/v1/clases-practicas/agendar/',
+            {'horario_id': (horario or self.horario).pk}, format='json', **cabeceras)
+
+    def test_horario_ocupado_devuelve_409(self):
+        self.assertEqual(self._agendar(self.clientes[0]).status_code, 201)
+        self.assertEqual(self._agendar(self.clientes[1]).status_code, 409)
+
+    def test_reintento_con_la_misma_clave(self):
+        primera = self._agendar(self.clientes[0], clave='abc')
+        segunda = self._agendar(self.clientes[0], clave='abc')
+        self.assertEqual((primera.status_code, segunda.status_code), (201, 201))
+        self.assertEqual(primera.data, segunda.data)
+        self.assertEqual(ClasePractica.objects.count(), 1)
+
+        # La misma clave de otro usuario es independiente
+        self.assertEqual(self._agendar(self.clientes[1], clave='abc').status_code, 409)
+
+        otro = HorarioDisponible.objects.create(
+            profesor=self.horario.profesor,
+            fecha_hora_inicio=self.horario.fecha_hora_inicio + timedelta(hours=1))
+        response = self._agendar(self.clientes[0], clave='abc', horario=otro)
+        self.assertEqual(response.status_code, 422)
+
+    def test_clave_reutilizada_durante_la_carrera(self):
+        # Otra petición con la misma clave y otro cuerpo se guarda entre la
+        # primera comprobación y el conflicto
+        self._agendar(self.clientes[1])
+        with mock.patch('citas.views.respuesta_guardada', side_effect=[
+                None, ClaveReutilizadaError("La Idempotency-Key ya se usó con otra petición.")]):
+            response = self._agendar(self.clientes[0], clave='abc')
+        self.assertEqual(response.status_code, 422)
+
+
+class AgendarConcurrenteTests(TransactionTestCase):
+    """Muchos hilos intentan agendar el mismo hueco a la vez."""
+
+    HILOS = 12
+
+    def test_un_solo_ganador(self):
+        profe = Profesor.objects.create(usuario=Usuario.objects.create(
+            username='profe', rol=Usuario.Roles.PROFESOR))
+        horario = HorarioDisponible.objects.create(
+            profesor=profe, fecha_hora_inicio=timezone.now() + timedelta(days=1))
+        alumnos = [Usuario.objects.create(username=f'alumno{i}')
+                   for i in range(self.HILOS)]
+        # Los tres primeros son el mismo móvil reintentando con su clave
+        repetidos = [alumnos[0]] * 3
+
+        barrera = threading.Barrier(len(alumnos) + len(repetidos))
+        resultados = []
+
+        def agendar(alumno, clave):
+            client = APIClient()
+            client.force_authenticate(user=alumno)
+            try:
+                barrera.wait()
+                while True:
+                    try:
+                        response = client.post(
+                            '/api/v1/clases-practicas/agendar/',
+                            {'horario_id': horario.pk}, format='json',
+                            HTTP_IDEMPOTENCY_KEY=clave)
+                    except OperationalError:
+                        # SQLite devuelve "table is locked" en vez de esperar
+                        time.sleep(0.001)
+                        continue
+                    resultados.append((alumno.pk, response.status_code))
+                    return
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=agendar, args=(a, f'clave-{a.pk}'))
+                 for a in alumnos + repetidos]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(ClasePractica.objects.count(), 1)
+        ganador = ClasePractica.objects.get().alumno_id
+        for alumno_id, codigo in resultados:
+            self.assertEqual(codigo, 201 if alumno_id == ganador else 409)
+        self.assertEqual(len(resultados), len(alumnos) + len(repetidos))
+
+
+class GenerarHorariosTests(TestCase):
+    """Alta en bloque de huecos a partir de un patrón semanal."""
+
+    def setUp(self):
+        self.profe = Profesor.objects.create(usuario=Usuario.objects.create(
+            username='profe', rol=Usuario.Roles.PROFESOR))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.profe.usuario)
+        hoy = timezone.localdate()
+        self.lunes = hoy + timedelta(days=7 - hoy.weekday())
+
+    def _generar(self, **patron):
+        datos = {
+            'dias_semana': [0, 2],
+            'bloques': [{'inicio': '09:00', 'fin': '12:00'}],
+            'horas': ['17:30'],
+            'duracion_minutos': 90,
+            'fecha_inicio': self.lunes.isoformat(),
+            'fecha_fin': (self.lunes + timedelta(weeks=4, days=-1)).isoformat(),
+        } | patron
+        return self.client.post(
+            '/api/v1/horarios-disponibles/generar/', datos, format='json')
+
+    def test_genera_patron_y_omite_existentes(self):
+        existente = timezone.make_aware(
+            datetime.combine(self.lunes, datetime.min.time()).replace(hour=9))
+        HorarioDisponible.objects.create(profesor=self.profe, fecha_hora_inicio=existente)
+
+        response = self._generar(excluir=[(self.lunes + timedelta(days=2)).isoformat()])
+        self.assertEqual(response.status_code, 201)
+        # 4 semanas × 2 días × 3 horas (9:00, 10:30, 17:30), menos un miércoles
+        self.assertEqual(response.data['creados'], 4 * 2 * 3 - 3 - 1)
+        self.assertEqual(response.data['omitidos'], 1)
+        self.assertEqual(HorarioDisponible.objects.count(), 4 * 2 * 3 - 3)
+
+        # Repetir no crea nada
+        self.assertEqual(self._generar().data['creados'], 3)
+
+    def test_bloquea_al_profesor_antes_de_leer(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self._generar(horas=[]).data['creados'], 4 * 2 * 2)
+        tablas = [c['sql'].split('FROM')[1].split()[0].strip('"')
+                  for c in consultas.captured_queries if c['sql'].startswith('SELECT')]
+        # Tras la autenticación, el bloqueo y luego la lectura de existentes
+        self.assertEqual(tablas[-2:], ['usuarios_profesor', 'citas_horariodisponible'])
+
+    def test_conflicto_con_quien_no_bloquea_devuelve_409(self):
+        lunes_9 = timezone.make_aware(
+            datetime.combine(self.lunes, datetime.min.time()).replace(hour=9))
+        insertar = HorarioDisponible.objects.bulk_create
+
+        def con_carrera(objs, **kwargs):
+            # El admin guarda el primer hueco después de la lectura
+            HorarioDisponible.objects.create(
+                profesor=self.profe, fecha_hora_inicio=lunes_9)
+            return insertar(objs, **kwargs)
+
+        with mock.patch.object(HorarioDisponible.objects, 'bulk_create', con_carrera):
+            response = self._generar()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(HorarioDisponible.objects.exists())
+
+    def test_mil_huecos_consultas_constantes(self):
+        # SAVEPOINT + bloqueo del profesor + existentes + INSERT por lotes
+        # (333 filas por lote en SQLite) + RELEASE
+        with self.assertNumQueries(8):
+            response = self._generar(
+                dias_semana=[0, 1, 2, 3, 4], bloques=[], duracion_minutos=60,
+                horas=[f'{h:02}:00' for h in range(8, 18)],
+                fecha_fin=(self.lunes + timedelta(weeks=20, days=-1)).isoformat())
+        self.assertEqual(response.data['creados'], 1000)
+
+    def test_alumno_no_puede_generar(self):
+        self.client.force_authenticate(user=Usuario.objects.create(username='alumno'))
+        self.assertEqual(self._generar().status_code, 403)
+        self.assertEqual(self._generar(fecha_fin='2000-01-01').status_code, 400)
+
+
+class SolapesHorarioTests(TestCase):
+    """Duración de los huecos y detección de solapes."""
+
+    def setUp(self):
+        self.profe = Profesor.objects.create(usuario=Usuario.objects.create(
+            username='profe', rol=Usuario.Roles.PROFESOR))
+        self.t0 = timezone.now().replace(microsecond=0) + timedelta(days=1)
+
+    def _h(self, minutos):
+        return self.t0 + timedelta(minutes=minutos)
+
+    def test_fin_por_defecto_y_consulta_de_solapes(self):
+        horario = HorarioDisponible.objects.create(
+            profesor=self.profe, fecha_hora_inicio=self._h(0))
+        self.assertEqual(horario.fecha_hora_fin, self._h(60))
+
+        solapados = HorarioDisponible.objects.solapados
+        self.assertTrue(solapados(self.profe, self._h(30), self._h(90)).exists())
+        self.assertTrue(solapados(self.profe, self._h(-30), self._h(1)).exists())
+        self.assertFalse(solapados(self.profe, self._h(60), self._h(120)).exists())
+        self.assertFalse(solapados(self.profe, self._h(-60), self._h(0)).exists())
+
+    def test_carrera_entre_altas_devuelve_400(self):
+        HorarioDisponible.objects.create(profesor=self.profe, fecha_hora_inicio=self._h(0))
+        client = APIClient()
+        client.force_authenticate(user=self.profe.usuario)
+        # La comprobación previa no ve el hueco que otra petición acaba de guardar
+        with mock.patch.object(HorarioDisponibleQuerySet, 'solapados',
+                               lambda qs, *args: qs.none()):
+            response = client.post('/api/v1/horarios-disponibles/',
+                                   {'fecha_hora_inicio': self._h(0)}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, [SOLAPE])
+
+    def test_barrido_del_lote(self):
+        HorarioDisponible.objects.create(
+            profesor=self.profe, fecha_hora_inicio=self._h(120),
+            fecha_hora_fin=self._h(180))
+        intervalos = [(self._h(a), self._h(b)) for a, b in [
+            (0, 60), (30, 90),      # el segundo pisa al primero del lote
+            (60, 130),              # pisa al existente que empieza después
+            (120, 150),             # coincide con el existente
+            (170, 200),             # empieza antes de que acabe el existente
+            (180, 240), (240, 300),  # contiguos: válidos
+        ]]
+        # SAVEPOINT + bloqueo + existentes + INSERT + RELEASE
+        with self.assertNumQueries(5):
+            resultado = generar_horarios(self.profe.id, intervalos)
+        self.assertEqual(resultado['creados'], 3)
+        self.assertEqual(resultado['omitidos'], [self._h(120)])
+        self.assertEqual(resultado['solapados'],
+                         [self._h(30), self._h(60), self._h(170)])
+
+
+
+class MigracionFinHorarioTests(TransactionTestCase):
+    """0007 rellena `fecha_hora_fin` sin crear solapes entre huecos."""
+
+    def _migrar(self, destino):
+        executor = MigrationExecutor(connection)
+        executor.migrate(destino)
+        executor.loader.build_graph()
+        return executor.loader.project_state(destino).apps
+
+    def tearDown(self):
+        self._migrar(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_huecos_a_menos_de_una_hora(self):
+        apps = self._migrar([('citas', '0006_peticionidempotente')])
+        User = apps.get_model('usuarios', 'User')
+        Profesor = apps.get_model('usuarios', 'Profesor')
+        Horario = apps.get_model('citas', 'HorarioDisponible')
+        profesor = Profesor.objects.create(usuario=User.objects.create(username='profe'))
+        otro = Profesor.objects.create(usuario=User.objects.create(username='otro'))
+        nueve = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        for quien, minutos in [(profesor, 0), (profesor, 30), (profesor, 120), (otro, 45)]:
+            Horario.objects.create(profesor=quien,
+                                   fecha_hora_inicio=nueve + timedelta(minutes=minutos))
+
+        apps = self._migrar([('citas', '0007_horario_fin')])
+        Horario = apps.get_model('citas', 'HorarioDisponible')
+        fines = {(h.profesor_id, h.fecha_hora_inicio): h.fecha_hora_fin
+                 for h in Horario.objects.all()}
+        self.assertEqual(fines, {
+            (profesor.pk, nueve): nueve + timedelta(minutes=30),
+            (profesor.pk, nueve + timedelta(minutes=30)): nueve + timedelta(minutes=90),
+            (profesor.pk, nueve + timedelta(minutes=120)): nueve + timedelta(minutes=180),
+            (otro.pk, nueve + timedelta(minutes=45)): nueve + timedelta(minutes=105),
+        })
@@ -1,21 +1,72 @@
 # citas/views.py
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.contrib.auth import get_user_model
 from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
+from backend.exportar import ExportarMixin
+from backend.lectura import ListadoRapidoMixin
 from .models import Profesor, HorarioDisponible, ClasePractica
 from .serializers import (
     ProfesorSerializer,
     HorarioDisponibleSerializer,
+    HorarioDisponibleLectura,
     ClasePracticaSerializer,
+    ClasePracticaLectura,
+    PatronHorariosSerializer,
+    SOLAPE,
+)
+from .permissions import EsAdmin, EsProfesor, EsProfesorDueño, EsAlumnoDueño, propios
+from usuarios.roles import rol_de
+from .services import (
+    agendar_clase,
+    bloquear_profesores,
+    expandir_patron,
+    generar_horarios,
+    huella,
+    respuesta_guardada,
+    guardar_respuesta,
+    HorarioOcupadoError,
+    ClaveReutilizadaError,
 )
-from .permissions import EsAdmin, EsProfesor, EsProfesorDueño   # ya definidos
 
 User = get_user_model()
 
+
+def _fecha_param(params, nombre):
+    """?desde= / ?hasta= en ISO 8601 (fecha o fecha y hora)."""
+    valor = params.get(nombre)
+    if not valor:
+        return None
+    try:
+        fecha = parse_datetime(valor)
+        if fecha is None and (dia := parse_date(valor)):
+            fecha = datetime.combine(dia, time.min)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise serializers.ValidationError(
+            {nombre: "Fecha no válida, usa AAAA-MM-DD o ISO 8601."})
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def _id_param(params, nombre):
+    valor = params.get(nombre)
+    if not valor:
+        return None
+    if not valor.isdigit():
+        raise serializers.ValidationError({nombre: "Debe ser un id numérico."})
+    return int(valor)
+
 # ═════════════════════════════  PROFESORES  ═════════════════════════════ #
 
 
@@ -27,7 +78,7 @@ class ProfesorViewSet(viewsets.ModelViewSet):
 
 
 # ═══════════════════════════  HORARIOS DISPONIBLES  ═════════════════════ #
-class HorarioDisponibleViewSet(viewsets.ModelViewSet):
+class HorarioDisponibleViewSet(ListadoRapidoMixin, viewsets.ModelViewSet):
     """
     - Profesores: CRUD de sus propios horarios.
     - Admins: CRUD global.
@@ -35,55 +86,127 @@ class HorarioDisponibleViewSet(viewsets.ModelViewSet):
     """
     queryset = HorarioDisponible.objects.select_related("profesor__usuario")
     serializer_class = HorarioDisponibleSerializer
+    lectura_class = HorarioDisponibleLectura
+    ordering = ("fecha_hora_inicio", "id")
+    presupuesto_consultas = {"list": 1, "retrieve": 1, "generar": 8}
 
     # ----- permisos dinámicos ------------------------------------------- #
     def get_permissions(self):
         if self.action in {"create", "update", "partial_update", "destroy"}:
-            return [EsProfesor | IsAdminUser]
+            return [(EsProfesor | IsAdminUser)()]
         return [IsAuthenticated()]
 
     # ----- filtro por rol ------------------------------------------------ #
     def get_queryset(self):
         qs = super().get_queryset()
         user = self.request.user
-        if user.is_staff:
-            return qs
-        if hasattr(user, "profesor"):
-            return qs.filter(profesor=user.profesor)
-        # Alumno → sólo huecos no reservados
-        return qs.exclude(id__in=ClasePractica.objects.values_list("horario", flat=True))
+        if user.is_staff or rol_de(user).es_profesor:
+            return self._filtrar_rango(propios(qs, user))
+        # Alumno → sólo huecos futuros no reservados
+        params = self.request.query_params
+        return qs.disponibles(
+            desde=_fecha_param(params, "desde"),
+            hasta=_fecha_param(params, "hasta"),
+            profesor=_id_param(params, "profesor"),
+        )
+
+    def _filtrar_rango(self, qs):
+        params = self.request.query_params
+        desde, hasta = _fecha_param(params, "desde"), _fecha_param(params, "hasta")
+        if desde:
+            qs = qs.filter(fecha_hora_inicio__gte=desde)
+        if hasta:
+            qs = qs.filter(fecha_hora_inicio__lt=hasta)
+        if (profesor := _id_param(params, "profesor")) is not None:
+            qs = qs.filter(profesor=profesor)
+        return qs
+
+    # ----- patrón semanal en bloque ------------------------------------- #
+    @action(detail=False, methods=["post"], url_path="generar",
+            permission_classes=[IsAuthenticated])
+    def generar(self, request):
+        """
+        Crea los huecos de un patrón semanal en una sola transacción.
+        Los profesores generan los suyos; un admin indica `profesor`.
+        """
+        patron = PatronHorariosSerializer(data=request.data)
+        patron.is_valid(raise_exception=True)
+        datos = patron.validated_data
+
+        profesor = rol_de(request.user).profesor_id
+        if request.user.is_staff and datos.get("profesor"):
+            profesor = datos["profesor"].id
+        if profesor is None:
+            return Response({"error": "Sólo los profesores crean horarios."},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            resultado = generar_horarios(profesor, expandir_patron(
+                datos["dias_semana"], datos["horas"],
+                timedelta(minutes=datos["duracion_minutos"]),
+                datos["fecha_inicio"], datos["fecha_fin"], datos["excluir"]))
+        except IntegrityError:
+            # Alguien que no bloquea al profesor (el admin) creó un hueco
+            # que choca con el lote mientras se insertaba; no se guardó nada
+            return Response({"error": "Los horarios cambiaron mientras se generaban; "
+                                      "vuelve a intentarlo."},
+                            status=status.HTTP_409_CONFLICT)
+        return Response({
+            "creados": resultado["creados"],
+            "omitidos": len(resultado["omitidos"]),
+            "omitidos_detalle": [i.isoformat() for i in resultado["omitidos"]],
+            "solapados": len(resultado["solapados"]),
+            "solapados_detalle": [i.isoformat() for i in resultado["solapados"]],
+        }, status=status.HTTP_201_CREATED)
 
     # ----- asignar profesor automático ---------------------------------- #
     def perform_create(self, serializer):
-        if hasattr(self.request.user, "profesor"):
-            serializer.save(profesor=self.request.user.profesor)
+        rol = rol_de(self.request.user)
+        if rol.es_profesor:
+            self._guardar(serializer, profesor_id=rol.profesor_id)
         else:
             raise serializers.ValidationError(
                 "Sólo los profesores crean horarios.")
 
+    def perform_update(self, serializer):
+        self._guardar(serializer)
+
+    def _guardar(self, serializer, **kwargs):
+        # El validador comprueba el solape sin bloquear; si otra petición
+        # gana la carrera, lo para la restricción (única o de exclusión).
+        # El bloqueo del profesor hace esperar a un `generar` en curso
+        # para que sea este INSERT, y no el lote entero, el que falle
+        profesor_id = kwargs.get("profesor_id") or serializer.instance.profesor_id
+        try:
+            with transaction.atomic():
+                bloquear_profesores([profesor_id])
+                serializer.save(**kwargs)
+        except IntegrityError:
+            raise serializers.ValidationError(SOLAPE)
+
 
 # ═════════════════════════════  CLASES PRÁCTICAS  ═══════════════════════ #
-class ClasePracticaViewSet(viewsets.ModelViewSet):
+class ClasePracticaViewSet(ExportarMixin, viewsets.ModelViewSet):
     """
     Reservas de clase práctica.
     Endpoints extra:
       • GET  /clases-practicas/mias/
+      • GET  /clases-practicas/exportar/?formato=csv|xlsx
       • POST /clases-practicas/agendar/
       • DELETE /clases-practicas/{id}/cancelar/
     """
     queryset = ClasePractica.objects.select_related(
         "alumno", "horario__profesor")
     serializer_class = ClasePracticaSerializer
-    permission_classes = [IsAuthenticated & (EsProfesorDueño | IsAdminUser)]
+    lectura_class = ClasePracticaLectura
+    exportar_orden = ("horario__fecha_hora_inicio", "id")
+    presupuesto_consultas = {"list": 1, "retrieve": 1, "mias": 1, "agendar": 11}
+    permission_classes = [
+        IsAuthenticated & (EsProfesorDueño | EsAlumnoDueño | IsAdminUser)]
 
-    # -------- queryset por rol ------------------------------------------ #
+    # -------- queryset por dueño (RUTA_PROFESOR / RUTA_ALUMNO) ---------- #
     def get_queryset(self):
-        user = self.request.user
-        if user.is_staff:
-            return super().get_queryset()
-        if hasattr(user, "profesor"):
-            return super().get_queryset().filter(horario__profesor=user.profesor)
-        return super().get_queryset().filter(alumno=user)
+        return propios(super().get_queryset(), self.request.user)
 
     # -------- bloquear CRUD directo p/ alumnos y profes ----------------- #
     def create(self, *a, **kw):
@@ -111,17 +234,41 @@ class ClasePracticaViewSet(viewsets.ModelViewSet):
         if not horario_id:
             return Response({"error": "Se requiere horario_id"}, status=400)
 
-        horario = get_object_or_404(HorarioDisponible, id=horario_id)
+        clave = request.headers.get("Idempotency-Key")
+        if clave:
+            huella_peticion = huella(request.data)
+            try:
+                guardada = respuesta_guardada(request.user, clave, huella_peticion)
+            except ClaveReutilizadaError as exc:
+                return Response({"error": str(exc)}, status=422)
+            if guardada:
+                return Response(guardada[1], status=guardada[0])
 
-        if ClasePractica.objects.filter(horario=horario).exists():
-            return Response({"error": "Horario ya reservado"}, status=400)
+        horario = get_object_or_404(HorarioDisponible, id=horario_id)
 
-        if hasattr(request.user, "profesor") and horario.profesor == request.user.profesor:
+        if horario.profesor_id == rol_de(request.user).profesor_id:
             return Response({"error": "No puedes agendar tu propio horario"}, status=400)
 
-        clase = ClasePractica.objects.create(
-            alumno=request.user, horario=horario)
-        return Response(self.get_serializer(clase).data, status=201)
+        try:
+            with transaction.atomic():
+                clase = agendar_clase(horario, request.user)
+                data = self.get_serializer(clase).data
+                if clave:
+                    guardar_respuesta(request.user, clave, huella_peticion, 201, data)
+        except (HorarioOcupadoError, IntegrityError) as exc:
+            # Un reintento simultáneo con la misma clave pudo ganar la carrera
+            try:
+                guardada = clave and respuesta_guardada(
+                    request.user, clave, huella_peticion)
+            except ClaveReutilizadaError as exc:
+                return Response({"error": str(exc)}, status=422)
+            if guardada:
+                return Response(guardada[1], status=guardada[0])
+            return Response({"error": "Horario ya reservado"
+                             if isinstance(exc, HorarioOcupadoError)
+                             else "Petición duplicada en curso"},
+                            status=status.HTTP_409_CONFLICT)
+        return Response(data, status=201)
 
     # -------- CANCELAR -------------------------------------------------- #
     @action(detail=True, methods=["delete"], url_path="cancelar")
@@ -1,8 +1,12 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.db import IntegrityError
 from .models import (
-    Zona, Permiso, Fase, PermisoFase,
-    Solicitud, ExamenIntento, SalidaDisponible, Reserva
+    Zona, ZonaAlias, Permiso, Fase, PermisoFase,
+    Solicitud, ExamenIntento, SalidaDisponible, SalidaRecurrente, Reserva
 )
+from .calendario import generar_salidas
+from .services import cancelar_reserva, reservar_plaza
 
 
 class PermisoFaseInline(admin.TabularInline):
@@ -12,10 +16,25 @@ class PermisoFaseInline(admin.TabularInline):
     verbose_name_plural = 'Fases asignadas'
 
 
+class ZonaAliasInline(admin.TabularInline):
+    model = ZonaAlias
+    extra = 1
+    fields = ('nombre', 'clave')
+    readonly_fields = ('clave',)
+
+
 @admin.register(Zona)
 class ZonaAdmin(admin.ModelAdmin):
     list_display = ('nombre',)
-    search_fields = ('nombre',)
+    search_fields = ('nombre', 'alias__clave')
+    inlines = [ZonaAliasInline]
+
+
+@admin.register(ZonaAlias)
+class ZonaAliasAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'clave', 'zona')
+    search_fields = ('nombre', 'clave', 'zona__nombre')
+    list_select_related = ('zona',)
 
 
 @admin.register(Permiso)
@@ -70,15 +89,85 @@ class ExamenIntentoAdmin(admin.ModelAdmin):
 
 @admin.register(SalidaDisponible)
 class SalidaDisponibleAdmin(admin.ModelAdmin):
-    list_display = ('profesor', 'zona', 'sesion', 'fecha', 'cupo_maximo')
+    list_display = (
+        'profesor', 'zona', 'sesion', 'fecha', 'cupo_maximo', 'plazas_ocupadas'
+    )
+    readonly_fields = ('plazas_ocupadas',)
     list_filter = ('zona', 'sesion', 'profesor')
     date_hierarchy = 'fecha'
     search_fields = ('profesor__usuario__username',)
 
 
+@admin.register(SalidaRecurrente)
+class SalidaRecurrenteAdmin(admin.ModelAdmin):
+    list_display = (
+        'profesor', 'zona', 'dia_semana', 'sesion', 'cupo_maximo',
+        'fecha_inicio', 'fecha_fin', 'activa'
+    )
+    list_filter = ('activa', 'dia_semana', 'sesion', 'zona')
+    search_fields = ('profesor__usuario__username',)
+    actions = ['generar']
+
+    @admin.action(description='Generar salidas de las próximas semanas')
+    def generar(self, request, queryset):
+        try:
+            resultado = generar_salidas(queryset)
+        except IntegrityError:
+            self.message_user(
+                request, "Las salidas cambiaron mientras se generaban; no se "
+                "guardó nada. Vuelve a intentarlo.", messages.ERROR)
+            return
+        self.message_user(
+            request,
+            f"{resultado.creadas} salidas generadas, "
+            f"{len(resultado.conflictos)} conflictos.",
+            messages.WARNING if resultado.conflictos else messages.SUCCESS)
+
+
+class ReservaAdminForm(forms.ModelForm):
+    def clean(self):
+        datos = super().clean()
+        salida = datos.get('salida')
+        # Aviso en el formulario; la comprobación definitiva es el UPDATE
+        # condicional de reservar_plaza
+        if (self.instance.pk is None and salida is not None
+                and salida.plazas_ocupadas >= salida.cupo_maximo):
+            raise forms.ValidationError("No quedan plazas disponibles en esta salida.")
+        return datos
+
+
 @admin.register(Reserva)
 class ReservaAdmin(admin.ModelAdmin):
+    form = ReservaAdminForm
     list_display = ('alumno', 'salida', 'estado', 'created_at')
     list_filter = ('estado',)
     search_fields = ('alumno__username',)
     readonly_fields = ('created_at', 'updated_at')
+
+    # Estado y salida solo cambian en `practicas.services`, que mantienen
+    # `plazas_ocupadas` (como en ReservaSerializer)
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return ('alumno', 'salida')
+        return super().get_fields(request, obj)
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return self.readonly_fields
+        return self.readonly_fields + ('estado', 'salida')
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            return super().save_model(request, obj, form, change)
+        reserva = reservar_plaza(obj.salida, obj.alumno)
+        obj.pk = reserva.pk
+        obj._state.adding = False
+        obj.refresh_from_db()
+
+    # Borrar desde el admin también devuelve la plaza a la salida
+    def delete_model(self, request, obj):
+        cancelar_reserva(obj)
+
+    def delete_queryset(self, request, queryset):
+        for reserva in queryset:
+            cancelar_reserva(reserva)
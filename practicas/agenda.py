@@ -0,0 +1,128 @@
+# practicas/agenda.py
+"""
+Agenda unificada de un profesor (`AgendaViewSet`, `GET /api/v1/agenda/`).
+
+Junta en una sola respuesta, ordenada por hora y agrupada por día, lo que
+antes eran cuatro listados paginados:
+
+- `citas`: huecos (`HorarioDisponible`) y, si están reservados, su clase.
+- `practicas`: salidas de examen (`SalidaDisponible`) con sus reservas.
+
+El número de consultas es fijo sea cual sea el rango: una para huecos y
+clases (JOIN con select_related), una para salidas y zona y otra para sus
+reservas (prefetch). Las salidas ocupan la franja de su sesión
+(`SalidaDisponible.VENTANAS`) y cualquier clase que se cruce con una
+salida se marca como conflicto en ambos eventos. Un hueco libre no es un
+conflicto: basta con no ofrecerlo.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from citas.models import HorarioDisponible
+from .models import SalidaDisponible, Reserva
+
+
+def _nombre(usuario):
+    return usuario.get_full_name() or usuario.username
+
+
+def _eventos_citas(profesor_id, inicio, fin):
+    horarios = (HorarioDisponible.objects
+                .filter(profesor_id=profesor_id,
+                        fecha_hora_inicio__gte=inicio,
+                        fecha_hora_inicio__lt=fin)
+                .select_related('clasepractica__alumno')
+                .order_by('fecha_hora_inicio'))
+    for horario in horarios:
+        clase = getattr(horario, 'clasepractica', None)
+        evento = {
+            'tipo': 'clase' if clase else 'hueco',
+            'id': horario.id,
+            'inicio': horario.fecha_hora_inicio,
+            'fin': horario.fecha_hora_fin,
+        }
+        if clase:
+            evento['clase'] = clase.id
+            evento['alumno'] = {'id': clase.alumno_id,
+                                'nombre': _nombre(clase.alumno)}
+        yield evento
+
+
+def _eventos_practicas(profesor_id, primer_dia, ultimo_dia):
+    reservas = (Reserva.objects
+                .filter(estado__in=Reserva.ESTADOS_OCUPAN_PLAZA)
+                .select_related('alumno')
+                .order_by('created_at', 'id'))
+    salidas = (SalidaDisponible.objects
+               .filter(profesor_id=profesor_id,
+                       fecha__gte=primer_dia, fecha__lte=ultimo_dia)
+               .select_related('zona')
+               .prefetch_related(Prefetch('reservas', queryset=reservas)))
+    for salida in salidas:
+        inicio, fin = salida.intervalo()
+        yield {
+            'tipo': 'salida',
+            'id': salida.id,
+            'inicio': inicio,
+            'fin': fin,
+            'zona': salida.zona.nombre,
+            'sesion': salida.sesion,
+            'cupo_maximo': salida.cupo_maximo,
+            'plazas_ocupadas': salida.plazas_ocupadas,
+            'alumnos': [{'id': r.alumno_id, 'nombre': _nombre(r.alumno),
+                         'estado': r.estado}
+                        for r in salida.reservas.all()],
+        }
+
+
+def marcar_conflictos(eventos):
+    """
+    Barrido sobre los eventos ordenados por inicio: cada uno se compara solo
+    con los que siguen abiertos. Un conflicto es una clase que se solapa
+    con una salida; entre huecos ya no puede haber solape.
+    Devuelve el número de parejas en conflicto.
+    """
+    total, abiertos = 0, []
+    for evento in eventos:
+        evento['conflictos'] = []
+        abiertos = [e for e in abiertos if e['fin'] > evento['inicio']]
+        for otro in abiertos:
+            if {otro['tipo'], evento['tipo']} == {'clase', 'salida'}:
+                otro['conflictos'].append({'tipo': evento['tipo'], 'id': evento['id']})
+                evento['conflictos'].append({'tipo': otro['tipo'], 'id': otro['id']})
+                total += 1
+        abiertos.append(evento)
+    return total
+
+
+def construir_agenda(profesor_id, primer_dia, ultimo_dia):
+    """Agenda de `profesor_id` entre dos fechas incluidas, día a día."""
+    inicio = timezone.make_aware(datetime.combine(primer_dia, time.min))
+    fin = timezone.make_aware(
+        datetime.combine(ultimo_dia + timedelta(days=1), time.min))
+
+    eventos = sorted(
+        [*_eventos_citas(profesor_id, inicio, fin),
+         *_eventos_practicas(profesor_id, primer_dia, ultimo_dia)],
+        key=lambda e: (e['inicio'], e['tipo'] != 'salida', e['id']))
+    conflictos = marcar_conflictos(eventos)
+
+    dias = {primer_dia + timedelta(days=i): []
+            for i in range((ultimo_dia - primer_dia).days + 1)}
+    for evento in eventos:
+        dia = timezone.localtime(evento['inicio']).date()
+        evento['inicio'] = evento['inicio'].isoformat()
+        evento['fin'] = evento['fin'].isoformat()
+        dias[dia].append(evento)
+
+    return {
+        'profesor': profesor_id,
+        'desde': primer_dia.isoformat(),
+        'hasta': ultimo_dia.isoformat(),
+        'conflictos': conflictos,
+        'dias': [{'fecha': dia.isoformat(), 'eventos': lista}
+                 for dia, lista in dias.items()],
+    }
+
@@ -0,0 +1,219 @@
+# practicas/asignacion.py
+"""
+Asignación masiva de solicitudes en cola a plazas de `SalidaDisponible`.
+
+Dentro de cada zona solo hay tres tipos de alumno (mañana, tarde o mixta)
+y tres tipos de plaza, así que el problema de asignación de coste mínimo
+(coste = dejar sin plaza a un alumno, mayor cuanto antes se inscribió) se
+resuelve sin matrices: los conjuntos de alumnos asignables forman un
+matroide transversal y el voraz por orden de inscripción da la solución
+óptima. Cada alumno se acepta si el conjunto sigue cumpliendo las
+condiciones de Hall:
+
+    m <= CM + CB,   t <= CT + CB,   m + t + b <= CM + CT + CB
+
+Después se reparten las fechas concretas, las más tempranas primero.
+El coste es O(n log n) por la ordenación, sin consultas por alumno.
+"""
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from backend.cache import invalidar
+from .models import Solicitud, SalidaDisponible, Reserva
+
+LOTE = 500
+
+
+@dataclass
+class ResultadoAsignacion:
+    solicitudes: int
+    plazas: int
+    asignadas: int
+    segundos: float
+    # Pares (usuario_id, salida_id) asignados
+    pares: list = field(default_factory=list, repr=False)
+
+    @property
+    def tasa_llenado(self):
+        return self.asignadas / self.plazas if self.plazas else 0.0
+
+    def as_dict(self):
+        return {
+            'solicitudes': self.solicitudes,
+            'plazas': self.plazas,
+            'asignadas': self.asignadas,
+            'tasa_llenado': round(self.tasa_llenado, 4),
+            'segundos': round(self.segundos, 4),
+        }
+
+
+def _tomar(colas, clave, excluidos):
+    """Saca la primera plaza de `colas` que no esté en `excluidos`."""
+    for cola in colas:
+        for i, (_, salida_id) in enumerate(cola):
+            if (clave, salida_id) not in excluidos:
+                del cola[i]
+                return salida_id
+    return None
+
+
+def calcular_asignacion(solicitudes, salidas, excluidos=frozenset()):
+    """
+    Calcula la asignación óptima sin tocar la base de datos.
+
+    `solicitudes`: tuplas (clave, zona_id, sesion) ya ordenadas por prioridad.
+    `salidas`: tuplas (salida_id, zona_id, sesion, fecha, plazas_libres).
+    `excluidos`: pares (clave, salida_id) que no se pueden repetir (el
+    alumno ya tiene una reserva, aunque sea rechazada, en esa salida). Un
+    alumno aceptado que solo tenga plazas excluidas se queda sin asignar.
+    Devuelve una lista de pares (clave, salida_id).
+    """
+    # Plazas por zona y tipo de sesión, ordenadas por fecha
+    plazas = defaultdict(lambda: {'M': [], 'T': [], 'B': []})
+    for salida_id, zona_id, sesion, fecha, libres in salidas:
+        plazas[zona_id][sesion].extend([(fecha, salida_id)] * libres)
+
+    pendientes = defaultdict(list)
+    for clave, zona_id, sesion in solicitudes:
+        if zona_id in plazas:
+            pendientes[zona_id].append((clave, sesion))
+
+    pares = []
+    for zona_id, alumnos in pendientes.items():
+        libres = plazas[zona_id]
+        cm, ct, cb = (len(libres[s]) for s in 'MTB')
+        total = cm + ct + cb
+
+        # 1) Voraz por prioridad con las condiciones de Hall
+        aceptados = {'M': [], 'T': [], 'B': []}
+        m = t = b = 0
+        for clave, sesion in alumnos:
+            if m + t + b == total:
+                break
+            if sesion == 'M' and m < cm + cb:
+                m += 1
+            elif sesion == 'T' and t < ct + cb:
+                t += 1
+            elif sesion == 'B':
+                b += 1
+            else:
+                continue
+            aceptados[sesion].append(clave)
+
+        # 2) Reparto de fechas: cada tipo usa antes sus plazas propias
+        colas = {s: deque(sorted(libres[s])) for s in 'MTB'}
+        for sesion in 'MT':
+            for clave in aceptados[sesion]:
+                salida_id = _tomar((colas[sesion], colas['B']), clave, excluidos)
+                if salida_id is not None:
+                    pares.append((clave, salida_id))
+        restantes = deque(sorted(colas['M'] + colas['T'] + colas['B']))
+        for clave in aceptados['B']:
+            salida_id = _tomar((restantes,), clave, excluidos)
+            if salida_id is not None:
+                pares.append((clave, salida_id))
+
+    return pares
+
+
+def _en_lotes(valores, tamano=LOTE):
+    valores = list(valores)
+    for i in range(0, len(valores), tamano):
+        yield valores[i:i + tamano]
+
+
+def asignar_solicitudes(solicitudes=None, hoy=None, simular=False):
+    """
+    Rellena las plazas libres de las salidas futuras con las solicitudes
+    abiertas ('S'/'E') y crea las reservas como INVITADA en bloque.
+    En una pasada completa las solicitudes que se quedan sin plaza pasan
+    a ESPERA, de donde `services.promover_espera` las saca cuando se
+    libera una plaza.
+    """
+    inicio = time.perf_counter()
+    hoy = hoy or timezone.now().date()
+    pasada_completa = solicitudes is None
+    if pasada_completa:
+        solicitudes = Solicitud.objects.all()
+
+    with transaction.atomic():
+        salidas = list(
+            SalidaDisponible.objects
+            .select_for_update()
+            .filter(fecha__gte=hoy, plazas_ocupadas__lt=F('cupo_maximo'))
+            .annotate(libres=F('cupo_maximo') - F('plazas_ocupadas'))
+            .values_list('id', 'zona_id', 'sesion', 'fecha', 'libres')
+        )
+        reserva_activa = Reserva.objects.filter(
+            alumno_id=OuterRef('alumno__usuario_id'),
+            salida__fecha__gte=hoy,
+            estado__in=Reserva.ESTADOS_OCUPAN_PLAZA,
+        )
+        filas = (
+            solicitudes
+            .filter(estado__in=[Solicitud.Estados.PENDIENTE,
+                                Solicitud.Estados.ESPERA])
+            .filter(~Exists(reserva_activa))
+            .order_by('fecha_inscripcion', 'id')
+            .values_list('id', 'alumno__usuario_id', 'zona_id',
+                         'sesion_preferida')
+        )
+
+        # Una plaza por alumno aunque tenga varias solicitudes abiertas
+        usuarios, cola = {}, []
+        for solicitud_id, usuario_id, zona_id, sesion in filas:
+            if usuario_id not in usuarios:
+                usuarios[usuario_id] = solicitud_id
+                cola.append((usuario_id, zona_id, sesion))
+
+        # (alumno, salida) es único en Reserva: no se repite ningún par que
+        # ya exista, tampoco los de reservas rechazadas o canceladas
+        excluidos = set(
+            Reserva.objects.filter(salida__fecha__gte=hoy)
+            .values_list('alumno_id', 'salida_id'))
+        pares = calcular_asignacion(cola, salidas, excluidos)
+
+        if pares and not simular:
+            Reserva.objects.bulk_create(
+                [Reserva(alumno_id=usuario_id, salida_id=salida_id,
+                         estado=Reserva.Estados.INVITADA)
+                 for usuario_id, salida_id in pares],
+                batch_size=LOTE,
+            )
+            # Un UPDATE por cada incremento distinto (como mucho el cupo)
+            por_salida = defaultdict(int)
+            for _, salida_id in pares:
+                por_salida[salida_id] += 1
+            por_incremento = defaultdict(list)
+            for salida_id, n in por_salida.items():
+                por_incremento[n].append(salida_id)
+            for n, ids in por_incremento.items():
+                for lote in _en_lotes(ids):
+                    SalidaDisponible.objects.filter(pk__in=lote).update(
+                        plazas_ocupadas=F('plazas_ocupadas') + n)
+            for lote in _en_lotes(usuarios[u] for u, _ in pares):
+                Solicitud.objects.filter(pk__in=lote).update(
+                    estado=Solicitud.Estados.INVITADA)
+            # bulk_create y UPDATE no lanzan señales
+            invalidar('salidas')
+
+        if pasada_completa and not simular:
+            asignados = {u for u, _ in pares}
+            en_espera = [s for u, s in usuarios.items() if u not in asignados]
+            for lote in _en_lotes(en_espera):
+                Solicitud.objects.filter(
+                    pk__in=lote, estado=Solicitud.Estados.PENDIENTE
+                ).update(estado=Solicitud.Estados.ESPERA)
+
+    return ResultadoAsignacion(
+        solicitudes=len(cola),
+        plazas=sum(s[4] for s in salidas),
+        asignadas=len(pares),
+        segundos=time.perf_counter() - inicio,
+        pares=pares,
+    )
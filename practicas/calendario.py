@@ -0,0 +1,116 @@
+# practicas/calendario.py
+"""
+Generación de salidas a partir de las plantillas `SalidaRecurrente`.
+
+Todas las fechas se calculan en memoria. Con los profesores bloqueados
+(`citas.services.bloquear_profesores`), las salidas que ya existen en el
+rango se leen con una sola consulta, de modo que los choques (mismo
+profesor, mismo día y sesiones que se solapan) se detectan y se informan
+todos juntos antes de escribir. Lo que queda se inserta en la misma
+transacción, así que `creadas` es exactamente lo insertado; si alguien
+que no bloquea (el admin) crea una salida igual entre medias,
+`unique_salida_profesor` lanza IntegrityError y no se guarda nada.
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from backend.cache import invalidar
+from citas.services import bloquear_profesores
+from .models import SalidaDisponible, SalidaRecurrente
+
+LOTE = 500
+SEMANAS = 12
+
+
+@dataclass
+class Conflicto:
+    recurrencia_id: int
+    fecha: object
+    sesion: str
+    motivo: str
+
+    def as_dict(self):
+        return {'recurrencia': self.recurrencia_id, 'fecha': self.fecha.isoformat(),
+                'sesion': self.sesion, 'motivo': self.motivo}
+
+
+@dataclass
+class ResultadoGeneracion:
+    creadas: int = 0
+    conflictos: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {'creadas': self.creadas,
+                'conflictos': [c.as_dict() for c in self.conflictos]}
+
+
+def fechas(recurrencia, desde, hasta):
+    """Fechas de la plantilla dentro de [desde, hasta]."""
+    inicio = max(recurrencia.fecha_inicio, desde)
+    fin = min(recurrencia.fecha_fin, hasta)
+    dia = inicio + timedelta(days=(recurrencia.dia_semana - inicio.weekday()) % 7)
+    while dia <= fin:
+        yield dia
+        dia += timedelta(days=7)
+
+
+def generar_salidas(recurrencias=None, desde=None, hasta=None, simular=False):
+    """
+    Materializa las salidas de las plantillas activas entre `desde` (hoy
+    por defecto) y `hasta` (`SEMANAS` semanas después).
+    """
+    desde = max(desde or timezone.now().date(), timezone.now().date())
+    hasta = hasta or desde + timedelta(weeks=SEMANAS)
+    if recurrencias is None:
+        recurrencias = SalidaRecurrente.objects.all()
+    recurrencias = list(recurrencias.filter(
+        activa=True, fecha_inicio__lte=hasta, fecha_fin__gte=desde
+    ).order_by('id'))
+
+    resultado = ResultadoGeneracion()
+    if not recurrencias:
+        return resultado
+
+    profesores = {r.profesor_id for r in recurrencias}
+    with transaction.atomic():
+        if not simular:
+            bloquear_profesores(profesores)
+        nuevas = _planificar(recurrencias, profesores, desde, hasta, resultado)
+        resultado.creadas = len(nuevas)
+        if simular or not nuevas:
+            return resultado
+        SalidaDisponible.objects.bulk_create(nuevas, batch_size=LOTE)
+    invalidar('salidas')
+    return resultado
+
+
+def _planificar(recurrencias, profesores, desde, hasta, resultado):
+    # Sesiones ya ocupadas por profesor y día, en una sola consulta
+    ocupadas = {}
+    for profesor_id, fecha, sesion in SalidaDisponible.objects.filter(
+            profesor_id__in=profesores, fecha__range=(desde, hasta)
+    ).values_list('profesor_id', 'fecha', 'sesion'):
+        ocupadas.setdefault((profesor_id, fecha), {})[sesion] = None
+
+    nuevas = []
+    for recurrencia in recurrencias:
+        solapes = SalidaDisponible.SESIONES_COMPATIBLES[recurrencia.sesion]
+        for fecha in fechas(recurrencia, desde, hasta):
+            sesiones = ocupadas.setdefault((recurrencia.profesor_id, fecha), {})
+            choque = next((s for s in solapes if s in sesiones), None)
+            if choque is not None:
+                origen = sesiones[choque]
+                resultado.conflictos.append(Conflicto(
+                    recurrencia.pk, fecha, recurrencia.sesion,
+                    f"Choca con la plantilla {origen}." if origen
+                    else f"Ya existe una salida ({choque})."))
+                continue
+            sesiones[recurrencia.sesion] = recurrencia.pk
+            nuevas.append(SalidaDisponible(
+                profesor_id=recurrencia.profesor_id, zona_id=recurrencia.zona_id,
+                fecha=fecha, sesion=recurrencia.sesion,
+                cupo_maximo=recurrencia.cupo_maximo))
+    return nuevas
@@ -0,0 +1,199 @@
+# practicas/examenes.py
+"""
+Carga masiva de resultados de examen.
+
+Cada fila indica `solicitud`, `fase` (id o nombre) y `aprobado`. La fila
+se valida con la misma regla que `Solicitud.puede_avanzar`: la fase debe
+ser la siguiente del permiso. Si el alumno aprueba, su `fase_actual`
+avanza y una fila posterior del mismo lote puede examinarle de la fase
+siguiente. Toda fila registrada deja la solicitud como ASISTIDA.
+
+Las solicitudes se leen por lotes y el orden de fases sale de la caché de
+`practicas.fases`. La escritura es un `bulk_create` de `ExamenIntento`
+y un UPDATE por fase alcanzada, todo en una sola transacción.
+"""
+import csv
+import json
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Fase, Solicitud, ExamenIntento
+
+LOTE = 500
+
+VERDADEROS = {'1', 'true', 'si', 'sí', 's', 'apto', 'aprobado', 'yes', 'y'}
+FALSOS = {'0', 'false', 'no', 'n', 'no apto', 'suspenso', 'suspendido'}
+
+
+class FilaIlegible:
+    """Línea del fichero que no se pudo leer; sale en el informe como error."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _lineas(fichero):
+    """(número, texto o None, error) de cada línea, decodificada por separado."""
+    for numero, crudo in enumerate(fichero, start=1):
+        try:
+            yield numero, crudo.decode('utf-8-sig' if numero == 1 else 'utf-8'), None
+        except UnicodeDecodeError:
+            yield numero, None, FilaIlegible(f"Línea {numero}: no está en UTF-8.")
+
+
+def _leer_jsonl(fichero):
+    for numero, linea, ilegible in _lineas(fichero):
+        if ilegible:
+            yield ilegible
+        elif linea.strip():
+            try:
+                yield json.loads(linea)
+            except ValueError as exc:
+                yield FilaIlegible(f"Línea {numero}: JSON no válido ({exc}).")
+
+
+def _leer_csv(fichero):
+    # Las líneas que no se decodifican no llegan al lector; su error se
+    # intercala antes de la fila siguiente.
+    ilegibles = []
+
+    def texto():
+        for _, linea, ilegible in _lineas(fichero):
+            if ilegible:
+                ilegibles.append(ilegible)
+            else:
+                yield linea
+
+    lector = csv.reader(texto())
+    cabecera = next(lector, None)
+    while True:
+        try:
+            valores = next(lector)
+        except StopIteration:
+            break
+        except csv.Error as exc:
+            ilegibles.append(FilaIlegible(f"Línea {lector.line_num}: {exc}."))
+            valores = None
+        yield from ilegibles
+        ilegibles.clear()
+        if valores:
+            yield dict(zip(cabecera, valores))
+    yield from ilegibles
+
+
+def leer_filas(fichero, nombre=''):
+    """
+    Lee un fichero binario CSV (con cabecera) o JSONL según la extensión
+    de `nombre` y devuelve un iterador de dicts. Cada línea se decodifica
+    y se interpreta por separado: las que no son UTF-8 o JSON válido salen
+    como `FilaIlegible` y no cortan la carga.
+    """
+    if nombre.lower().endswith(('.jsonl', '.json', '.ndjson')):
+        return _leer_jsonl(fichero)
+    return _leer_csv(fichero)
+
+
+def _a_booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    valor = str(valor).strip().lower()
+    if valor in VERDADEROS:
+        return True
+    if valor in FALSOS:
+        return False
+    raise ValueError(f"Valor de 'aprobado' no reconocido: {valor!r}")
+
+
+def registrar_resultados(filas):
+    """
+    Valida y guarda un lote de resultados. Devuelve el informe por fila:
+    `{'fila', 'solicitud', 'fase', 'aprobado', 'ok', 'error'}`.
+    """
+    fases = list(Fase.objects.all())
+    por_id = {str(f.pk): f for f in fases}
+    por_nombre = {f.nombre.strip().lower(): f for f in fases}
+
+    # 1) Normalizar filas
+    informe, pendientes = [], []
+    for numero, fila in enumerate(filas, start=1):
+        if not isinstance(fila, dict):
+            informe.append({'fila': numero, 'solicitud': None, 'fase': None,
+                            'aprobado': None, 'ok': False,
+                            'error': fila.error if isinstance(fila, FilaIlegible)
+                            else "La fila no es un objeto."})
+            continue
+        linea = {'fila': numero, 'solicitud': fila.get('solicitud'),
+                 'fase': fila.get('fase'), 'aprobado': fila.get('aprobado'),
+                 'ok': False, 'error': None}
+        informe.append(linea)
+        try:
+            linea['solicitud'] = int(fila.get('solicitud'))
+            clave = str(fila.get('fase', '')).strip()
+            fase = por_id.get(clave) or por_nombre.get(clave.lower())
+            if fase is None:
+                raise ValueError(f"Fase desconocida: {clave!r}")
+            linea['aprobado'] = _a_booleano(fila.get('aprobado'))
+        except (TypeError, ValueError) as exc:
+            linea['error'] = str(exc)
+            continue
+        linea['fase'] = fase.nombre
+        pendientes.append((linea, fase))
+
+    with transaction.atomic():
+        # 2) Cargar las solicitudes implicadas por lotes
+        ids = sorted({linea['solicitud'] for linea, _ in pendientes})
+        solicitudes = {}
+        for i in range(0, len(ids), LOTE):
+            for pk, permiso_id, fase_actual_id in (
+                    Solicitud.objects.select_for_update()
+                    .filter(pk__in=ids[i:i + LOTE])
+                    .values_list('id', 'permiso_id', 'fase_actual_id')):
+                solicitudes[pk] = Solicitud(
+                    pk=pk, permiso_id=permiso_id, fase_actual_id=fase_actual_id)
+
+        # 3) Validar en memoria con la regla de `puede_avanzar`
+        intentos, registradas, avanzadas = [], set(), set()
+        for linea, fase in pendientes:
+            solicitud = solicitudes.get(linea['solicitud'])
+            if solicitud is None:
+                linea['error'] = "La solicitud no existe."
+                continue
+            if not solicitud.puede_avanzar(fase):
+                siguiente = solicitud.siguiente_fase()
+                linea['error'] = (
+                    f"La siguiente fase es {siguiente.nombre}." if siguiente
+                    else "La solicitud ya superó todas las fases.")
+                continue
+            intentos.append(ExamenIntento(
+                solicitud_id=solicitud.pk, fase=fase, aprobado=linea['aprobado']))
+            registradas.add(solicitud.pk)
+            if linea['aprobado']:
+                solicitud.fase_actual_id = fase.pk
+                avanzadas.add(solicitud.pk)
+            linea['ok'] = True
+
+        # 4) Escritura en bloque
+        por_fase = defaultdict(list)
+        for pk in registradas:
+            fase_id = solicitudes[pk].fase_actual_id if pk in avanzadas else None
+            por_fase[fase_id].append(pk)
+
+        ExamenIntento.objects.bulk_create(intentos, batch_size=LOTE)
+        for fase_id, pks in por_fase.items():
+            cambios = {'estado': Solicitud.Estados.ASISTIDA}
+            if fase_id is not None:
+                cambios['fase_actual_id'] = fase_id
+            for i in range(0, len(pks), LOTE):
+                Solicitud.objects.filter(pk__in=pks[i:i + LOTE]).update(**cambios)
+
+    return informe
+
+
+def resumen(informe):
+    registradas = sum(1 for linea in informe if linea['ok'])
+    return {
+        'registradas': registradas,
+        'errores': len(informe) - registradas,
+        'filas': informe,
+    }
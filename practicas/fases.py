@@ -0,0 +1,51 @@
+# practicas/fases.py
+"""
+Caché en memoria del orden de fases de cada permiso.
+
+La primera consulta carga todas las filas de `PermisoFase` de una vez y
+construye, por permiso, la tupla ordenada de fases y la tabla de
+"siguiente fase". A partir de ahí `Solicitud.puede_avanzar` no hace
+ninguna consulta. Las señales de `practicas.signals` vacían la caché al
+guardar o borrar una `Fase` o un `PermisoFase` (ver `CacheLocal`).
+"""
+from typing import NamedTuple
+
+from backend.cache import CacheLocal
+
+
+class OrdenFases(NamedTuple):
+    fases: tuple
+    # fase_id → fase siguiente (None tras la última)
+    siguiente: dict
+
+
+_VACIO = OrdenFases(fases=(), siguiente={})
+
+
+def _cargar():
+    from .models import PermisoFase
+
+    filas = (PermisoFase.objects
+             .select_related('fase')
+             .order_by('permiso_id', 'orden', 'id'))
+    por_permiso = {}
+    for pf in filas:
+        por_permiso.setdefault(pf.permiso_id, []).append(pf.fase)
+
+    cache = {}
+    for permiso_id, fases in por_permiso.items():
+        siguiente = {
+            fase.pk: fases[i + 1] if i + 1 < len(fases) else None
+            for i, fase in enumerate(fases)
+        }
+        cache[permiso_id] = OrdenFases(tuple(fases), siguiente)
+    return cache
+
+
+_orden = CacheLocal(_cargar)
+invalidar = _orden.invalidar
+
+
+def orden_fases(permiso_id):
+    """Fases ordenadas y tabla de siguiente fase de un permiso."""
+    return _orden.obtener().get(permiso_id, _VACIO)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from practicas.asignacion import asignar_solicitudes
+
+
+class Command(BaseCommand):
+    help = 'Asigna las solicitudes en cola a las plazas libres de las salidas futuras'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--simular', action='store_true',
+            help='Calcula la asignación sin guardar reservas')
+
+    def handle(self, *args, **options):
+        resultado = asignar_solicitudes(simular=options['simular'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultado.asignadas} reservas para {resultado.solicitudes} "
+            f"solicitudes y {resultado.plazas} plazas "
+            f"(llenado {resultado.tasa_llenado:.1%}, {resultado.segundos:.3f}s)"
+            + (' [simulación]' if options['simular'] else '')))
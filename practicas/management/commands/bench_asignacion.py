@@ -0,0 +1,42 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from practicas.asignacion import calcular_asignacion
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo y la tasa de llenado del asignador con datos sintéticos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alumnos', type=int, default=5000)
+        parser.add_argument('--salidas', type=int, default=2000)
+        parser.add_argument('--zonas', type=int, default=20)
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['semilla'])
+        zonas = range(options['zonas'])
+        hoy = date.today()
+
+        solicitudes = [
+            (i, rnd.choice(zonas), rnd.choice('MTB'))
+            for i in range(options['alumnos'])
+        ]
+        salidas = [
+            (i, rnd.choice(zonas), rnd.choice('MMTTB'),
+             hoy + timedelta(days=rnd.randrange(60)), rnd.randint(1, 3))
+            for i in range(options['salidas'])
+        ]
+        plazas = sum(s[4] for s in salidas)
+
+        inicio = time.perf_counter()
+        pares = calcular_asignacion(solicitudes, salidas)
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(
+            f"{len(solicitudes)} alumnos, {len(salidas)} salidas, "
+            f"{plazas} plazas → {len(pares)} asignadas "
+            f"(llenado {len(pares) / plazas:.1%}) en {segundos * 1000:.1f} ms")
@@ -0,0 +1,79 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from backend import cache
+from backend.middleware import COMPRESORES
+from practicas.management.commands.explicar_consultas import Command as ExplicarConsultas
+from usuarios.models import User
+
+ENDPOINTS = [
+    'solicitudes', 'salidas', 'reservas', 'horarios-disponibles',
+    'clases-practicas', 'alumnos', 'users', 'zonas', 'permisos',
+]
+
+
+class Command(BaseCommand):
+    help = ('Mide, por endpoint, los bytes que ahorra la compresión br/gzip '
+            'de `backend.middleware` y el tiempo de CPU que cuesta')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sembrar', type=int, default=0, metavar='N',
+                            help='Crea N solicitudes sintéticas (como explicar_consultas)')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Todo se deshace al terminar
+        with transaction.atomic():
+            if options['sembrar']:
+                ExplicarConsultas(stdout=self.stdout)._sembrar(options['sembrar'])
+            admin = User.objects.create(username='bench-compresion', is_staff=True)
+            self._medir(admin, options)
+            transaction.set_rollback(True)
+        # Que no queden en la caché respuestas con datos deshechos
+        cache.invalidar('zonas', 'permisos', 'salidas', 'zona_activa')
+
+    def _cuerpo(self, admin, endpoint, page_size):
+        ruta = f'/api/v1/{endpoint}/'
+        host = (settings.ALLOWED_HOSTS or ['localhost'])[0]
+        request = APIRequestFactory().get(
+            ruta, {'page_size': page_size}, HTTP_HOST=host)
+        force_authenticate(request, user=admin)
+        response = resolve(ruta).func(request)
+        response.render()
+        return response.content
+
+    def _medir(self, admin, options):
+        repeticiones = options['repeticiones']
+        cabecera = f"{'endpoint':<22}{'original':>10}"
+        for nombre in COMPRESORES:
+            cabecera += f"{nombre:>10}{'ahorro':>8}{'ms':>8}"
+        self.stdout.write(cabecera)
+
+        totales = {nombre: [0, 0.0] for nombre in COMPRESORES}
+        total_original = 0
+        for endpoint in ENDPOINTS:
+            cuerpo = self._cuerpo(admin, endpoint, options['page_size'])
+            total_original += len(cuerpo)
+            fila = f'{endpoint:<22}{len(cuerpo):>10}'
+            for nombre, comprimir in COMPRESORES.items():
+                inicio = time.process_time()
+                for _ in range(repeticiones):
+                    comprimido = comprimir(cuerpo)
+                ms = (time.process_time() - inicio) * 1000 / repeticiones
+                ahorro = 1 - len(comprimido) / len(cuerpo) if cuerpo else 0
+                totales[nombre][0] += len(comprimido)
+                totales[nombre][1] += ms
+                fila += f'{len(comprimido):>10}{ahorro:>8.0%}{ms:>8.2f}'
+            self.stdout.write(fila)
+
+        resumen = ', '.join(
+            f'{nombre}: {1 - b / total_original:.0%} menos en {ms:.1f} ms de CPU'
+            for nombre, (b, ms) in totales.items()) if total_original else 'sin datos'
+        self.stdout.write(self.style.SUCCESS(
+            f'🎉 {total_original} bytes sin comprimir; {resumen}.'))
@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from citas.models import HorarioDisponible
+from citas.serializers import HorarioDisponibleSerializer, HorarioDisponibleLectura
+from practicas.management.commands.explicar_consultas import Command as ExplicarConsultas
+from practicas.models import Solicitud, Reserva
+from practicas.serializers import (
+    SolicitudSerializer,
+    SolicitudLectura,
+    ReservaSerializer,
+    ReservaLectura,
+)
+
+# (nombre, queryset del viewset, serializer, lectura rápida)
+CASOS = [
+    ('solicitudes',
+     Solicitud.objects.select_related('alumno__usuario', 'zona')
+     .order_by('fecha_inscripcion', 'id'),
+     SolicitudSerializer, SolicitudLectura),
+    ('reservas',
+     Reserva.objects.select_related('alumno', 'salida__profesor__usuario', 'salida__zona')
+     .order_by('created_at', 'id'),
+     ReservaSerializer, ReservaLectura),
+    ('horarios-disponibles',
+     HorarioDisponible.objects.select_related('profesor__usuario')
+     .order_by('fecha_hora_inicio', 'id'),
+     HorarioDisponibleSerializer, HorarioDisponibleLectura),
+]
+
+
+class Command(BaseCommand):
+    help = ('Compara el tiempo de listar con el ModelSerializer y con la '
+            'lectura rápida sobre .values() (consulta incluida)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sembrar', type=int, default=10000, metavar='N',
+                            help='Crea N solicitudes sintéticas (como explicar_consultas); 0 para '
+                                 'usar solo los datos existentes')
+        parser.add_argument('--filas', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--repeticiones', type=int, default=3)
+
+    def handle(self, *args, **options):
+        # Todo se deshace al terminar
+        with transaction.atomic():
+            if options['sembrar']:
+                ExplicarConsultas(stdout=self.stdout)._sembrar(options['sembrar'])
+            self._medir(options)
+            transaction.set_rollback(True)
+
+    def _mejor(self, repeticiones, funcion):
+        mejor, resultado = None, None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = funcion()
+            segundos = time.perf_counter() - inicio
+            mejor = segundos if mejor is None else min(mejor, segundos)
+        return mejor * 1000, resultado
+
+    def _medir(self, options):
+        repeticiones = options['repeticiones']
+        distintos = []
+        self.stdout.write(
+            f"{'endpoint':<22}{'filas':>7}{'serializer':>12}{'values()':>10}{'x':>7}")
+        for nombre, qs, serializer, lectura_class in CASOS:
+            for n in options['filas']:
+                ms_lento, lento = self._mejor(
+                    repeticiones, lambda: serializer(qs[:n], many=True).data)
+                lectura = lectura_class()
+                ms_rapido, rapido = self._mejor(
+                    repeticiones,
+                    lambda: lectura.serializar(qs.values(*lectura.campos)[:n]))
+
+                if JSONRenderer().render(lento) != JSONRenderer().render(rapido):
+                    self.stdout.write(self.style.ERROR(
+                        f'❌ {nombre}: la lectura rápida no coincide con el serializer'))
+                    distintos.append(nombre)
+                    continue
+                self.stdout.write(
+                    f'{nombre:<22}{len(rapido):>7}{ms_lento:>10.1f}ms'
+                    f'{ms_rapido:>8.1f}ms{ms_lento / ms_rapido:>6.1f}x')
+        if not distintos:
+            self.stdout.write(self.style.SUCCESS('🎉 Misma salida en todos los listados.'))
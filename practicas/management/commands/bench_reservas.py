@@ -0,0 +1,83 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from practicas.models import Zona, SalidaDisponible
+from practicas.services import reservar_plaza, SalidaCompletaError
+from usuarios.models import User, Profesor
+
+PREFIJO = 'bench-reservas'
+
+
+class Command(BaseCommand):
+    help = ('Lanza reservas concurrentes sobre una salida con hilos, comprueba '
+            'que no hay sobreventa y mide las reservas por segundo')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=24)
+        parser.add_argument('--cupo', type=int, default=5)
+
+    def handle(self, *args, **options):
+        hilos, cupo = options['hilos'], options['cupo']
+        # Los hilos usan sus propias conexiones y confirman cada reserva, así
+        # que no cabe una transacción que se deshaga: se borra todo al final
+        profesor = Profesor.objects.create(usuario=User.objects.create(
+            username=f'{PREFIJO}-profe', rol=User.Roles.PROFESOR))
+        zona = Zona.objects.create(nombre=f'{PREFIJO}-zona')
+        try:
+            salida = SalidaDisponible.objects.create(
+                profesor=profesor, zona=zona, sesion='M', cupo_maximo=cupo,
+                fecha=timezone.localdate() + timedelta(days=1))
+            alumnos = User.objects.bulk_create(
+                [User(username=f'{PREFIJO}-{i}') for i in range(hilos)])
+            self._medir(salida, alumnos, cupo)
+        finally:
+            User.objects.filter(username__startswith=PREFIJO).delete()
+            zona.delete()
+
+    def _medir(self, salida, alumnos, cupo):
+        barrera = threading.Barrier(len(alumnos))
+        resultados = []
+
+        def reservar(alumno):
+            try:
+                barrera.wait()
+                while True:
+                    try:
+                        reservar_plaza(SalidaDisponible.objects.get(pk=salida.pk), alumno)
+                        resultados.append('ok')
+                        return
+                    except SalidaCompletaError:
+                        resultados.append('completa')
+                        return
+                    except OperationalError:
+                        # SQLite devuelve "table is locked" en vez de esperar
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reservar, args=(a,)) for a in alumnos]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        salida.refresh_from_db()
+        reservas = salida.reservas.count()
+        self.stdout.write(
+            f"{len(alumnos)} intentos en {duracion:.3f} s "
+            f"({len(alumnos) / duracion:.0f} reservas/s): "
+            f"{resultados.count('ok')} ok, {resultados.count('completa')} completas")
+        if reservas == salida.plazas_ocupadas <= cupo:
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Sin sobreventa: {reservas}/{cupo} plazas ocupadas.'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'❌ {reservas} reservas y plazas_ocupadas={salida.plazas_ocupadas} '
+                f'con cupo {cupo}.'))
@@ -0,0 +1,172 @@
+import random
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from citas.models import HorarioDisponible, ClasePractica
+from citas.views import HorarioDisponibleViewSet, ClasePracticaViewSet
+from practicas.models import Zona, Permiso, Solicitud, SalidaDisponible, Reserva
+from practicas.views import (
+    SolicitudViewSet,
+    SalidaDisponibleViewSet,
+    ReservaViewSet,
+)
+from usuarios.models import User, Profesor, Alumno
+
+VISTAS = [
+    ('solicitudes', SolicitudViewSet),
+    ('salidas', SalidaDisponibleViewSet),
+    ('reservas', ReservaViewSet),
+    ('horarios-disponibles', HorarioDisponibleViewSet),
+    ('clases-practicas', ClasePracticaViewSet),
+]
+
+# "Seq Scan on tabla" en PostgreSQL, "SCAN tabla" sin índice en SQLite
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)|SCAN (\w+)\b(?! USING)')
+
+
+class Command(BaseCommand):
+    help = ('Ejecuta EXPLAIN sobre el queryset de listado de cada viewset y '
+            'avisa de los recorridos secuenciales')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sembrar', type=int, default=0, metavar='N',
+            help='Crea N solicitudes sintéticas (y salidas/reservas en '
+                 'proporción) dentro de una transacción que se deshace al final')
+        parser.add_argument(
+            '--fallar', action='store_true',
+            help='Termina con error si algún plan tiene un recorrido secuencial')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['sembrar']:
+                self._sembrar(options['sembrar'])
+            avisos = self._explicar()
+            transaction.set_rollback(True)
+
+        if avisos and options['fallar']:
+            raise CommandError(
+                f"{len(avisos)} planes con recorrido secuencial: "
+                + ', '.join(avisos))
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 Planes revisados ({len(avisos)} avisos)."))
+
+    # ------------------------------------------------------------------ #
+    def _usuarios_por_rol(self):
+        roles = {'admin': User.objects.filter(is_staff=True).first()}
+        profesor = Profesor.objects.select_related('usuario').first()
+        roles['profesor'] = profesor.usuario if profesor else None
+        alumno = Alumno.objects.select_related('usuario').first()
+        roles['alumno'] = alumno.usuario if alumno else None
+        return {rol: user for rol, user in roles.items() if user}
+
+    def _explicar(self):
+        factory = APIRequestFactory()
+        avisos = []
+        for rol, user in self._usuarios_por_rol().items():
+            for nombre, viewset in VISTAS:
+                request = factory.get(f'/api/v1/{nombre}/')
+                force_authenticate(request, user=user)
+                vista = viewset(action_map={'get': 'list'}, format_kwarg=None,
+                                args=(), kwargs={})
+                vista.request = vista.initialize_request(request)
+                etiqueta = f'{nombre} [{rol}]'
+                try:
+                    qs = vista.filter_queryset(vista.get_queryset())
+                    plan = qs[:100].explain()
+                except Exception as exc:  # el informe sigue con las demás
+                    self.stdout.write(self.style.ERROR(
+                        f'❌ {etiqueta}: {exc.__class__.__name__}: {exc}'))
+                    continue
+
+                scans = sorted({a or b for a, b in SEQ_SCAN.findall(plan)})
+                if scans:
+                    avisos.append(etiqueta)
+                    self.stdout.write(self.style.WARNING(
+                        f'⚠️ {etiqueta}: recorrido secuencial en {", ".join(scans)}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'✅ {etiqueta}'))
+                self.stdout.write(plan + '\n')
+        return avisos
+
+    # ------------------------------------------------------------------ #
+    def _sembrar(self, n):
+        rnd = random.Random(42)
+        hoy = timezone.now()
+        sufijo = f'{rnd.getrandbits(32):08x}'
+
+        zonas = Zona.objects.bulk_create(
+            [Zona(nombre=f'Zona {sufijo}-{i}') for i in range(50)])
+        permiso, _ = Permiso.objects.get_or_create(
+            codigo='B', defaults={'descripcion': 'Turismo'})
+
+        User.objects.bulk_create([
+            User(username=f'explain-{sufijo}-admin', password='!', is_staff=True)
+        ] + [
+            User(username=f'explain-{sufijo}-p{i}', password='!',
+                 rol=User.Roles.PROFESOR) for i in range(20)
+        ] + [
+            User(username=f'explain-{sufijo}-a{i}', password='!')
+            for i in range(n)
+        ], batch_size=1000)
+        usuarios = dict(User.objects
+                        .filter(username__startswith=f'explain-{sufijo}-')
+                        .values_list('username', 'id'))
+
+        Profesor.objects.bulk_create([
+            Profesor(usuario_id=usuarios[f'explain-{sufijo}-p{i}'])
+            for i in range(20)])
+        profesores = list(Profesor.objects.filter(
+            usuario__username__startswith=f'explain-{sufijo}-p'))
+        Alumno.objects.bulk_create([
+            Alumno(usuario_id=usuarios[f'explain-{sufijo}-a{i}'])
+            for i in range(n)], batch_size=1000)
+        alumnos = list(Alumno.objects
+                       .filter(usuario__username__startswith=f'explain-{sufijo}-a')
+                       .values_list('id', 'usuario_id'))
+
+        Solicitud.objects.bulk_create([
+            Solicitud(alumno_id=alumno_id, zona=rnd.choice(zonas),
+                      permiso=permiso, sesion_preferida=rnd.choice('MTB'),
+                      estado=rnd.choice('SSEIICRAN'),
+                      fecha_inscripcion=hoy - timedelta(minutes=rnd.randrange(10 ** 6)))
+            for alumno_id, _ in alumnos], batch_size=1000)
+
+        SalidaDisponible.objects.bulk_create([
+            SalidaDisponible(profesor=profesor, zona=rnd.choice(zonas),
+                             fecha=(hoy + timedelta(days=dia)).date(),
+                             sesion=sesion, cupo_maximo=3)
+            for profesor in profesores
+            for dia in range(-max(n // 200, 1), max(n // 200, 1))
+            for sesion in 'MT'], batch_size=1000)
+        salidas = list(SalidaDisponible.objects.filter(profesor__in=profesores))
+
+        Reserva.objects.bulk_create([
+            Reserva(alumno_id=usuario_id, salida=rnd.choice(salidas), estado='C')
+            for _, usuario_id in alumnos[: len(salidas)]],
+            batch_size=1000, ignore_conflicts=True)
+
+        HorarioDisponible.objects.bulk_create([
+            HorarioDisponible(profesor=profesor,
+                              fecha_hora_inicio=hoy + timedelta(hours=h),
+                              fecha_hora_fin=hoy + timedelta(hours=h + 1))
+            for profesor in profesores
+            for h in range(-n // 40, n // 40)], batch_size=1000)
+        horarios = list(HorarioDisponible.objects
+                        .filter(profesor__in=profesores)
+                        .values_list('id', flat=True)[: n // 2])
+        ClasePractica.objects.bulk_create([
+            ClasePractica(alumno_id=usuario_id, horario_id=horario_id)
+            for (_, usuario_id), horario_id in zip(alumnos, horarios)],
+            batch_size=1000)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(
+            f'🌱 Sembradas {n} solicitudes, {len(salidas)} salidas '
+            f'y {len(horarios)} clases.')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from practicas import zonas
+from practicas.models import Zona
+
+
+class Command(BaseCommand):
+    help = ('Une las zonas escritas de distinta forma ("Ejido", "El ejido") '
+            'y reapunta sus solicitudes y salidas a la zona principal')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--simular', action='store_true',
+            help='Muestra las fusiones sin guardar nada')
+
+    def handle(self, *args, **options):
+        destinos = zonas.duplicados()
+        if not destinos:
+            self.stdout.write(self.style.SUCCESS('✅ No hay zonas duplicadas.'))
+            return
+
+        nombres = dict(Zona.objects
+                       .filter(pk__in=set(destinos) | set(destinos.values()))
+                       .values_list('id', 'nombre'))
+        for zona_id, destino in sorted(destinos.items()):
+            self.stdout.write(f'🔀 {nombres[zona_id]} → {nombres[destino]}')
+
+        if options['simular']:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ Simulación: {len(destinos)} zonas se fusionarían.'))
+            return
+
+        movidas = zonas.fusionar(destinos)
+        for modelo, n in sorted(movidas.items()):
+            self.stdout.write(f'   {modelo}: {n} filas')
+        self.stdout.write(self.style.SUCCESS(
+            f'🎉 {len(destinos)} zonas fusionadas.'))
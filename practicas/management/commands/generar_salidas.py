@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from practicas.calendario import SEMANAS, generar_salidas
+
+
+class Command(BaseCommand):
+    help = 'Genera las salidas de las plantillas semanales activas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde', help='Fecha inicial AAAA-MM-DD (por defecto, hoy)')
+        parser.add_argument('--semanas', type=int, default=SEMANAS)
+        parser.add_argument(
+            '--simular', action='store_true',
+            help='Calcula las salidas y los conflictos sin guardar nada')
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde']) if options['desde'] else None
+        except ValueError:
+            raise CommandError(f"Fecha no válida: {options['desde']}")
+        hasta = (desde or date.today()) + timedelta(weeks=options['semanas'])
+
+        try:
+            resultado = generar_salidas(
+                desde=desde, hasta=hasta, simular=options['simular'])
+        except IntegrityError:
+            raise CommandError(
+                'Las salidas cambiaron mientras se generaban; no se guardó nada.')
+        for conflicto in resultado.conflictos:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ Plantilla {conflicto.recurrencia_id} el {conflicto.fecha} '
+                f'({conflicto.sesion}): {conflicto.motivo}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {resultado.creadas} salidas generadas, '
+            f'{len(resultado.conflictos)} conflictos'
+            + (' [simulación]' if options['simular'] else '')))
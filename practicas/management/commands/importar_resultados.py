@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from practicas.examenes import leer_filas, registrar_resultados, resumen
+
+
+class Command(BaseCommand):
+    help = 'Registra resultados de examen desde un CSV o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'ruta', help='Fichero .csv (solicitud,fase,aprobado) o .jsonl')
+
+    def handle(self, *args, **options):
+        ruta = options['ruta']
+        try:
+            with open(ruta, 'rb') as fichero:
+                datos = resumen(registrar_resultados(leer_filas(fichero, ruta)))
+        except OSError as exc:
+            raise CommandError(f'No se puede leer {ruta}: {exc}')
+
+        for linea in datos['filas']:
+            if not linea['ok']:
+                self.stdout.write(self.style.WARNING(
+                    f"⚠️ Fila {linea['fila']} (solicitud {linea['solicitud']}): "
+                    f"{linea['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 {datos['registradas']} resultados registrados, "
+            f"{datos['errores']} con errores."))
@@ -1,14 +1,53 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from django.core.management.base import BaseCommand
+from itertools import islice
+
+import django
 from django.contrib.auth import get_user_model
-from practicas.models import Solicitud, Zona, Permiso
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from practicas import zonas
+from practicas.examenes import FilaIlegible, leer_filas
+from practicas.models import Solicitud, Permiso
 from usuarios.models import Alumno
 
 User = get_user_model()
 
+# Cada hash PBKDF2 cuesta décimas de segundo: a partir de unas pocas
+# contraseñas ya compensa arrancar procesos
+MIN_HASH_PARALELO = 8
+
+
+def _iniciar_django():
+    """Inicializador de los procesos hijos (necesario con 'spawn')."""
+    django.setup()
+
+
+def _convertir_sesion(sesion_raw):
+    sesion_raw = sesion_raw.lower()
+    if 'm' in sesion_raw and 't' in sesion_raw:
+        return 'B'
+    if 'm' in sesion_raw:
+        return 'M'
+    if 't' in sesion_raw:
+        return 'T'
+    return 'M'
+
+
+def _convertir_fecha(valor):
+    try:
+        return datetime.strptime(valor, '%d/%m/%y').date()
+    except (TypeError, ValueError):
+        return None
+
 
 class Command(BaseCommand):
-    help = 'Importa alumnos y solicitudes desde una lista interna'
+    help = ('Importa alumnos y solicitudes desde un CSV/JSONL '
+            '(nombre,telefono,sesion,fecha_teorico,zona,notas) '
+            'o, sin fichero, desde la lista interna')
 
     ALUMNOS = [
         {'nombre': 'NAZHA FADLI', 'telefono': '617075961', 'sesion': 'm',
@@ -95,72 +134,147 @@ class Command(BaseCommand):
             'fecha_teorico': '11/03/24', 'zona': 'El ejido', 'notas': '09/05/25'}
     ]
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'ruta', nargs='?',
+            help='Fichero .csv o .jsonl; si se omite se usa la lista interna')
+        parser.add_argument('--lote', type=int, default=1000)
+        parser.add_argument(
+            '--procesos', type=int, default=os.cpu_count() or 1,
+            help='Procesos para calcular los hashes de contraseña')
+
+    # ------------------------------------------------------------------ #
+    def _leer(self, ruta):
+        if not ruta:
+            yield from self.ALUMNOS
+            return
+        try:
+            with open(ruta, 'rb') as fichero:
+                yield from leer_filas(fichero, ruta)
+        except OSError as exc:
+            raise CommandError(f'No se puede leer {ruta}: {exc}')
+
+    def _limpiar(self, datos):
+        """(telefono, campos ya convertidos) o ValueError con el motivo."""
+        if isinstance(datos, FilaIlegible):
+            raise ValueError(datos.error)
+        if not isinstance(datos, dict):
+            raise ValueError('La fila no es un objeto.')
+
+        def texto(campo):
+            valor = datos.get(campo)
+            return '' if valor is None else str(valor).strip()
+
+        telefono, nombre, zona = texto('telefono'), texto('nombre'), texto('zona')
+        if not telefono:
+            raise ValueError('Falta el teléfono.')
+        if not nombre:
+            raise ValueError('Falta el nombre.')
+        if not zonas.normalizar(zona):
+            raise ValueError('Falta la zona.')
+        return telefono, {
+            'nombre': nombre,
+            'zona': zona,
+            'sesion': _convertir_sesion(texto('sesion')),
+            'fecha_teorico': _convertir_fecha(texto('fecha_teorico')),
+            'notas': texto('notas'),
+        }
+
+    def _lotes(self, filas, tamano):
+        filas = iter(filas)
+        while lote := list(islice(filas, tamano)):
+            yield lote
+
+    def _hashes(self, pool, claves):
+        if pool is None or len(claves) < MIN_HASH_PARALELO:
+            return [make_password(c) for c in claves]
+        return list(pool.map(make_password, claves, chunksize=4))
+
+    # ------------------------------------------------------------------ #
+    def handle(self, *args, **options):
         permiso = Permiso.objects.first()
         if not permiso:
             self.stdout.write(self.style.ERROR(
                 '❌ No hay permisos de conducir definidos.'))
             return
 
-        for datos in self.ALUMNOS:
-            nombre = datos['nombre'].strip()
-            telefono = datos['telefono'].strip()
-            sesion_raw = datos['sesion'].lower().strip()
-            zona_nombre = datos['zona'].strip().capitalize()
-            notas = datos.get('notas', '').strip()
-
-            # Convertir sesión
-            if 'm' in sesion_raw and 't' in sesion_raw:
-                sesion = 'B'
-            elif 'm' in sesion_raw:
-                sesion = 'M'
-            elif 't' in sesion_raw:
-                sesion = 'T'
-            else:
-                sesion = 'M'
-
-            # Convertir fecha teórica
-            try:
-                fecha_teorico = datetime.strptime(
-                    datos['fecha_teorico'], '%d/%m/%y').date()
-            except ValueError:
-                fecha_teorico = None
-
-            # Crear zona si no existe
-            zona, _ = Zona.objects.get_or_create(
-                nombre__iexact=zona_nombre, defaults={'nombre': zona_nombre})
-
-            # Separar nombre
-            partes = nombre.split()
-            first_name = partes[0]
-            last_name = ' '.join(partes[1:]) if len(partes) > 1 else ''
-
-            if User.objects.filter(username=telefono).exists():
-                self.stdout.write(self.style.WARNING(
-                    f"⚠️ Usuario con teléfono {telefono} ya existe."))
-                continue
-
-            user = User.objects.create_user(
-                username=telefono,
-                first_name=first_name,
-                last_name=last_name,
-                password=telefono,
-                rol=User.Roles.ALUMNO
-            )
+        creados = existentes = omitidas = 0
+        numero = 0
+        pool = None
+        try:
+            for lote in self._lotes(self._leer(options['ruta']), options['lote']):
+                filas = {}
+                for datos in lote:
+                    numero += 1
+                    try:
+                        telefono, campos = self._limpiar(datos)
+                    except ValueError as exc:
+                        # Una fila mala no corta la carga de las demás
+                        omitidas += 1
+                        motivo = str(exc)
+                        self.stdout.write(self.style.WARNING(
+                            f'⚠️ {motivo}' if isinstance(datos, FilaIlegible)
+                            else f'⚠️ Fila {numero}: {motivo}'))
+                        continue
+                    filas.setdefault(telefono, campos)
 
-            alumno = Alumno.objects.create(usuario=user)
+                ya_existen = set(User.objects
+                                 .filter(username__in=filas)
+                                 .values_list('username', flat=True))
+                existentes += len(ya_existen)
+                nuevos = {t: d for t, d in filas.items() if t not in ya_existen}
+                if not nuevos:
+                    continue
 
-            Solicitud.objects.create(
-                alumno=alumno,
-                zona=zona,
-                permiso=permiso,
-                sesion_preferida=sesion,
-                fecha_teorico=fecha_teorico,
-                notas=notas
-            )
+                if pool is None and options['procesos'] > 1 \
+                        and len(nuevos) >= MIN_HASH_PARALELO:
+                    pool = ProcessPoolExecutor(
+                        options['procesos'], initializer=_iniciar_django)
+                hashes = self._hashes(pool, list(nuevos))
 
-            self.stdout.write(self.style.SUCCESS(
-                f"✅ Alumno {user.get_full_name()} importado correctamente."))
+                zona_ids = zonas.resolver_varios(
+                    {datos['zona'] for datos in nuevos.values()}, crear=True)
+                self._guardar(permiso, zona_ids, nuevos, hashes)
+                creados += len(nuevos)
+        finally:
+            if pool is not None:
+                pool.shutdown()
 
         self.stdout.write(self.style.SUCCESS(
-            '🎉 Proceso de importación finalizado.'))
+            f'🎉 Proceso de importación finalizado: {creados} alumnos nuevos, '
+            f'{existentes} ya existían, {omitidas} filas omitidas.'))
+
+    @transaction.atomic
+    def _guardar(self, permiso, zona_ids, nuevos, hashes):
+        usuarios = []
+        for (telefono, datos), password in zip(nuevos.items(), hashes):
+            partes = datos['nombre'].split()
+            usuarios.append(User(
+                username=telefono,
+                first_name=partes[0] if partes else '',
+                last_name=' '.join(partes[1:]),
+                password=password,
+                rol=User.Roles.ALUMNO,
+            ))
+        User.objects.bulk_create(usuarios)
+
+        ids = dict(User.objects.filter(username__in=nuevos)
+                   .values_list('username', 'id'))
+        Alumno.objects.bulk_create(
+            [Alumno(usuario_id=ids[t]) for t in nuevos])
+        alumnos = dict(Alumno.objects.filter(usuario_id__in=ids.values())
+                       .values_list('usuario_id', 'id'))
+
+        Solicitud.objects.bulk_create([
+            Solicitud(
+                alumno_id=alumnos[ids[telefono]],
+                zona_id=zona_ids[datos['zona']],
+                permiso=permiso,
+                sesion_preferida=datos['sesion'],
+                fecha_teorico=datos['fecha_teorico'],
+                notas=datos['notas'],
+            )
+            for telefono, datos in nuevos.items()
+        ])
+        # bulk_create no lanza señales
+        zonas.actualizar_zona_activa(alumnos.values())
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 06:50
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def calcular_plazas_ocupadas(apps, schema_editor):
+    SalidaDisponible = apps.get_model('practicas', 'SalidaDisponible')
+    salidas = SalidaDisponible.objects.annotate(ocupadas=Count(
+        'reservas', filter=Q(reservas__estado__in=['S', 'I', 'C'])))
+    for salida in salidas.filter(ocupadas__gt=0).iterator():
+        # Las salidas ya sobrevendidas conservan sus reservas
+        salida.plazas_ocupadas = salida.ocupadas
+        salida.cupo_maximo = max(salida.cupo_maximo, salida.ocupadas)
+        salida.save(update_fields=['plazas_ocupadas', 'cupo_maximo'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practicas', '0006_alter_solicitud_alumno'),
+        ('usuarios', '0002_alumno_address_alumno_city_alumno_genero_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salidadisponible',
+            name='plazas_ocupadas',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            calcular_plazas_ocupadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='salidadisponible',
+            constraint=models.CheckConstraint(condition=models.Q(('plazas_ocupadas__lte', models.F('cupo_maximo'))), name='salida_sin_sobreventa'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 06:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practicas', '0007_salidadisponible_plazas_ocupadas'),
+        ('usuarios', '0002_alumno_address_alumno_city_alumno_genero_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(condition=models.Q(('estado', 'E')), fields=['zona', 'sesion_preferida', 'fecha_inscripcion'], name='solicitud_espera_idx'),
+        ),
+    ]
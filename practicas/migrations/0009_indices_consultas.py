@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-18 06:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practicas', '0008_solicitud_espera_idx'),
+        ('usuarios', '0002_alumno_address_alumno_city_alumno_genero_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['salida', 'estado'], name='reserva_salida_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['created_at'], name='reserva_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salidadisponible',
+            index=models.Index(fields=['zona', 'fecha'], name='salida_zona_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salidadisponible',
+            index=models.Index(fields=['fecha', 'sesion'], name='salida_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['fecha_inscripcion'], name='solicitud_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['alumno', '-fecha_inscripcion'], name='solicitud_alumno_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(fields=['zona', 'estado', 'fecha_inscripcion'], name='solicitud_zona_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitud',
+            index=models.Index(condition=models.Q(('estado__in', ['S', 'E'])), fields=['fecha_inscripcion'], name='solicitud_abierta_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 07:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from practicas.zonas import normalizar
+
+
+def crear_alias(apps, schema_editor):
+    Zona = apps.get_model('practicas', 'Zona')
+    ZonaAlias = apps.get_model('practicas', 'ZonaAlias')
+    # Las zonas duplicadas ('Ejido' / 'El ejido') quedan sin alias propio
+    # y resuelven a la más antigua; `fusionar_zonas` las une después.
+    alias = {}
+    for zona_id, nombre in Zona.objects.order_by('id').values_list('id', 'nombre'):
+        alias.setdefault(normalizar(nombre), (nombre, zona_id))
+    ZonaAlias.objects.bulk_create([
+        ZonaAlias(clave=clave, nombre=nombre, zona_id=zona_id)
+        for clave, (nombre, zona_id) in alias.items() if clave])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practicas', '0009_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZonaAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50)),
+                ('clave', models.CharField(editable=False, max_length=50, unique=True)),
+                ('zona', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alias', to='practicas.zona')),
+            ],
+            options={
+                'verbose_name': 'Alias de zona',
+                'verbose_name_plural': 'Alias de zona',
+            },
+        ),
+        migrations.RunPython(crear_alias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 07:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practicas', '0010_zonaalias'),
+        ('usuarios', '0002_alumno_address_alumno_city_alumno_genero_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalidaRecurrente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')])),
+                ('sesion', models.CharField(choices=[('M', 'Mañana'), ('T', 'Tarde'), ('B', 'Mixta')], max_length=1)),
+                ('cupo_maximo', models.PositiveSmallIntegerField(default=3)),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('activa', models.BooleanField(default=True)),
+                ('profesor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='salidas_recurrentes', to='usuarios.profesor')),
+                ('zona', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='salidas_recurrentes', to='practicas.zona')),
+            ],
+            options={
+                'verbose_name': 'Salida Recurrente',
+                'verbose_name_plural': 'Salidas Recurrentes',
+            },
+        ),
+    ]
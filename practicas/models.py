@@ -1,7 +1,13 @@
+from datetime import datetime, time
+
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Q
 from django.utils import timezone
 from django.conf import settings
 from usuarios.models import Profesor, Alumno
+from .fases import orden_fases
+from .zonas import normalizar
 
 
 class Zona(models.Model):
@@ -15,6 +21,25 @@ class Zona(models.Model):
         return self.nombre
 
 
+class ZonaAlias(models.Model):
+    """Forma alternativa de escribir una zona, por su clave normalizada"""
+    nombre = models.CharField(max_length=50)
+    clave = models.CharField(max_length=50, unique=True, editable=False)
+    zona = models.ForeignKey(
+        Zona, on_delete=models.CASCADE, related_name='alias')
+
+    class Meta:
+        verbose_name = 'Alias de zona'
+        verbose_name_plural = 'Alias de zona'
+
+    def __str__(self):
+        return f"{self.nombre} → {self.zona}"
+
+    def save(self, *args, **kwargs):
+        self.clave = normalizar(self.nombre)
+        super().save(*args, **kwargs)
+
+
 class Permiso(models.Model):
     """Tipos de permiso de conducir disponibles"""
     codigo = models.CharField(max_length=2, unique=True)
@@ -76,15 +101,17 @@ class Solicitud(models.Model):
         ('T', 'Tarde'),
         ('B', 'Mixta'),
     ]
-    ESTADO_CHOICES = [
-        ('S', 'Solicitado'),
-        ('I', 'Invitado'),
-        ('C', 'Confirmado'),
-        ('R', 'Rechazado'),
-        ('E', 'Espera'),
-        ('A', 'Asistido'),
-        ('N', 'No Asistido'),
-    ]
+
+    class Estados(models.TextChoices):
+        PENDIENTE = 'S', 'Solicitado'
+        INVITADA = 'I', 'Invitado'
+        CONFIRMADA = 'C', 'Confirmado'
+        RECHAZADA = 'R', 'Rechazado'
+        ESPERA = 'E', 'Espera'
+        ASISTIDA = 'A', 'Asistido'
+        NO_ASISTIDA = 'N', 'No Asistido'
+
+    ESTADO_CHOICES = Estados.choices
 
     alumno = models.ForeignKey(
         Alumno,
@@ -116,6 +143,32 @@ class Solicitud(models.Model):
 
     class Meta:
         ordering = ['fecha_inscripcion']
+        indexes = [
+            # Listado completo en el orden por defecto
+            models.Index(fields=['fecha_inscripcion'], name='solicitud_fecha_idx'),
+            # Última solicitud de un alumno
+            models.Index(
+                fields=['alumno', '-fecha_inscripcion'],
+                name='solicitud_alumno_fecha_idx',
+            ),
+            # Backlog por zona y estado
+            models.Index(
+                fields=['zona', 'estado', 'fecha_inscripcion'],
+                name='solicitud_zona_estado_idx',
+            ),
+            # Solo solicitudes abiertas: lo que recorre el asignador
+            models.Index(
+                fields=['fecha_inscripcion'],
+                condition=Q(estado__in=['S', 'E']),
+                name='solicitud_abierta_idx',
+            ),
+            # Lista de espera: siguiente en cola por zona y sesión
+            models.Index(
+                fields=['zona', 'sesion_preferida', 'fecha_inscripcion'],
+                condition=Q(estado='E'),
+                name='solicitud_espera_idx',
+            ),
+        ]
         verbose_name = 'Solicitud'
         verbose_name_plural = 'Solicitudes'
 
@@ -124,14 +177,18 @@ class Solicitud(models.Model):
         return f"{nombre} - {self.get_sesion_preferida_display()} ({self.zona})"
 
     def fases_permitidas(self):
-        return [pf.fase for pf in self.permiso.permisofases.all()]
+        return list(orden_fases(self.permiso_id).fases)
+
+    def siguiente_fase(self):
+        """Fase que le toca al alumno; None si ya superó la última."""
+        orden = orden_fases(self.permiso_id)
+        if self.fase_actual_id in orden.siguiente:
+            return orden.siguiente[self.fase_actual_id]
+        return orden.fases[0] if orden.fases else None
 
     def puede_avanzar(self, nueva_fase):
-        fases = self.fases_permitidas()
-        if self.fase_actual not in fases:
-            return nueva_fase == fases[0]
-        idx = fases.index(self.fase_actual)
-        return idx + 1 < len(fases) and nueva_fase == fases[idx + 1]
+        siguiente = self.siguiente_fase()
+        return siguiente is not None and nueva_fase == siguiente
 
 
 class ExamenIntento(models.Model):
@@ -154,6 +211,16 @@ class ExamenIntento(models.Model):
 
 class SalidaDisponible(models.Model):
     SESION_CHOICES = Solicitud.SESION_CHOICES
+    # Sesiones de solicitud que encajan en cada sesión de salida
+    SESIONES_COMPATIBLES = {'M': ['M', 'B'], 'T': ['T', 'B'], 'B': ['M', 'T', 'B']}
+    # Franja horaria que ocupa cada sesión en la agenda del profesor
+    VENTANAS = {
+        'M': (time(8), time(14)),
+        'T': (time(15), time(21)),
+        'B': (time(8), time(21)),
+    }
+    # Dueño (ver citas.permissions.propios)
+    RUTA_PROFESOR = 'profesor'
 
     profesor = models.ForeignKey(
         Profesor,
@@ -165,11 +232,23 @@ class SalidaDisponible(models.Model):
     fecha = models.DateField()
     sesion = models.CharField(max_length=1, choices=SESION_CHOICES)
     cupo_maximo = models.PositiveSmallIntegerField(default=3)
+    # Contador desnormalizado de reservas activas; solo lo modifican las
+    # funciones de `practicas.services` mediante UPDATE condicionales.
+    plazas_ocupadas = models.PositiveSmallIntegerField(
+        default=0, editable=False)
 
     class Meta:
         constraints = [
             models.UniqueConstraint(
-                fields=['profesor', 'fecha', 'sesion'], name='unique_salida_profesor')
+                fields=['profesor', 'fecha', 'sesion'], name='unique_salida_profesor'),
+            models.CheckConstraint(
+                condition=Q(plazas_ocupadas__lte=F('cupo_maximo')),
+                name='salida_sin_sobreventa'),
+        ]
+        # (profesor, fecha) ya lo cubre el índice de unique_salida_profesor
+        indexes = [
+            models.Index(fields=['zona', 'fecha'], name='salida_zona_fecha_idx'),
+            models.Index(fields=['fecha', 'sesion'], name='salida_fecha_idx'),
         ]
         verbose_name = 'Salida Disponible'
         verbose_name_plural = 'Salidas Disponibles'
@@ -177,9 +256,68 @@ class SalidaDisponible(models.Model):
     def __str__(self):
         return f"{self.profesor.usuario.username} - {self.get_sesion_display()} {self.fecha}"
 
+    def clean(self):
+        if self.cupo_maximo < self.plazas_ocupadas:
+            raise ValidationError({
+                'cupo_maximo': f"Ya hay {self.plazas_ocupadas} plazas ocupadas."
+            })
+
+    @property
+    def cupo_disponible(self):
+        return max(self.cupo_maximo - self.plazas_ocupadas, 0)
+
+    def intervalo(self):
+        """(inicio, fin) aware de la sesión, en la zona horaria actual."""
+        inicio, fin = self.VENTANAS[self.sesion]
+        return (timezone.make_aware(datetime.combine(self.fecha, inicio)),
+                timezone.make_aware(datetime.combine(self.fecha, fin)))
+
+
+class SalidaRecurrente(models.Model):
+    """Plantilla semanal a partir de la que se generan salidas"""
+    DIA_SEMANA_CHOICES = [
+        (0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'),
+        (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo'),
+    ]
+
+    profesor = models.ForeignKey(
+        Profesor,
+        on_delete=models.CASCADE,
+        related_name='salidas_recurrentes'
+    )
+    zona = models.ForeignKey(
+        Zona, on_delete=models.PROTECT, related_name='salidas_recurrentes')
+    dia_semana = models.PositiveSmallIntegerField(choices=DIA_SEMANA_CHOICES)
+    sesion = models.CharField(
+        max_length=1, choices=SalidaDisponible.SESION_CHOICES)
+    cupo_maximo = models.PositiveSmallIntegerField(default=3)
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+    activa = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name = 'Salida Recurrente'
+        verbose_name_plural = 'Salidas Recurrentes'
+
+    def __str__(self):
+        return (f"{self.profesor.usuario.username} - "
+                f"{self.get_dia_semana_display()} {self.get_sesion_display()}")
+
+    def clean(self):
+        if self.fecha_fin and self.fecha_inicio and self.fecha_fin < self.fecha_inicio:
+            raise ValidationError({
+                'fecha_fin': "La fecha de fin es anterior a la de inicio."
+            })
+
 
 class Reserva(models.Model):
+    Estados = Solicitud.Estados
     ESTADO_CHOICES = Solicitud.ESTADO_CHOICES
+    # Estados que cuentan como plaza ocupada en la salida
+    ESTADOS_OCUPAN_PLAZA = [
+        Estados.PENDIENTE, Estados.INVITADA, Estados.CONFIRMADA]
+    RUTA_PROFESOR = 'salida__profesor'
+    RUTA_ALUMNO = 'alumno'
 
     alumno = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -198,6 +336,10 @@ class Reserva(models.Model):
 
     class Meta:
         unique_together = [('alumno', 'salida')]
+        indexes = [
+            models.Index(fields=['salida', 'estado'], name='reserva_salida_estado_idx'),
+            models.Index(fields=['created_at'], name='reserva_created_idx'),
+        ]
         ordering = ['created_at']
         verbose_name = 'Reserva'
         verbose_name_plural = 'Reservas'
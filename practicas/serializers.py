@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from backend.lectura import LecturaRapida, nombre_completo, opciones
 from citas.models import Profesor
-from .models import Zona, Solicitud, SalidaDisponible, Reserva
+from . import zonas
+from .models import Zona, Permiso, PermisoFase, Solicitud, SalidaDisponible, Reserva
 
 User = get_user_model()
 
@@ -11,12 +13,42 @@ class ZonaSerializer(serializers.ModelSerializer):
         model = Zona
         fields = ['id', 'nombre']
 
+    def validate_nombre(self, value):
+        # 'El Ejido', 'el ejido' y 'Ejido' son la misma zona
+        zona_id = zonas.resolver(value)
+        if zona_id is not None and (
+                self.instance is None or zona_id != self.instance.pk):
+            raise serializers.ValidationError(
+                "Ya existe una zona con ese nombre o un alias equivalente.")
+        return ' '.join(value.split())
+
+
+class PermisoFaseSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='fase_id')
+    nombre = serializers.ReadOnlyField(source='fase.nombre')
+
+    class Meta:
+        model = PermisoFase
+        fields = ['id', 'nombre', 'orden']
+
+
+class PermisoSerializer(serializers.ModelSerializer):
+    # Fases en el orden en que se examinan
+    fases = PermisoFaseSerializer(source='permisofases', many=True, read_only=True)
+
+    class Meta:
+        model = Permiso
+        fields = ['id', 'codigo', 'descripcion', 'fases']
+
 
 class SolicitudSerializer(serializers.ModelSerializer):
     zona = serializers.PrimaryKeyRelatedField(
         queryset=Zona.objects.all(), write_only=True
     )
     zona_nombre = serializers.ReadOnlyField(source='zona.nombre')
+    # Datos del alumno, que se toma del usuario autenticado al crear
+    nombre = serializers.ReadOnlyField(source='alumno.usuario.get_full_name')
+    telefono = serializers.ReadOnlyField(source='alumno.usuario.username')
     estado_display = serializers.CharField(
         source='get_estado_display', read_only=True
     )
@@ -24,10 +56,46 @@ class SolicitudSerializer(serializers.ModelSerializer):
     class Meta:
         model = Solicitud
         fields = [
-            'id', 'nombre', 'telefono', 'zona', 'zona_nombre', 'sesion_preferida',
-            'fecha_teorico', 'fecha_inscripcion', 'notas', 'estado', 'estado_display'
+            'id', 'alumno', 'nombre', 'telefono', 'zona', 'zona_nombre', 'permiso',
+            'sesion_preferida', 'fecha_teorico', 'fecha_inscripcion', 'notas',
+            'estado', 'estado_display', 'fase_actual'
+        ]
+        read_only_fields = [
+            'alumno', 'zona_nombre', 'estado_display', 'fase_actual'
         ]
-        read_only_fields = ['zona_nombre', 'estado_display']
+
+
+class SolicitudLectura(LecturaRapida):
+    """`SolicitudSerializer` para listados, sobre `.values()`."""
+    serializer_class = SolicitudSerializer
+    campos = (
+        'id', 'alumno_id', 'alumno__usuario__first_name', 'alumno__usuario__last_name',
+        'alumno__usuario__username', 'zona__nombre', 'permiso_id', 'sesion_preferida',
+        'fecha_teorico', 'fecha_inscripcion', 'notas', 'estado', 'fase_actual_id',
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.estados = opciones(Solicitud.ESTADO_CHOICES)
+
+    def representar(self, fila):
+        estado = fila['estado']
+        return {
+            'id': fila['id'],
+            'alumno': fila['alumno_id'],
+            'nombre': nombre_completo(fila['alumno__usuario__first_name'],
+                                      fila['alumno__usuario__last_name']),
+            'telefono': fila['alumno__usuario__username'],
+            'zona_nombre': fila['zona__nombre'],
+            'permiso': fila['permiso_id'],
+            'sesion_preferida': fila['sesion_preferida'],
+            'fecha_teorico': self.fecha(fila['fecha_teorico']),
+            'fecha_inscripcion': self.fecha_hora(fila['fecha_inscripcion']),
+            'notas': fila['notas'],
+            'estado': estado,
+            'estado_display': self.estados.get(estado, estado),
+            'fase_actual': fila['fase_actual_id'],
+        }
 
 
 class SalidaDisponibleSerializer(serializers.ModelSerializer):
@@ -40,7 +108,7 @@ class SalidaDisponibleSerializer(serializers.ModelSerializer):
     profesor_username = serializers.ReadOnlyField(
         source='profesor.usuario.username'
     )
-    cupo_disponible = serializers.SerializerMethodField()
+    cupo_disponible = serializers.ReadOnlyField()
 
     class Meta:
         model = SalidaDisponible
@@ -49,13 +117,12 @@ class SalidaDisponibleSerializer(serializers.ModelSerializer):
             'cupo_maximo', 'cupo_disponible'
         ]
 
-    def get_cupo_disponible(self, obj):
-        return max(
-            obj.cupo_maximo - obj.reservas.filter(
-                estado__in=['P', 'C', 'I']
-            ).count(),
-            0
-        )
+    def validate_cupo_maximo(self, value):
+        if self.instance and value < self.instance.plazas_ocupadas:
+            raise serializers.ValidationError(
+                f"Ya hay {self.instance.plazas_ocupadas} plazas ocupadas."
+            )
+        return value
 
 
 class ReservaSerializer(serializers.ModelSerializer):
@@ -81,11 +148,23 @@ class ReservaSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['alumno_username', 'salida_detalle', 'estado_display']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            # Estado y salida solo cambian en `practicas.services`, que
+            # mantienen `plazas_ocupadas` (confirmar, rechazar, cancelar)
+            fields['estado'].read_only = True
+            fields['salida'].read_only = True
+        return fields
+
     def validate(self, data):
+        # Comprobación rápida sin consulta; la definitiva es el UPDATE
+        # condicional de `services.reservar_plaza`.
         salida = data.get('salida')
-        if Reserva.objects.filter(
-            salida=salida, estado__in=['P', 'C', 'I']
-        ).count() >= salida.cupo_maximo:
+        if salida is None or (self.instance is not None
+                              and salida.pk == self.instance.salida_id):
+            return data
+        if salida.plazas_ocupadas >= salida.cupo_maximo:
             raise serializers.ValidationError(
                 "No quedan plazas disponibles en esta salida."
             )
@@ -96,3 +175,43 @@ class ReservaSerializer(serializers.ModelSerializer):
         if request and request.user.is_authenticated:
             validated_data['alumno'] = request.user
         return super().create(validated_data)
+
+
+class ReservaLectura(LecturaRapida):
+    """`ReservaSerializer` para listados, sobre `.values()`."""
+    serializer_class = ReservaSerializer
+    campos = (
+        'id', 'alumno_id', 'alumno__username', 'salida_id', 'salida__profesor_id',
+        'salida__profesor__usuario__username', 'salida__zona_id', 'salida__fecha',
+        'salida__sesion', 'salida__cupo_maximo', 'salida__plazas_ocupadas',
+        'estado', 'created_at', 'updated_at',
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.estados = opciones(Reserva.ESTADO_CHOICES)
+
+    def representar(self, fila):
+        estado = fila['estado']
+        cupo = fila['salida__cupo_maximo']
+        return {
+            'id': fila['id'],
+            'alumno': fila['alumno_id'],
+            'alumno_username': fila['alumno__username'],
+            'salida': fila['salida_id'],
+            # Mismo formato que SalidaDisponibleSerializer
+            'salida_detalle': {
+                'id': fila['salida_id'],
+                'profesor': fila['salida__profesor_id'],
+                'profesor_username': fila['salida__profesor__usuario__username'],
+                'zona': fila['salida__zona_id'],
+                'fecha': self.fecha(fila['salida__fecha']),
+                'sesion': fila['salida__sesion'],
+                'cupo_maximo': cupo,
+                'cupo_disponible': max(cupo - fila['salida__plazas_ocupadas'], 0),
+            },
+            'estado': estado,
+            'estado_display': self.estados.get(estado, estado),
+            'created_at': self.fecha_hora(fila['created_at']),
+            'updated_at': self.fecha_hora(fila['updated_at']),
+        }
@@ -0,0 +1,166 @@
+# practicas/services.py
+"""
+Operaciones de reserva sobre `SalidaDisponible`.
+
+El contador `SalidaDisponible.plazas_ocupadas` solo se modifica aquí, con
+UPDATE condicionales dentro de la misma transacción que crea o libera la
+`Reserva`. La condición del UPDATE hace de cerrojo: en PostgreSQL la fila
+queda bloqueada hasta el commit y la segunda transacción reevalúa el WHERE,
+así que dos workers nunca pueden vender la misma plaza.
+
+Cuando una plaza se libera, `promover_espera` la ocupa en la misma
+transacción con la siguiente solicitud en ESPERA de esa zona y sesión.
+La cola no lleva fecha: una `Solicitud` no pide día, solo zona y sesión
+preferida, así que cualquier salida futura de la zona sirve a toda su
+cola. La fecha solo cuenta para no promover en salidas pasadas.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from backend.cache import invalidar
+from .models import Solicitud, SalidaDisponible, Reserva
+
+
+class ReservaError(Exception):
+    """Error de negocio al reservar o liberar una plaza."""
+
+
+class SalidaCompletaError(ReservaError):
+    pass
+
+
+class ReservaDuplicadaError(ReservaError):
+    pass
+
+
+def _ocupar_plaza(salida_id):
+    """Suma una plaza si queda cupo. Devuelve False si la salida está llena."""
+    ocupada = bool(
+        SalidaDisponible.objects
+        .filter(pk=salida_id, plazas_ocupadas__lt=F('cupo_maximo'))
+        .update(plazas_ocupadas=F('plazas_ocupadas') + 1)
+    )
+    if ocupada:
+        invalidar('salidas')  # el UPDATE no lanza señales
+    return ocupada
+
+
+def _liberar_plaza(salida_id):
+    SalidaDisponible.objects.filter(
+        pk=salida_id, plazas_ocupadas__gt=0
+    ).update(plazas_ocupadas=F('plazas_ocupadas') - 1)
+    invalidar('salidas')
+
+
+def reservar_plaza(salida, alumno, estado=Reserva.Estados.PENDIENTE):
+    """Crea la reserva de `alumno` ocupando una plaza de `salida`."""
+    with transaction.atomic():
+        if not _ocupar_plaza(salida.pk):
+            raise SalidaCompletaError(
+                "No quedan plazas disponibles en esta salida.")
+        try:
+            with transaction.atomic():
+                reserva = Reserva.objects.create(
+                    alumno=alumno, salida=salida, estado=estado)
+        except IntegrityError:
+            # El rollback de la transacción exterior devuelve la plaza
+            raise ReservaDuplicadaError(
+                "Ya tienes una reserva en esta salida.")
+        salida.refresh_from_db(fields=['plazas_ocupadas'])
+    return reserva
+
+
+def rechazar_reserva(reserva):
+    """Pasa una reserva pendiente a RECHAZADA y libera su plaza."""
+    with transaction.atomic():
+        cambiadas = Reserva.objects.filter(
+            pk=reserva.pk, estado=Reserva.Estados.PENDIENTE
+        ).update(estado=Reserva.Estados.RECHAZADA, updated_at=timezone.now())
+        if not cambiadas:
+            raise ReservaError("La reserva ya fue gestionada.")
+        _liberar_plaza(reserva.salida_id)
+        promover_espera(reserva.salida_id)
+
+    reserva.refresh_from_db(fields=['estado', 'updated_at'])
+    return reserva
+
+
+def cancelar_reserva(reserva):
+    """Borra la reserva y, si ocupaba plaza, la devuelve a la salida."""
+    with transaction.atomic():
+        actual = (Reserva.objects.select_for_update()
+                  .filter(pk=reserva.pk)
+                  .values_list('estado', flat=True)
+                  .first())
+        if actual is None:
+            raise ReservaError("La reserva ya no existe.")
+        Reserva.objects.filter(pk=reserva.pk).delete()
+        if actual in Reserva.ESTADOS_OCUPAN_PLAZA:
+            _liberar_plaza(reserva.salida_id)
+            promover_espera(reserva.salida_id)
+
+
+def siguiente_en_espera(zona_id, sesion, salida_id):
+    """
+    Primera solicitud en ESPERA compatible con la sesión, por orden de
+    inscripción. Hace una búsqueda con LIMIT 1 sobre el índice parcial
+    `solicitud_espera_idx` por cada sesión compatible (dos o tres como
+    mucho), así que el coste es logarítmico en el tamaño de la cola.
+    Como en `asignacion.asignar_solicitudes`, se salta a quien ya tiene
+    una reserva en esta salida o plaza en otra salida futura: nadie
+    ocupa dos plazas a la vez.
+    """
+    ya_reservada = Reserva.objects.filter(
+        alumno_id=OuterRef('alumno__usuario_id'), salida_id=salida_id)
+    reserva_activa = Reserva.objects.filter(
+        alumno_id=OuterRef('alumno__usuario_id'),
+        salida__fecha__gte=timezone.now().date(),
+        estado__in=Reserva.ESTADOS_OCUPAN_PLAZA)
+    candidatas = []
+    for compatible in SalidaDisponible.SESIONES_COMPATIBLES[sesion]:
+        fila = (Solicitud.objects
+                .filter(zona_id=zona_id, estado=Solicitud.Estados.ESPERA,
+                        sesion_preferida=compatible)
+                .filter(~Exists(ya_reservada), ~Exists(reserva_activa))
+                .order_by('fecha_inscripcion', 'id')
+                .values_list('fecha_inscripcion', 'id', 'alumno__usuario_id')
+                .first())
+        if fila:
+            candidatas.append(fila)
+    return min(candidatas) if candidatas else None
+
+
+def promover_espera(salida_id):
+    """
+    Ocupa la plaza libre de una salida futura con la siguiente solicitud
+    en ESPERA, que pasa a INVITADA. Debe llamarse dentro de la
+    transacción que liberó la plaza. Devuelve la reserva creada o None.
+    """
+    salida = (SalidaDisponible.objects
+              .select_for_update()
+              .filter(pk=salida_id, fecha__gte=timezone.now().date(),
+                      plazas_ocupadas__lt=F('cupo_maximo'))
+              .values_list('zona_id', 'sesion')
+              .first())
+    if salida is None:
+        return None
+
+    # La solicitud se reclama con un UPDATE condicional: si otro worker
+    # la promovió a la vez, se pasa a la siguiente de la cola.
+    for _ in range(3):
+        siguiente = siguiente_en_espera(*salida, salida_id)
+        if siguiente is None:
+            return None
+        _, solicitud_id, usuario_id = siguiente
+        if Solicitud.objects.filter(
+            pk=solicitud_id, estado=Solicitud.Estados.ESPERA
+        ).update(estado=Solicitud.Estados.INVITADA):
+            break
+    else:
+        return None
+
+    _ocupar_plaza(salida_id)
+    return Reserva.objects.create(
+        alumno_id=usuario_id, salida_id=salida_id,
+        estado=Reserva.Estados.INVITADA)
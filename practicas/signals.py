@@ -0,0 +1,64 @@
+# practicas/signals.py
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from backend import cache
+from . import fases, zonas
+from .models import (
+    Fase, Permiso, PermisoFase, Reserva, SalidaDisponible, Solicitud, Zona, ZonaAlias,
+)
+from .zonas import normalizar
+
+
+# ─────────────── Caché del orden de fases por permiso ─────────────── #
+@receiver([post_save, post_delete], sender=Fase)
+@receiver([post_save, post_delete], sender=PermisoFase)
+@receiver(m2m_changed, sender=Permiso.fases.through)
+def invalidar_orden_fases(sender, **kwargs):
+    fases.invalidar()
+
+
+# ─────────────── Caché de respuestas de la API ─────────────── #
+# Grupos de `backend.cache` que cambian al escribir cada modelo
+GRUPOS_CACHE = {
+    Zona: ('zonas',),
+    Permiso: ('permisos',),
+    Fase: ('permisos',),
+    PermisoFase: ('permisos',),
+    SalidaDisponible: ('salidas',),
+    Reserva: ('salidas',),
+}
+
+
+def invalidar_cache_api(sender, **kwargs):
+    cache.invalidar(*GRUPOS_CACHE[sender])
+
+
+for _modelo in GRUPOS_CACHE:
+    post_save.connect(invalidar_cache_api, sender=_modelo)
+    post_delete.connect(invalidar_cache_api, sender=_modelo)
+
+
+# ─────────────── Alias de zona y caché de resolución ─────────────── #
+@receiver(post_save, sender=Zona)
+def crear_alias_zona(sender, instance, **kwargs):
+    # El nombre propio de la zona siempre resuelve a ella (si nadie lo tenía)
+    ZonaAlias.objects.get_or_create(
+        clave=normalizar(instance.nombre),
+        defaults={'nombre': instance.nombre, 'zona': instance})
+
+
+@receiver(post_save, sender=ZonaAlias)
+def alias_guardado(sender, **kwargs):
+    zonas.alias_guardado(**kwargs)
+
+
+@receiver(post_delete, sender=ZonaAlias)
+def alias_borrado(sender, **kwargs):
+    zonas.alias_borrado(**kwargs)
+
+
+# ─────────────── Zona activa del alumno ─────────────── #
+@receiver([post_save, post_delete], sender=Solicitud)
+def actualizar_zona_activa(sender, instance, **kwargs):
+    zonas.actualizar_zona_activa([instance.alumno_id])
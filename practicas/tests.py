@@ -1,3 +1,1447 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from base64 import b64decode
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import brotli
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from citas.models import ClasePractica, HorarioDisponible
+from backend import cache as cache_api
+from backend.exportar import aplanar
+from backend.middleware import elegir_codificacion
+from backend.renderers import JSONRapidoParser, JSONRapidoRenderer
+from usuarios.models import User, Profesor, Alumno
+from usuarios.serializers import TokenConRolSerializer
+from . import calendario, fases, zonas
+from .asignacion import calcular_asignacion
+from .calendario import generar_salidas
+from .examenes import registrar_resultados
+from .models import (
+    Zona, ZonaAlias, Permiso, Fase, PermisoFase, Solicitud, ExamenIntento,
+    SalidaDisponible, SalidaRecurrente, Reserva,
+)
+from .serializers import ReservaLectura, SolicitudLectura
+from .services import reservar_plaza, siguiente_en_espera, SalidaCompletaError
+
+
+class ListadoSalidasReservasTests(TestCase):
+    """El coste en consultas de los listados no depende del número de filas."""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            username='admin', password='1234', is_staff=True)
+        user_profe = User.objects.create_user(
+            username='profe', password='1234', rol=User.Roles.PROFESOR)
+        self.profesor = Profesor.objects.create(usuario=user_profe)
+        self.zona = Zona.objects.create(nombre='El Ejido')
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def _crear_salidas(self, n):
+        hoy = timezone.now().date()
+        for i in range(n):
+            salida = SalidaDisponible.objects.create(
+                profesor=self.profesor, zona=self.zona,
+                fecha=hoy + timedelta(days=i + 1), sesion='M', cupo_maximo=3)
+            for j in range(2):
+                alumno = User.objects.create(username=f'alumno-{i}-{j}')
+                reservar_plaza(salida, alumno, estado='C')
+
+    def test_listado_salidas_consultas_constantes(self):
+        self._crear_salidas(5)
+        with self.assertNumQueries(1):  # SELECT ... LIMIT, sin COUNT
+            response = self.client.get('/api/v1/salidas/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [s['cupo_disponible'] for s in response.data['results']], [1] * 5)
+
+    def test_listado_reservas_consultas_constantes(self):
+        self._crear_salidas(4)
+        with self.assertNumQueries(1):  # SELECT ... LIMIT, sin COUNT
+            response = self.client.get('/api/v1/reservas/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 8)
+        self.assertTrue(all(
+            r['salida_detalle']['cupo_disponible'] == 1
+            for r in response.data['results']))
+
+    def test_paginacion_por_cursor(self):
+        self._crear_salidas(25)
+        vistas, url = [], '/api/v1/salidas/?page_size=10'
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            vistas += [s['id'] for s in response.data['results']]
+            url = response.data['next']
+            if url:
+                # Posición sin OFFSET: el primer campo del orden es único
+                cursor = parse_qs(urlparse(url).query)['cursor'][0]
+                self.assertNotIn('o', parse_qs(b64decode(cursor).decode()))
+        self.assertEqual(len(set(vistas)), 25)
+        self.assertEqual(vistas, list(SalidaDisponible.objects
+                                      .order_by('id')
+                                      .values_list('id', flat=True)))
+
+        response = self.client.get('/api/v1/salidas/?page_size=500&total=1')
+        self.assertEqual(len(response.data['results']), 25)
+        self.assertIsNone(response.data['total_estimado'])  # solo PostgreSQL
+
+    def test_alumno_ve_salidas_de_su_zona_activa(self):
+        self._crear_salidas(3)
+        motril = Zona.objects.create(nombre='Motril')
+        SalidaDisponible.objects.create(
+            profesor=self.profesor, zona=motril,
+            fecha=timezone.now().date() + timedelta(days=1), sesion='T')
+        permiso = Permiso.objects.create(codigo='B', descripcion='Turismo')
+        user = User.objects.create(username='600000009')
+        alumno = Alumno.objects.create(usuario=user)
+        self.client.force_authenticate(user=user)
+
+        solicitud = Solicitud.objects.create(
+            alumno=alumno, zona=motril, permiso=permiso)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/salidas/')
+        self.assertEqual([s['zona'] for s in response.data['results']], [motril.pk])
+
+        Solicitud.objects.create(alumno=alumno, zona=self.zona, permiso=permiso)
+        response = self.client.get('/api/v1/salidas/')
+        self.assertEqual(len(response.data['results']), 3)
+
+        Solicitud.objects.exclude(pk=solicitud.pk).delete()
+        alumno.refresh_from_db()
+        self.assertEqual(alumno.zona_activa, motril)
+
+    def test_admin_cambia_estado_de_solicitud(self):
+        alumno = Alumno.objects.create(usuario=User.objects.create(username='600000001'))
+        solicitud = Solicitud.objects.create(
+            alumno=alumno, zona=self.zona,
+            permiso=Permiso.objects.create(codigo='B', descripcion='Turismo'))
+        response = self.client.patch(f'/api/v1/solicitudes/{solicitud.pk}/', {'estado': 'E'})
+        self.assertEqual(response.status_code, 200)
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.estado, Solicitud.Estados.ESPERA)
+
+    def test_listado_solicitudes(self):
+        permiso = Permiso.objects.create(codigo='B', descripcion='Turismo')
+        for i in range(3):
+            alumno = Alumno.objects.create(usuario=User.objects.create(
+                username=f'60000000{i}', first_name='Ana', last_name=f'Ruiz {i}'))
+            Solicitud.objects.create(alumno=alumno, zona=self.zona, permiso=permiso)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/solicitudes/')
+        self.assertEqual(
+            [s['nombre'] for s in response.data['results']],
+            ['Ana Ruiz 0', 'Ana Ruiz 1', 'Ana Ruiz 2'])
+
+
+class ReservaPlazasTests(TestCase):
+    """Contador `plazas_ocupadas` a través de la API de reservas."""
+
+    def setUp(self):
+        user_profe = User.objects.create(
+            username='profe', rol=User.Roles.PROFESOR)
+        profesor = Profesor.objects.create(usuario=user_profe)
+        self.salida = SalidaDisponible.objects.create(
+            profesor=profesor, zona=Zona.objects.create(nombre='Motril'),
+            fecha=timezone.now().date() + timedelta(days=1),
+            sesion='M', cupo_maximo=1)
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.alumno = User.objects.create(username='alumno')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.alumno)
+
+    def _reservar(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post('/api/v1/reservas/', {
+            'alumno': user.id, 'salida': self.salida.id})
+
+    def test_reservar_ocupa_plaza_y_rechaza_sobreventa(self):
+        response = self._reservar(self.alumno)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['salida_detalle']['cupo_disponible'], 0)
+
+        otro = User.objects.create(username='otro')
+        response = self._reservar(otro)
+        self.assertEqual(response.status_code, 400)
+        self.salida.refresh_from_db()
+        self.assertEqual(self.salida.plazas_ocupadas, 1)
+
+    def test_rechazar_libera_plaza(self):
+        reserva_id = self._reservar(self.alumno).data['id']
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(f'/api/v1/reservas/{reserva_id}/rechazar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['estado'], 'R')
+        self.salida.refresh_from_db()
+        self.assertEqual(self.salida.plazas_ocupadas, 0)
+
+        # Rechazar dos veces no libera dos plazas
+        response = self.client.post(f'/api/v1/reservas/{reserva_id}/rechazar/')
+        self.assertEqual(response.status_code, 400)
+        self.salida.refresh_from_db()
+        self.assertEqual(self.salida.plazas_ocupadas, 0)
+
+    def test_cancelar_libera_plaza(self):
+        reserva_id = self._reservar(self.alumno).data['id']
+        response = self.client.delete(f'/api/v1/reservas/{reserva_id}/cancelar/')
+        self.assertEqual(response.status_code, 204)
+        self.salida.refresh_from_db()
+        self.assertEqual(self.salida.plazas_ocupadas, 0)
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_editar_no_toca_estado_ni_salida(self):
+        reserva_id = self._reservar(self.alumno).data['id']
+        otra = SalidaDisponible.objects.create(
+            profesor=self.salida.profesor, zona=self.salida.zona,
+            fecha=self.salida.fecha, sesion='T', cupo_maximo=1)
+        for metodo, datos in [('patch', {'estado': 'R'}), ('patch', {'salida': otra.id}),
+                              ('put', {'alumno': self.alumno.id, 'salida': otra.id})]:
+            response = getattr(self.client, metodo)(f'/api/v1/reservas/{reserva_id}/', datos)
+            self.assertEqual(response.status_code, 405)
+        reserva = Reserva.objects.get(pk=reserva_id)
+        self.assertEqual((reserva.estado, reserva.salida_id), ('S', self.salida.id))
+        self.salida.refresh_from_db()
+        self.assertEqual(self.salida.plazas_ocupadas, 1)
+
+    def test_admin_pasa_por_el_servicio(self):
+        from django.test import Client
+
+        client = Client()
+        client.force_login(User.objects.create(
+            username='super', is_staff=True, is_superuser=True))
+        response = client.post('/admin/practicas/reserva/add/', {
+            'alumno': self.alumno.id, 'salida': self.salida.id})
+        self.assertEqual(response.status_code, 302)
+        reserva = Reserva.objects.get()
+        self.salida.refresh_from_db()
+        self.assertEqual((reserva.estado, self.salida.plazas_ocupadas), ('S', 1))
+
+        # Salida llena: error en el formulario, sin sobreventa
+        response = client.post('/admin/practicas/reserva/add/', {
+            'alumno': User.objects.create(username='otro').id, 'salida': self.salida.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'No quedan plazas disponibles')
+
+        # Al editar, estado y salida son de solo lectura
+        otra = SalidaDisponible.objects.create(
+            profesor=self.salida.profesor, zona=self.salida.zona,
+            fecha=self.salida.fecha, sesion='T', cupo_maximo=1)
+        response = client.post(f'/admin/practicas/reserva/{reserva.id}/change/', {
+            'alumno': self.alumno.id, 'salida': otra.id, 'estado': 'R'})
+        self.assertEqual(response.status_code, 302)
+        reserva.refresh_from_db()
+        self.assertEqual((reserva.estado, reserva.salida_id), ('S', self.salida.id))
+        self.salida.refresh_from_db()
+        self.assertEqual(self.salida.plazas_ocupadas, 1)
+
+    def test_serializer_de_edicion(self):
+        from .serializers import ReservaSerializer
+
+        reserva = reservar_plaza(self.salida, self.alumno)
+        self.salida.refresh_from_db()
+        # Sin salida o con la misma (llena) no hay comprobación de cupo
+        self.assertTrue(ReservaSerializer(reserva, data={}, partial=True).is_valid())
+        serializer = ReservaSerializer(reserva, data={
+            'alumno': self.alumno.id, 'salida': self.salida.id, 'estado': 'R'})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertNotIn('estado', serializer.validated_data)
+        self.assertNotIn('salida', serializer.validated_data)
+
+
+class ReservaConcurrenteTests(TransactionTestCase):
+    """Prueba de estrés: muchos hilos compiten por las plazas de una salida."""
+
+    HILOS = 24
+    CUPO = 5
+
+    def test_sin_sobreventa_con_hilos(self):
+        profesor = Profesor.objects.create(usuario=User.objects.create(
+            username='profe', rol=User.Roles.PROFESOR))
+        salida = SalidaDisponible.objects.create(
+            profesor=profesor, zona=Zona.objects.create(nombre='Adra'),
+            fecha=timezone.now().date() + timedelta(days=1),
+            sesion='T', cupo_maximo=self.CUPO)
+        alumnos = [User.objects.create(username=f'alumno-{i}')
+                   for i in range(self.HILOS)]
+
+        barrera = threading.Barrier(self.HILOS)
+        resultados = []
+
+        def reservar(alumno):
+            try:
+                barrera.wait()
+                while True:
+                    try:
+                        reservar_plaza(
+                            SalidaDisponible.objects.get(pk=salida.pk), alumno)
+                        resultados.append('ok')
+                        return
+                    except SalidaCompletaError:
+                        resultados.append('completa')
+                        return
+                    except OperationalError:
+                        # SQLite devuelve "table is locked" en vez de esperar
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reservar, args=(a,)) for a in alumnos]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        salida.refresh_from_db()
+        self.assertEqual(resultados.count('ok'), self.CUPO)
+        self.assertEqual(resultados.count('completa'), self.HILOS - self.CUPO)
+        self.assertEqual(salida.plazas_ocupadas, self.CUPO)
+        self.assertEqual(salida.reservas.count(), self.CUPO)
+
+
+class AsignacionTests(TestCase):
+    """Asignación masiva de la cola de solicitudes a plazas libres."""
+
+    def test_mixtos_no_quitan_plaza_a_alumnos_de_una_sesion(self):
+        hoy = timezone.now().date()
+        salidas = [(1, 'z', 'M', hoy, 1), (2, 'z', 'T', hoy, 1)]
+        # El mixto tiene prioridad pero no debe ocupar la única plaza de mañana
+        solicitudes = [('mixto', 'z', 'B'), ('manana', 'z', 'M'),
+                       ('tarde', 'z', 'T')]
+        pares = dict(calcular_asignacion(solicitudes, salidas))
+        self.assertEqual(pares, {'mixto': 2, 'manana': 1})
+
+    def test_prioridad_por_inscripcion_y_zona(self):
+        hoy = timezone.now().date()
+        salidas = [(1, 'a', 'M', hoy + timedelta(days=2), 1),
+                   (2, 'a', 'B', hoy + timedelta(days=1), 1)]
+        solicitudes = [('primero', 'a', 'M'), ('otra-zona', 'b', 'M'),
+                       ('segundo', 'a', 'M'), ('tercero', 'a', 'M')]
+        pares = dict(calcular_asignacion(solicitudes, salidas))
+        self.assertEqual(pares, {'primero': 1, 'segundo': 2})
+
+    def test_endpoint_asignar_crea_reservas_en_bloque(self):
+        zona = Zona.objects.create(nombre='Berja')
+        permiso = Permiso.objects.create(codigo='B', descripcion='Turismo')
+        profesor = Profesor.objects.create(usuario=User.objects.create(
+            username='profe', rol=User.Roles.PROFESOR))
+        salida = SalidaDisponible.objects.create(
+            profesor=profesor, zona=zona, sesion='M', cupo_maximo=2,
+            fecha=timezone.now().date() + timedelta(days=3))
+        for i, sesion in enumerate('MTM'):
+            alumno = Alumno.objects.create(
+                usuario=User.objects.create(username=f'alumno-{i}'))
+            Solicitud.objects.create(
+                alumno=alumno, zona=zona, permiso=permiso,
+                sesion_preferida=sesion,
+                fecha_inscripcion=timezone.now() - timedelta(days=10 - i))
+
+        client = APIClient()
+        client.force_authenticate(
+            user=User.objects.create(username='admin', is_staff=True))
+        response = client.post('/api/v1/solicitudes/asignar/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['asignadas'], 2)
+        self.assertEqual(response.data['tasa_llenado'], 1.0)
+        salida.refresh_from_db()
+        self.assertEqual(salida.plazas_ocupadas, 2)
+        self.assertEqual(
+            sorted(salida.reservas.values_list('alumno__username', 'estado')),
+            [('alumno-0', 'I'), ('alumno-2', 'I')])
+        self.assertEqual(
+            Solicitud.objects.filter(estado='I').count(), 2)
+
+        # Una segunda pasada no duplica nada
+        response = client.post('/api/v1/solicitudes/asignar/')
+        self.assertEqual(response.data['asignadas'], 0)
+
+    def test_no_repite_salida_con_reserva_rechazada(self):
+        zona = Zona.objects.create(nombre='Berja')
+        permiso = Permiso.objects.create(codigo='B', descripcion='Turismo')
+        profesor = Profesor.objects.create(usuario=User.objects.create(
+            username='profe', rol=User.Roles.PROFESOR))
+        manana = timezone.now().date() + timedelta(days=1)
+        rechazada, otra = [SalidaDisponible.objects.create(
+            profesor=profesor, zona=zona, sesion='M', cupo_maximo=1,
+            fecha=manana + timedelta(days=i)) for i in range(2)]
+        alumno = Alumno.objects.create(usuario=User.objects.create(username='alumno'))
+        Solicitud.objects.create(alumno=alumno, zona=zona, permiso=permiso,
+                                 sesion_preferida='M')
+        Reserva.objects.create(alumno=alumno.usuario, salida=rechazada,
+                               estado=Reserva.Estados.RECHAZADA)
+
+        client = APIClient()
+        client.force_authenticate(
+            user=User.objects.create(username='admin', is_staff=True))
+        response = client.post('/api/v1/solicitudes/asignar/',
+                               {'simular': 'false'}, format='json')
+
+        self.assertEqual(response.data['asignadas'], 1)
+        self.assertEqual(
+            alumno.usuario.reservas.get(estado=Reserva.Estados.INVITADA).salida, otra)
+
+    def test_simular_se_interpreta_como_booleano(self):
+        client = APIClient()
+        client.force_authenticate(
+            user=User.objects.create(username='admin', is_staff=True))
+        for valor in ['true', '1', True]:
+            response = client.post('/api/v1/solicitudes/asignar/',
+                                   {'simular': valor}, format='json')
+            self.assertEqual(response.status_code, 200)
+        response = client.post('/api/v1/solicitudes/asignar/',
+                               {'simular': 'quizá'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_calcular_asignacion_con_excluidos(self):
+        hoy = timezone.now().date()
+        salidas = [(1, 'z', 'M', hoy, 1), (2, 'z', 'B', hoy, 1)]
+        pares = dict(calcular_asignacion(
+            [('a', 'z', 'M'), ('b', 'z', 'M')], salidas, {('a', 1), ('b', 2)}))
+        self.assertEqual(pares, {'a': 2, 'b': 1})
+
+
+class ListaEsperaTests(TestCase):
+    """Promoción automática de la lista de espera al liberarse una plaza."""
+
+    def setUp(self):
+        self.zona = Zona.objects.create(nombre='Roquetas')
+        self.permiso = Permiso.objects.create(codigo='B', descripcion='Turismo')
+        profesor = Profesor.objects.create(usuario=User.objects.create(
+            username='profe', rol=User.Roles.PROFESOR))
+        self.salida = SalidaDisponible.objects.create(
+            profesor=profesor, zona=self.zona, sesion='T', cupo_maximo=1,
+            fecha=timezone.now().date() + timedelta(days=2))
+        self.admin = APIClient()
+        self.admin.force_authenticate(
+            user=User.objects.create(username='admin', is_staff=True))
+
+    def _solicitud(self, username, sesion, dias, estado='E'):
+        alumno = Alumno.objects.create(
+            usuario=User.objects.create(username=username))
+        return Solicitud.objects.create(
+            alumno=alumno, zona=self.zona, permiso=self.permiso,
+            sesion_preferida=sesion, estado=estado,
+            fecha_inscripcion=timezone.now() - timedelta(days=dias))
+
+    def test_rechazar_promueve_siguiente_compatible(self):
+        titular = User.objects.create(username='titular')
+        reserva = reservar_plaza(self.salida, titular)
+        self._solicitud('manana', 'M', dias=30)      # sesión incompatible
+        siguiente = self._solicitud('mixta', 'B', dias=20)
+        self._solicitud('tarde', 'T', dias=10)
+
+        response = self.admin.post(f'/api/v1/reservas/{reserva.id}/rechazar/')
+
+        self.assertEqual(response.status_code, 200)
+        siguiente.refresh_from_db()
+        self.assertEqual(siguiente.estado, 'I')
+        self.assertTrue(Reserva.objects.filter(
+            salida=self.salida, alumno__username='mixta', estado='I').exists())
+        self.salida.refresh_from_db()
+        self.assertEqual(self.salida.plazas_ocupadas, 1)
+
+    def test_salta_a_quien_ya_tiene_plaza_en_otra_salida(self):
+        reserva = reservar_plaza(self.salida, User.objects.create(username='titular'))
+        con_plaza = self._solicitud('con_plaza', 'T', dias=30)
+        otra = SalidaDisponible.objects.create(
+            profesor=self.salida.profesor, zona=self.zona, sesion='M',
+            fecha=self.salida.fecha + timedelta(days=1))
+        reservar_plaza(otra, con_plaza.alumno.usuario)
+        # Una reserva pasada o rechazada no cuenta
+        pasada = SalidaDisponible.objects.create(
+            profesor=self.salida.profesor, zona=self.zona, sesion='T',
+            fecha=timezone.now().date() - timedelta(days=7))
+        siguiente = self._solicitud('siguiente', 'T', dias=20)
+        Reserva.objects.create(alumno=siguiente.alumno.usuario, salida=pasada,
+                               estado='C')
+        Reserva.objects.create(alumno=siguiente.alumno.usuario, salida=otra,
+                               estado='R')
+
+        self.admin.post(f'/api/v1/reservas/{reserva.id}/rechazar/')
+
+        con_plaza.refresh_from_db()
+        siguiente.refresh_from_db()
+        self.assertEqual(con_plaza.estado, 'E')
+        self.assertEqual(siguiente.estado, 'I')
+        self.assertEqual(self.salida.reservas.get(estado='I').alumno.username,
+                         'siguiente')
+
+    def test_cancelar_sin_espera_deja_plaza_libre(self):
+        reserva = reservar_plaza(self.salida, User.objects.create(username='a'))
+        self.admin.delete(f'/api/v1/reservas/{reserva.id}/')
+        self.salida.refresh_from_db()
+        self.assertEqual(self.salida.plazas_ocupadas, 0)
+
+    def test_busqueda_usa_indice_parcial(self):
+        self._solicitud('tarde', 'T', dias=1)
+        with self.assertNumQueries(2):  # una búsqueda por sesión compatible
+            fila = siguiente_en_espera(self.zona.id, 'T', self.salida.id)
+        self.assertIsNotNone(fila)
+        plan = (Solicitud.objects
+                .filter(zona=self.zona, estado='E', sesion_preferida='T')
+                .order_by('fecha_inscripcion').explain())
+        self.assertIn('USING INDEX', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class FasesMixin:
+    """Permiso B con tres fases y tres solicitudes sin fase superada."""
+
+    def crear_permiso_con_fases(self):
+        fases.invalidar()
+        self.permiso = Permiso.objects.create(codigo='B', descripcion='Turismo')
+        self.teorico = Fase.objects.create(nombre='Teórico', orden=1)
+        self.destreza = Fase.objects.create(nombre='Destreza', orden=2)
+        self.circulacion = Fase.objects.create(nombre='Circulación', orden=3)
+        for orden, fase in enumerate(
+                [self.teorico, self.destreza, self.circulacion], start=1):
+            PermisoFase.objects.create(
+                permiso=self.permiso, fase=fase, orden=orden)
+        alumno = Alumno.objects.create(
+            usuario=User.objects.create(username='alumno'))
+        self.solicitudes = [
+            Solicitud.objects.create(
+                alumno=alumno, zona=Zona.objects.create(nombre=f'Zona {i}'),
+                permiso=self.permiso, sesion_preferida='M')
+            for i in range(3)
+        ]
+
+
+class OrdenFasesTests(FasesMixin, TestCase):
+    """Caché del orden de fases por permiso."""
+
+    def setUp(self):
+        self.crear_permiso_con_fases()
+
+    def test_puede_avanzar_sin_consultas_tras_la_primera_carga(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.solicitudes[0].puede_avanzar(self.teorico))
+        self.solicitudes[1].fase_actual = self.teorico
+        self.solicitudes[2].fase_actual = self.circulacion
+        with self.assertNumQueries(0):
+            self.assertFalse(self.solicitudes[0].puede_avanzar(self.destreza))
+            self.assertTrue(self.solicitudes[1].puede_avanzar(self.destreza))
+            self.assertFalse(self.solicitudes[2].puede_avanzar(self.teorico))
+            self.assertEqual(self.solicitudes[2].siguiente_fase(), None)
+
+    def test_cambios_en_permisofase_invalidan_la_cache(self):
+        self.solicitudes[0].fase_actual = self.destreza
+        self.assertTrue(self.solicitudes[0].puede_avanzar(self.circulacion))
+        PermisoFase.objects.filter(fase=self.circulacion).delete()
+        PermisoFase.objects.get(fase=self.destreza).delete()  # con señal
+        self.assertEqual(
+            self.solicitudes[0].fases_permitidas(), [self.teorico])
+
+
+class ResultadosExamenTests(FasesMixin, TestCase):
+    """Carga masiva de resultados de examen."""
+
+    def setUp(self):
+        self.crear_permiso_con_fases()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=User.objects.create(username='admin', is_staff=True))
+
+    def test_csv_registra_intentos_y_avanza_fases(self):
+        s1, s2, s3 = self.solicitudes
+        csv_texto = (
+            "solicitud,fase,aprobado\n"
+            f"{s1.id},Teórico,si\n"
+            f"{s1.id},destreza,no\n"          # misma carga, fase siguiente
+            f"{s2.id},Destreza,1\n"           # aún no ha hecho el teórico
+            f"{s3.id},{self.teorico.id},0\n"
+            "9999,Teórico,1\n"
+        )
+        archivo = SimpleUploadedFile(
+            'resultados.csv', csv_texto.encode(), content_type='text/csv')
+        response = self.client.post(
+            '/api/v1/solicitudes/resultados/', {'archivo': archivo},
+            format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['registradas'], 3)
+        self.assertEqual(
+            [f['ok'] for f in response.data['filas']],
+            [True, True, False, True, False])
+        self.assertEqual(response.data['filas'][2]['error'],
+                         'La siguiente fase es Teórico.')
+
+        s1.refresh_from_db()
+        s3.refresh_from_db()
+        self.assertEqual((s1.fase_actual, s1.estado), (self.teorico, 'A'))
+        self.assertEqual((s3.fase_actual, s3.estado), (None, 'A'))
+        self.assertEqual(ExamenIntento.objects.count(), 3)
+
+    def test_consultas_no_dependen_del_numero_de_filas(self):
+        filas = [{'solicitud': s.id, 'fase': 'Teórico', 'aprobado': True}
+                 for s in self.solicitudes]
+        self.solicitudes[0].fases_permitidas()  # carga la caché de fases
+        # fases + SAVEPOINT + solicitudes + INSERT + UPDATE + RELEASE
+        with self.assertNumQueries(6):
+            registrar_resultados(filas)
+
+    def _subir(self, nombre, contenido):
+        archivo = SimpleUploadedFile(nombre, contenido)
+        return self.client.post(
+            '/api/v1/solicitudes/resultados/', {'archivo': archivo},
+            format='multipart')
+
+    def test_jsonl_con_lineas_ilegibles(self):
+        s1 = self.solicitudes[0]
+        contenido = (
+            f'{{"solicitud": {s1.id}, "fase": "Teórico", "aprobado": true}}\n'.encode()
+            + b'{"solicitud": 1, "fase": \n'
+            + b'\n'
+            + b'{"solicitud": "\xff"}\n')
+        response = self._subir('resultados.jsonl', contenido)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['registradas'], 1)
+        errores = [f['error'] for f in response.data['filas'][1:]]
+        self.assertTrue(errores[0].startswith('Línea 2: JSON no válido'))
+        self.assertEqual(errores[1], 'Línea 4: no está en UTF-8.')
+
+    def test_csv_con_linea_no_utf8(self):
+        s1, s2 = self.solicitudes[:2]
+        contenido = (b'solicitud,fase,aprobado\n'
+                     + f'{s1.id},Teórico,si\n'.encode()
+                     + b'\xe9\xe9,Te\xf3rico,si\n'
+                     + f'{s2.id},Teórico,no\n'.encode())
+        response = self._subir('resultados.csv', contenido)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([f['ok'] for f in response.data['filas']], [True, False, True])
+        self.assertEqual(response.data['filas'][1]['error'], 'Línea 3: no está en UTF-8.')
+
+    def test_lista_json(self):
+        response = self.client.post(
+            '/api/v1/solicitudes/resultados/',
+            json.dumps([{'solicitud': self.solicitudes[0].id,
+                         'fase': 'teórico', 'aprobado': 'apto'}]),
+            content_type='application/json')
+        self.assertEqual(response.data['registradas'], 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadSolicitudesTests(TestCase):
+    """Importador masivo `load_solicitudes`."""
+
+    def setUp(self):
+        zonas.invalidar()
+        Permiso.objects.create(codigo='B', descripcion='Turismo')
+        Zona.objects.create(nombre='Motril')
+        fichero = tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', delete=False, encoding='utf-8')
+        fichero.write(
+            "nombre,telefono,sesion,fecha_teorico,zona,notas\n"
+            "ANA RUIZ PEREZ,600000001,m/t,17/01/24,motril,\n"
+            "LUIS GIL,600000002,t,,Adra,paga luego\n"
+            "LUIS GIL,600000002,t,,Adra,duplicado\n")
+        fichero.close()
+        self.ruta = fichero.name
+        self.addCleanup(os.remove, self.ruta)
+
+    def test_importa_en_bloque_y_es_idempotente(self):
+        call_command('load_solicitudes', self.ruta, procesos=1, stdout=io.StringIO())
+
+        ana = Solicitud.objects.get(alumno__usuario__username='600000001')
+        self.assertEqual(ana.alumno.usuario.last_name, 'RUIZ PEREZ')
+        self.assertEqual((ana.zona.nombre, ana.sesion_preferida), ('Motril', 'B'))
+        self.assertEqual(ana.alumno.zona_activa, ana.zona)
+        self.assertTrue(ana.alumno.usuario.check_password('600000001'))
+        self.assertEqual(Solicitud.objects.count(), 2)
+        self.assertEqual(Zona.objects.count(), 2)
+
+        # Segunda ejecución: permiso + usuarios existentes
+        with self.assertNumQueries(2):
+            call_command('load_solicitudes', self.ruta, stdout=io.StringIO())
+        self.assertEqual(Solicitud.objects.count(), 2)
+
+    def test_filas_malas_se_informan_y_no_cortan_la_carga(self):
+        ruta = self.ruta.replace('.csv', '.jsonl')
+        self.addCleanup(os.remove, ruta)
+        with open(ruta, 'w', encoding='utf-8') as fichero:
+            fichero.write('\n'.join([
+                '{"nombre": "ANA", "telefono": "600000001", "sesion": "m", "zona": "Adra"}',
+                '{"nombre": "ROTA", "telefono": ',
+                '{"nombre": "SIN TELEFONO", "sesion": "t", "zona": "Adra"}',
+                '{"nombre": null, "telefono": "600000003", "zona": "Adra"}',
+                '["no", "es", "un", "objeto"]',
+                '{"nombre": "LUIS", "telefono": 600000002, "zona": "Berja"}',
+            ]))
+        salida = io.StringIO()
+
+        # Un lote por fila: las buenas posteriores a las malas también entran
+        call_command('load_solicitudes', ruta, lote=1, procesos=1, stdout=salida)
+
+        self.assertEqual(
+            sorted(Solicitud.objects.values_list('alumno__usuario__username', 'zona__nombre')),
+            [('600000001', 'Adra'), ('600000002', 'Berja')])
+        informe = salida.getvalue()
+        self.assertIn('Línea 2: JSON no válido', informe)
+        self.assertIn('Fila 3: Falta el teléfono.', informe)
+        self.assertIn('Fila 4: Falta el nombre.', informe)
+        self.assertIn('Fila 5: La fila no es un objeto.', informe)
+        self.assertIn('4 filas omitidas', informe)
+
+
+class ZonasTests(TestCase):
+    """Normalización, resolución en memoria y fusión de zonas."""
+
+    def setUp(self):
+        zonas.invalidar()
+        self.ejido = Zona.objects.create(nombre='Ejido')
+
+    def test_normalizar(self):
+        for nombre in ['Ejido', 'El ejido', '  EL  EJIDO ', 'el-Ejido']:
+            self.assertEqual(zonas.normalizar(nombre), 'ejido')
+        self.assertEqual(zonas.normalizar('Las Norias'), 'norias')
+        self.assertEqual(zonas.normalizar('Albuñol'), 'albunol')
+        self.assertEqual(zonas.normalizar('La'), 'la')
+
+    def test_resolver_sin_consultas_tras_la_carga(self):
+        zonas.resolver('ejido')
+        with self.assertNumQueries(0):
+            self.assertEqual(zonas.resolver('El Ejido'), self.ejido.pk)
+            self.assertIsNone(zonas.resolver('Adra'))
+        adra = zonas.resolver('adra', crear=True)
+        self.assertEqual(Zona.objects.get(pk=adra).nombre, 'Adra')
+        with self.assertNumQueries(0):
+            self.assertEqual(zonas.resolver('ADRA'), adra)
+
+    def test_resolver_varios_crea_en_bloque(self):
+        zonas.mapa_claves()
+        nombres = ['El ejido', 'Adra', 'adra', 'Las Norias', 'Berja', '']
+        # SAVEPOINT + INSERT zonas + ids + INSERT alias + alias + RELEASE
+        with self.assertNumQueries(6):
+            ids = zonas.resolver_varios(nombres, crear=True)
+        self.assertEqual(ids['El ejido'], self.ejido.pk)
+        self.assertEqual(ids['Adra'], ids['adra'])
+        self.assertIsNone(ids[''])
+        self.assertEqual(
+            sorted(Zona.objects.values_list('nombre', flat=True)),
+            ['Adra', 'Berja', 'Ejido', 'Las norias'])
+        with self.assertNumQueries(0):
+            self.assertEqual(zonas.resolver('norias'), ids['Las Norias'])
+
+    def test_api_rechaza_zona_equivalente(self):
+        admin = User.objects.create(username='admin', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        respuesta = client.post('/api/v1/zonas/', {'nombre': 'El ejido'})
+        self.assertEqual(respuesta.status_code, 400)
+        respuesta = client.post('/api/v1/zonas/', {'nombre': 'Motril'})
+        self.assertEqual(respuesta.status_code, 201)
+
+    def test_fusionar_zonas(self):
+        duplicada = Zona.objects.create(nombre='El ejido')
+        roquetas = Zona.objects.create(nombre='Roquetas')
+        roquetas_mar = Zona.objects.create(nombre='Roquetas de Mar')
+        ZonaAlias.objects.filter(zona=roquetas_mar).update(zona=roquetas)
+        permiso = Permiso.objects.create(codigo='B', descripcion='Turismo')
+        alumno = Alumno.objects.create(
+            usuario=User.objects.create(username='alumno'))
+        for zona in (duplicada, roquetas_mar):
+            Solicitud.objects.create(alumno=alumno, zona=zona, permiso=permiso)
+
+        call_command('fusionar_zonas', stdout=io.StringIO())
+
+        self.assertQuerySetEqual(
+            Zona.objects.order_by('nombre').values_list('nombre', flat=True),
+            ['Ejido', 'Roquetas'])
+        self.assertEqual(
+            sorted(Solicitud.objects.values_list('zona_id', flat=True)),
+            [self.ejido.pk, roquetas.pk])
+        self.assertEqual(zonas.resolver('Roquetas de mar'), roquetas.pk)
+
+
+class SalidasRecurrentesTests(TestCase):
+    """Generación del calendario desde plantillas semanales."""
+
+    def setUp(self):
+        self.profesor = Profesor.objects.create(usuario=User.objects.create(
+            username='profe', rol=User.Roles.PROFESOR))
+        self.zona = Zona.objects.create(nombre='El ejido')
+        # Próximo lunes y ocho semanas de plantillas
+        hoy = timezone.now().date()
+        self.lunes = hoy + timedelta(days=7 - hoy.weekday())
+        self.hasta = self.lunes + timedelta(weeks=8) - timedelta(days=1)
+
+    def _plantilla(self, dia, sesion, cupo=3):
+        return SalidaRecurrente.objects.create(
+            profesor=self.profesor, zona=self.zona, dia_semana=dia, sesion=sesion,
+            cupo_maximo=cupo, fecha_inicio=self.lunes, fecha_fin=self.hasta)
+
+    def test_genera_en_bloque_e_informa_conflictos(self):
+        self._plantilla(0, 'M')
+        self._plantilla(2, 'T', cupo=5)
+        mixta = self._plantilla(0, 'B')
+        SalidaDisponible.objects.create(
+            profesor=self.profesor, zona=self.zona, fecha=self.lunes + timedelta(days=2),
+            sesion='T')
+
+        # plantillas + SAVEPOINT + bloqueo + salidas existentes + INSERT + RELEASE
+        with self.assertNumQueries(6):
+            resultado = generar_salidas(desde=self.lunes, hasta=self.hasta)
+
+        self.assertEqual(resultado.creadas, 8 + 7)
+        self.assertEqual(len(resultado.conflictos), 8 + 1)
+        self.assertEqual(
+            sum(c.recurrencia_id == mixta.pk for c in resultado.conflictos), 8)
+        self.assertEqual(SalidaDisponible.objects.filter(cupo_maximo=5).count(), 7)
+
+        # Repetir no crea nada: todo son conflictos con salidas existentes
+        resultado = generar_salidas(desde=self.lunes, hasta=self.hasta)
+        self.assertEqual(resultado.creadas, 0)
+        self.assertEqual(SalidaDisponible.objects.count(), 16)
+
+    def test_choque_con_quien_no_bloquea_no_guarda_nada(self):
+        self._plantilla(0, 'M')
+        fechas = calendario.fechas
+
+        def con_carrera(recurrencia, desde, hasta):
+            # El admin guarda la primera salida después de la lectura
+            SalidaDisponible.objects.create(
+                profesor=self.profesor, zona=self.zona, fecha=self.lunes, sesion='M')
+            return fechas(recurrencia, desde, hasta)
+
+        with mock.patch.object(calendario, 'fechas', con_carrera), \
+                self.assertRaises(IntegrityError):
+            generar_salidas(desde=self.lunes, hasta=self.hasta)
+        # Ninguna de las otras siete semanas se guardó
+        self.assertFalse(SalidaDisponible.objects.exclude(fecha=self.lunes).exists())
+
+    def test_alta_por_api_toma_el_mismo_bloqueo(self):
+        client = APIClient()
+        client.force_authenticate(user=self.profesor.usuario)
+        datos = {'profesor': self.profesor.pk, 'zona': self.zona.pk,
+                 'fecha': self.lunes.isoformat(), 'sesion': 'M', 'cupo_maximo': 3}
+        with mock.patch('practicas.views.bloquear_profesores',
+                        wraps=calendario.bloquear_profesores) as bloquear:
+            response = client.post('/api/v1/salidas/', datos, format='json')
+        self.assertEqual(response.status_code, 201)
+        bloquear.assert_called_once_with({self.profesor.pk})
+
+
+class AgendaTests(TestCase):
+    """Agenda de un profesor con huecos, clases y salidas en una respuesta."""
+
+    def setUp(self):
+        user_profe = User.objects.create_user(
+            username='profe', password='1234', rol=User.Roles.PROFESOR)
+        self.profesor = Profesor.objects.create(usuario=user_profe)
+        self.zona = Zona.objects.create(nombre='El Ejido')
+        self.manana = timezone.localdate() + timedelta(days=1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=user_profe)
+
+    def _a_las(self, hora, dias=0):
+        return timezone.make_aware(datetime.combine(
+            self.manana + timedelta(days=dias), dt_time(hora)))
+
+    def _hueco(self, hora, dias=0, alumno=None):
+        horario = HorarioDisponible.objects.create(
+            profesor=self.profesor, fecha_hora_inicio=self._a_las(hora, dias))
+        if alumno:
+            ClasePractica.objects.create(horario=horario, alumno=alumno)
+        return horario
+
+    def test_agenda_ordenada_con_conflictos(self):
+        alumno = User.objects.create(username='600000001', first_name='Ana')
+        clase = self._hueco(9, alumno=alumno)
+        solapado = self._hueco(11)
+        libre = self._hueco(14)
+        self._hueco(16, dias=2)
+        salida = SalidaDisponible.objects.create(
+            profesor=self.profesor, zona=self.zona, fecha=self.manana, sesion='M')
+        reservar_plaza(salida, User.objects.create(username='600000002'))
+
+        # huecos y clases + salidas + reservas; el perfil ya está en caché
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/v1/agenda/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['dias']), 7)
+        self.assertEqual(response.data['conflictos'], 1)
+
+        eventos = response.data['dias'][1]['eventos']
+        self.assertEqual([(e['tipo'], e['id']) for e in eventos],
+                         [('salida', salida.id), ('clase', clase.id),
+                          ('hueco', solapado.id), ('hueco', libre.id)])
+        self.assertEqual(eventos[0]['conflictos'], [{'tipo': 'clase', 'id': clase.id}])
+        self.assertEqual(eventos[0]['alumnos'][0]['nombre'], '600000002')
+        self.assertEqual(eventos[1]['alumno']['nombre'], 'Ana')
+        self.assertEqual(eventos[2]['conflictos'], [])  # hueco libre: no choca
+        self.assertEqual(eventos[3]['conflictos'], [])  # empieza al acabar la sesión
+        self.assertEqual(len(response.data['dias'][3]['eventos']), 1)
+
+    def test_rango_y_permisos(self):
+        self._hueco(10)
+        dia = self.manana.isoformat()
+        response = self.client.get(f'/api/v1/agenda/?desde={dia}&hasta={dia}')
+        self.assertEqual(len(response.data['dias']), 1)
+        self.assertEqual(
+            self.client.get(f'/api/v1/agenda/?desde={dia}&hasta=2000-01-01').status_code, 400)
+
+        admin = User.objects.create_user(username='admin', password='1234', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        self.assertEqual(self.client.get('/api/v1/agenda/').status_code, 400)
+        with self.assertNumQueries(2):  # sin salidas no hay prefetch de reservas
+            response = self.client.get(f'/api/v1/agenda/?profesor={self.profesor.id}')
+        self.assertEqual(len(response.data['dias'][1]['eventos']), 1)
+
+        self.client.force_authenticate(user=User.objects.create(username='600000003'))
+        self.assertEqual(self.client.get('/api/v1/agenda/').status_code, 403)
+
+
+class PropietarioTests(TestCase):
+    """La propiedad se resuelve en la consulta que carga el objeto."""
+
+    def setUp(self):
+        zona = Zona.objects.create(nombre='El Ejido')
+        self.profes = [
+            Profesor.objects.create(usuario=User.objects.create(
+                username=f'profe{i}', rol=User.Roles.PROFESOR))
+            for i in range(2)]
+        manana = timezone.localdate() + timedelta(days=1)
+        self.alumno = User.objects.create(username='600000001')
+        self.reservas = [
+            reservar_plaza(SalidaDisponible.objects.create(
+                profesor=profe, zona=zona, fecha=manana, sesion='M'), self.alumno)
+            for profe in self.profes]
+        self.client = APIClient()
+
+    def _como(self, user):
+        token = TokenConRolSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_profesor_confirma_solo_sus_reservas(self):
+        self._como(self.profes[0].usuario)
+        propia, ajena = self.reservas
+        with self.assertNumQueries(2):  # SELECT filtrado por dueño + UPDATE
+            response = self.client.post(f'/api/v1/reservas/{propia.id}/confirmar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['estado'], 'C')
+
+        with self.assertNumQueries(1):
+            response = self.client.post(f'/api/v1/reservas/{ajena.id}/rechazar/')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/v1/reservas/')
+        self.assertEqual([r['id'] for r in response.data['results']], [propia.id])
+
+    def test_alumno_ve_y_cancela_lo_suyo(self):
+        self._como(self.alumno)
+        response = self.client.get('/api/v1/reservas/')
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.post(f'/api/v1/reservas/{self.reservas[0].id}/confirmar/')
+        self.assertEqual(response.status_code, 403)
+
+        self._como(User.objects.create(username='600000002'))
+        response = self.client.delete(f'/api/v1/reservas/{self.reservas[0].id}/cancelar/')
+        self.assertEqual(response.status_code, 404)
+
+
+class CacheRespuestasTests(TestCase):
+    """Caché de respuestas con versión por grupo e invalidación por señales."""
+
+    def setUp(self):
+        cache.clear()
+        self.permiso = Permiso.objects.create(codigo='B', descripcion='Turismo')
+        teorico = Fase.objects.create(nombre='Teórico', orden=1)
+        PermisoFase.objects.create(permiso=self.permiso, fase=teorico, orden=1)
+        self.profesor = Profesor.objects.create(usuario=User.objects.create(
+            username='profe', rol=User.Roles.PROFESOR))
+        self.zona = Zona.objects.create(nombre='El Ejido')
+        self.client = APIClient()
+        self._como(User.objects.create(username='admin', is_staff=True))
+
+    def _como(self, user):
+        token = TokenConRolSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_catalogo_de_permisos(self):
+        with self.assertNumQueries(2):  # permisos + fases (prefetch)
+            response = self.client.get('/api/v1/permisos/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/permisos/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual([f['nombre'] for f in response.data['results'][0]['fases']],
+                         ['Teórico'])
+
+        practico = Fase.objects.create(nombre='Circulación', orden=2)
+        PermisoFase.objects.create(permiso=self.permiso, fase=practico, orden=2)
+        response = self.client.get('/api/v1/permisos/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['results'][0]['fases']), 2)
+
+    def test_salidas_por_alcance_e_invalidacion(self):
+        salida = SalidaDisponible.objects.create(
+            profesor=self.profesor, zona=self.zona,
+            fecha=timezone.localdate() + timedelta(days=1), sesion='M', cupo_maximo=2)
+        self.client.get('/api/v1/salidas/')
+        self.assertEqual(self.client.get('/api/v1/salidas/')['X-Cache'], 'HIT')
+
+        # Otro rol no comparte la entrada
+        self._como(User.objects.create(username='600000001'))
+        response = self.client.get('/api/v1/salidas/')
+        self.assertEqual((response['X-Cache'], response.data['results']), ('MISS', []))
+
+        # El UPDATE del contador invalida aunque no lance señales
+        reservar_plaza(salida, User.objects.create(username='600000002'))
+        self._como(User.objects.get(username='admin'))
+        response = self.client.get('/api/v1/salidas/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['cupo_disponible'], 1)
+
+    @override_settings(CACHE_RESPUESTAS=False)
+    def test_sin_cache_compartida_no_se_cachea(self):
+        self.client.get('/api/v1/permisos/')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/permisos/')
+        self.assertNotIn('X-Cache', response)
+
+    def test_fallos_simultaneos_calculan_una_vez(self):
+        calculos = []
+
+        def calcular():
+            calculos.append(1)
+            time.sleep(0.2)
+            return {'ok': True}
+
+        resultados = []
+        hilos = [threading.Thread(
+            target=lambda: resultados.append(cache_api.obtener('clave', calcular)))
+            for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(calculos), 1)
+        self.assertEqual([valor for valor, _ in resultados], [{'ok': True}] * 8)
+
+    def test_cache_local_caduca_e_invalida(self):
+        cargas = []
+        local = cache_api.CacheLocal(lambda: cargas.append(1) or len(cargas), ttl=60)
+        self.assertFalse(local.cargado)
+        self.assertEqual([local.obtener(), local.obtener()], [1, 1])
+        local.invalidar(sender=None)
+        self.assertEqual(local.obtener(), 2)
+        # Pasado el TTL recarga aunque nadie haya invalidado
+        with mock.patch.object(cache_api.time, 'monotonic',
+                               return_value=time.monotonic() + 61):
+            self.assertEqual(local.obtener(), 3)
+
+
+class CompresionTests(TestCase):
+    """Compresión br/gzip de las respuestas según Accept-Encoding."""
+
+    def setUp(self):
+        cache.clear()
+        profesor = Profesor.objects.create(usuario=User.objects.create(
+            username='profe', rol=User.Roles.PROFESOR))
+        zona = Zona.objects.create(nombre='El Ejido')
+        hoy = timezone.localdate()
+        SalidaDisponible.objects.bulk_create([
+            SalidaDisponible(profesor=profesor, zona=zona,
+                             fecha=hoy + timedelta(days=i + 1), sesion='M')
+            for i in range(50)])
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+
+    def test_negociacion(self):
+        self.assertEqual(elegir_codificacion('gzip, deflate, br'), 'br')
+        self.assertEqual(elegir_codificacion('br;q=0, gzip;q=0.5'), 'gzip')
+        self.assertEqual(elegir_codificacion('gzip;q=0.5, br;q=0.4'), 'gzip')
+        self.assertEqual(elegir_codificacion('*'), 'br')
+        self.assertIsNone(elegir_codificacion('identity'))
+        self.assertIsNone(elegir_codificacion(''))
+
+    def test_listado_comprimido(self):
+        plano = self.client.get('/api/v1/salidas/?page_size=50')
+        self.assertFalse(plano.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plano['Vary'])
+
+        for aceptadas, codificacion, descomprimir in [
+                ('gzip, br', 'br', brotli.decompress),
+                ('gzip', 'gzip', gzip.decompress)]:
+            response = self.client.get('/api/v1/salidas/?page_size=50',
+                                       HTTP_ACCEPT_ENCODING=aceptadas)
+            self.assertEqual(response['Content-Encoding'], codificacion)
+            self.assertLess(len(response.content), len(plano.content) // 4)
+            self.assertEqual(descomprimir(response.content), plano.content)
+
+    @override_settings(COMPRESION_MINIMO=0)
+    def test_html_sin_comprimir(self):
+        # Admin y API navegable: cookie de sesión y token CSRF (BREACH)
+        for response in [self.client.get('/admin/login/', HTTP_ACCEPT_ENCODING='br'),
+                         self.client.get('/api/v1/zonas/', HTTP_ACCEPT='text/html',
+                                         HTTP_ACCEPT_ENCODING='br')]:
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith('text/html'))
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(COMPRESION_MINIMO=10 ** 6)
+    def test_respuesta_pequena_sin_comprimir(self):
+        response = self.client.get('/api/v1/salidas/', HTTP_ACCEPT_ENCODING='br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class RenderizadoJSONTests(TestCase):
+    """`backend.renderers` produce los mismos bytes que el JSON de DRF."""
+
+    def setUp(self):
+        cache.clear()
+        self.profesor = Profesor.objects.create(usuario=User.objects.create(
+            username='profe', first_name='José', last_name='Núñez',
+            rol=User.Roles.PROFESOR))
+        usuario = User.objects.create(username='600000001', first_name='Ana ')
+        self.alumno = Alumno.objects.create(usuario=usuario, city='Almería')
+        zona = Zona.objects.create(nombre='El Ejido')
+        self.permiso = Permiso.objects.create(codigo='B', descripcion='Turismo')
+        PermisoFase.objects.create(
+            permiso=self.permiso, fase=Fase.objects.create(nombre='Teórico', orden=1),
+            orden=1)
+        Solicitud.objects.create(alumno=self.alumno, zona=zona, permiso=self.permiso,
+                                 sesion_preferida='M', notas='"comillas" \\ y ñ')
+        salida = SalidaDisponible.objects.create(
+            profesor=self.profesor, zona=zona,
+            fecha=timezone.localdate() + timedelta(days=1), sesion='M')
+        reservar_plaza(salida, usuario)
+        horario = HorarioDisponible.objects.create(
+            profesor=self.profesor,
+            fecha_hora_inicio=timezone.now().replace(microsecond=123456) + timedelta(days=1))
+        ClasePractica.objects.create(alumno=usuario, horario=horario)
+
+    def _iguales(self, data):
+        self.assertEqual(JSONRapidoRenderer().render(data), JSONRenderer().render(data))
+
+    def test_todos_los_serializadores(self):
+        from citas import serializers as s_citas
+        from usuarios import serializers as s_usuarios
+        from . import serializers as s_practicas
+
+        casos = [
+            (s_citas.ProfesorSerializer, Profesor),
+            (s_citas.HorarioDisponibleSerializer, HorarioDisponible),
+            (s_citas.ClasePracticaSerializer, ClasePractica),
+            (s_usuarios.UserSerializer, User),
+            (s_usuarios.ProfesorSerializer, Profesor),
+            (s_usuarios.AlumnoSerializer, Alumno),
+            (s_practicas.ZonaSerializer, Zona),
+            (s_practicas.PermisoSerializer, Permiso),
+            (s_practicas.SolicitudSerializer, Solicitud),
+            (s_practicas.SalidaDisponibleSerializer, SalidaDisponible),
+            (s_practicas.ReservaSerializer, Reserva),
+        ]
+        for serializer, modelo in casos:
+            with self.subTest(serializer=serializer.__name__):
+                self._iguales(serializer(modelo.objects.all(), many=True).data)
+                self._iguales(serializer(modelo.objects.first()).data)
+
+    def test_respuestas_de_la_api(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        for ruta in ['solicitudes/', 'salidas/', 'reservas/', 'horarios-disponibles/',
+                     'clases-practicas/', 'alumnos/', 'users/', 'zonas/', 'permisos/',
+                     f'agenda/?profesor={self.profesor.id}']:
+            with self.subTest(ruta=ruta):
+                response = self.client.get(f'/api/v1/{ruta}')
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_tipos_especiales(self):
+        from decimal import Decimal
+        from uuid import UUID
+        from django.utils.translation import gettext_lazy
+
+        ahora = datetime(2025, 3, 1, 9, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        self._iguales({
+            'utc': ahora, 'sin_micro': ahora.replace(microsecond=0),
+            'naive': ahora.replace(tzinfo=None), 'fecha': ahora.date(),
+            'hora': dt_time(9, 30, 0, 5000), 'duracion': timedelta(hours=1, seconds=1),
+            'decimal': Decimal('12.50'), 'uuid': UUID(int=7), 'lazy': gettext_lazy('Zona'),
+            'bytes': b'abc', 'tupla': (1, 2), 'conjunto_vacio': frozenset(),
+            'queryset': Zona.objects.values_list('nombre', flat=True),
+            'texto': 'ñ     \x00 \t </script>', 'enorme': 2 ** 70,
+            1: 'clave entera', 'estado': Solicitud.Estados.PENDIENTE,
+            'float': 0.1, 'anidado': [{'a': None, 'b': True}],
+        })
+        self.assertEqual(JSONRapidoRenderer().render(None), b'')
+        self.assertEqual(
+            JSONRapidoRenderer().render({'a': [1]}, 'application/json; indent=2'),
+            JSONRenderer().render({'a': [1]}, 'application/json; indent=2'))
+
+    def test_parser(self):
+        from rest_framework.exceptions import ParseError
+        from rest_framework.parsers import JSONParser
+
+        for cuerpo in [b'{"a": [1, 2.5, "\\u00f1", null]}', '{"ñ": " "}'.encode(),
+                       b'[1e400]', b'123456789012345678901234567890', b'"\\ud800"']:
+            with self.subTest(cuerpo=cuerpo):
+                self.assertEqual(JSONRapidoParser().parse(io.BytesIO(cuerpo)),
+                                 JSONParser().parse(io.BytesIO(cuerpo)))
+        for cuerpo in [b'{"a": NaN}', b'{"a":', b'']:
+            with self.subTest(cuerpo=cuerpo):
+                with self.assertRaises(ParseError) as esperado:
+                    JSONParser().parse(io.BytesIO(cuerpo))
+                with self.assertRaisesMessage(ParseError, str(esperado.exception)):
+                    JSONRapidoParser().parse(io.BytesIO(cuerpo))
+
+
+class LecturaRapidaTests(TestCase):
+    """Los listados sobre `.values()` dan el mismo JSON que los serializers."""
+
+    def setUp(self):
+        cache.clear()
+        profesor = Profesor.objects.create(usuario=User.objects.create(
+            username='profe', rol=User.Roles.PROFESOR))
+        zona = Zona.objects.create(nombre='El Ejido')
+        permiso = Permiso.objects.create(codigo='B', descripcion='Turismo')
+        fase = Fase.objects.create(nombre='Teórico', orden=1)
+        hoy = timezone.now().replace(microsecond=0)
+        for i in range(6):
+            usuario = User.objects.create(
+                username=f'60000000{i}', first_name='Ana' if i % 2 else '',
+                last_name=f'Ruiz {i}' if i % 3 else '')
+            alumno = Alumno.objects.create(usuario=usuario)
+            Solicitud.objects.create(
+                alumno=alumno, zona=zona, permiso=permiso, sesion_preferida='MTB'[i % 3],
+                estado='SIE'[i % 3], notas='ñ' * i, fase_actual=fase if i % 2 else None,
+                fecha_teorico=hoy.date() if i % 2 else None,
+                fecha_inscripcion=hoy - timedelta(days=i, microseconds=i * 1001))
+            salida = SalidaDisponible.objects.create(
+                profesor=profesor, zona=zona, fecha=hoy.date() + timedelta(days=i + 1),
+                sesion='MT'[i % 2], cupo_maximo=2)
+            reservar_plaza(salida, usuario, estado='SC'[i % 2])
+            HorarioDisponible.objects.create(
+                profesor=profesor, fecha_hora_inicio=hoy + timedelta(hours=i + 1, microseconds=i))
+        self.admin = User.objects.create(username='admin', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def _casos(self):
+        from citas.serializers import HorarioDisponibleSerializer, HorarioDisponibleLectura
+        from .serializers import (
+            ReservaLectura, ReservaSerializer, SolicitudLectura, SolicitudSerializer)
+        return [
+            ('solicitudes', SolicitudSerializer, SolicitudLectura,
+             Solicitud.objects.order_by('fecha_inscripcion', 'id')),
+            ('reservas', ReservaSerializer, ReservaLectura,
+             Reserva.objects.order_by('created_at', 'id')),
+            ('horarios-disponibles', HorarioDisponibleSerializer, HorarioDisponibleLectura,
+             HorarioDisponible.objects.order_by('fecha_hora_inicio', 'id')),
+        ]
+
+    def test_misma_salida_que_el_serializer(self):
+        for zona_horaria in ('UTC', 'Europe/Madrid'):
+            with timezone.override(zona_horaria):
+                for nombre, serializer, lectura, qs in self._casos():
+                    with self.subTest(nombre=nombre, zona_horaria=zona_horaria):
+                        rapida = lectura()
+                        self.assertEqual(
+                            JSONRenderer().render(rapida.serializar(qs.values(*rapida.campos))),
+                            JSONRenderer().render(serializer(qs, many=True).data))
+
+    def test_listado_paginado(self):
+        for nombre, serializer, _, qs in self._casos():
+            with self.subTest(nombre=nombre):
+                filas, url = [], f'/api/v1/{nombre}/?page_size=4'
+                while url:
+                    with self.assertNumQueries(1):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    filas += response.data['results']
+                    url = response.data['next']
+                self.assertEqual(filas, serializer(qs, many=True).data)
+
+    def test_detalle_sigue_con_el_serializer(self):
+        reserva = Reserva.objects.first()
+        response = self.client.get(f'/api/v1/reservas/{reserva.pk}/')
+        self.assertEqual(response.data['salida_detalle']['cupo_disponible'], 1)
+
+
+class ExportarTests(TestCase):
+    """`/exportar/` en CSV y XLSX, en streaming y con los filtros del listado."""
+
+    def setUp(self):
+        profesor = Profesor.objects.create(usuario=User.objects.create(
+            username='profe', rol=User.Roles.PROFESOR))
+        zona = Zona.objects.create(nombre='El Ejido')
+        permiso = Permiso.objects.create(codigo='B', descripcion='Turismo')
+        self.usuarios = []
+        for i in range(5):
+            usuario = User.objects.create(username=f'60000000{i}', first_name='Ana',
+                                          last_name=f'Ruiz, "{i}"')
+            self.usuarios.append(usuario)
+            Solicitud.objects.create(
+                alumno=Alumno.objects.create(usuario=usuario), zona=zona,
+                permiso=permiso, notas='=HYPERLINK("x")' if i == 0 else 'ñ <b>&',
+                fecha_inscripcion=timezone.now() - timedelta(days=5 - i))
+            salida = SalidaDisponible.objects.create(
+                profesor=profesor, zona=zona, sesion='M',
+                fecha=timezone.localdate() + timedelta(days=i + 1))
+            reservar_plaza(salida, usuario)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+
+    def _contenido(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        with self.assertNumQueries(1):
+            contenido = self._contenido(self.client.get('/api/v1/solicitudes/exportar/'))
+        self.assertTrue(contenido.startswith('\ufeff'.encode()))
+        filas = list(csv.reader(io.StringIO(contenido.decode('utf-8-sig'))))
+
+        listado = self.client.get('/api/v1/solicitudes/').data['results']
+        self.assertEqual(filas[0], list(listado[0]))
+        self.assertEqual(len(filas), 6)
+        self.assertEqual(filas[1][filas[0].index('notas')], '\'=HYPERLINK("x")')
+        self.assertEqual(filas[2][filas[0].index('nombre')], 'Ana Ruiz, "1"')
+        self.assertEqual(filas[2][filas[0].index('fecha_inscripcion')],
+                         listado[1]['fecha_inscripcion'])
+
+    def test_xlsx(self):
+        from xml.etree import ElementTree
+
+        response = self.client.get('/api/v1/reservas/exportar/?formato=xlsx')
+        self.assertIn('.xlsx"', response['Content-Disposition'])
+        libro = zipfile.ZipFile(io.BytesIO(self._contenido(response)))
+        ns = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        hoja = ElementTree.fromstring(libro.read('xl/worksheets/sheet1.xml'))
+        filas = [[''.join(c.itertext()) for c in fila.findall('x:c', ns)]
+                 for fila in hoja.findall('x:sheetData/x:row', ns)]
+
+        self.assertEqual(len(filas), 6)
+        self.assertIn('salida_detalle.fecha', filas[0])
+        self.assertEqual(filas[1][filas[0].index('alumno_username')], '600000000')
+        self.assertEqual(filas[1][filas[0].index('estado_display')], 'Solicitado')
+
+    def test_streaming_por_lotes(self):
+        with mock.patch('backend.exportar.LOTE', 2):
+            response = self.client.get('/api/v1/clases-practicas/exportar/')
+            self.assertEqual(len(list(response.streaming_content)), 1)  # sin clases: cabecera
+
+            response = self.client.get('/api/v1/reservas/exportar/', HTTP_ACCEPT='text/csv')
+            self.assertEqual(response.status_code, 200)
+            trozos = list(response.streaming_content)
+        # Cabecera y primera fila enseguida, después de 2 en 2
+        self.assertEqual(len(trozos), 4)
+
+    def test_exportacion_vacia_con_cabecera(self):
+        Reserva.objects.all().delete()
+        contenido = self._contenido(self.client.get('/api/v1/reservas/exportar/'))
+        filas = list(csv.reader(io.StringIO(contenido.decode('utf-8-sig'))))
+        self.assertEqual(filas, [ReservaLectura.columnas()])
+        self.assertIn('salida_detalle.cupo_disponible', filas[0])
+
+        response = self.client.get('/api/v1/clases-practicas/exportar/?formato=xlsx')
+        libro = zipfile.ZipFile(io.BytesIO(self._contenido(response)))
+        self.assertIn(b'alumno_username', libro.read('xl/worksheets/sheet1.xml'))
+
+    def test_columnas_como_el_listado(self):
+        for url, lectura in [('/api/v1/solicitudes/', SolicitudLectura),
+                             ('/api/v1/reservas/', ReservaLectura)]:
+            fila = self.client.get(url).data['results'][0]
+            self.assertEqual(lectura.columnas(), list(aplanar(fila)))
+
+    def test_mismos_permisos_que_el_listado(self):
+        self.assertEqual(
+            self.client.get('/api/v1/solicitudes/exportar/?formato=pdf').status_code, 400)
+
+        self.client.force_authenticate(self.usuarios[2])
+        self.assertEqual(self.client.get('/api/v1/solicitudes/exportar/').status_code, 403)
+        filas = self._contenido(self.client.get('/api/v1/reservas/exportar/')).splitlines()
+        self.assertEqual(len(filas), 2)
+        self.assertIn(b'600000002', filas[1])
+
+
+class InstrumentacionTests(TestCase):
+    """Server-Timing, logs de consultas y presupuesto por vista."""
+
+    def setUp(self):
+        cache.clear()
+        Zona.objects.create(nombre='El Ejido')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+
+    def test_server_timing_y_log(self):
+        with self.assertLogs('backend.consultas', 'INFO') as logs:
+            response = self.client.get('/api/v1/zonas/')
+        self.assertRegex(response['Server-Timing'],
+                         r'^db;dur=[\d.]+;desc="1 consultas", total;dur=[\d.]+$')
+        registro = logs.records[0]
+        self.assertEqual((registro.vista, registro.accion, registro.consultas, registro.estado),
+                         ('ZonaViewSet', 'list', 1, 200))
+
+        # De la caché: ninguna consulta
+        response = self.client.get('/api/v1/zonas/')
+        self.assertIn('desc="0 consultas"', response['Server-Timing'])
+
+    def test_server_timing_solo_para_staff_o_debug(self):
+        alumno = Alumno.objects.create(usuario=User.objects.create(username='600000001'))
+        self.client.force_authenticate(alumno.usuario)
+        response = self.client.get('/api/v1/salidas/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        with override_settings(DEBUG=True):
+            self.assertIn('Server-Timing', self.client.get('/api/v1/salidas/'))
+
+    @override_settings(INSTRUMENTACION_LENTA_MS=0, INSTRUMENTACION_MUESTREO_EXPLAIN=1)
+    def test_consulta_lenta_con_explain(self):
+        with self.assertLogs('backend.consultas', 'WARNING') as logs:
+            self.client.get('/api/v1/zonas/')
+        lenta = next(m for m in logs.output if 'Consulta lenta' in m)
+        self.assertIn('practicas_zona', lenta)
+        self.assertRegex(lenta, r'SCAN|SEARCH')  # plan de SQLite
+
+    @override_settings(INSTRUMENTACION_LENTA_MS=0, INSTRUMENTACION_MUESTREO_EXPLAIN=0)
+    def test_explain_muestreado(self):
+        with mock.patch('backend.instrumentacion.explicar') as explicar, \
+                self.assertLogs('backend.consultas', 'WARNING') as logs:
+            self.client.get('/api/v1/zonas/')
+        self.assertTrue(any('Consulta lenta' in m for m in logs.output))
+        explicar.assert_not_called()
+        # El filtro se lleva la conexión: no llega a los formateadores
+        registro = next(r for r in logs.records if 'Consulta lenta' in r.msg)
+        self.assertFalse(hasattr(registro, 'consulta'))
+
+    def test_n_mas_1_avisa_y_supera_el_presupuesto(self):
+        from backend.instrumentacion import peticion_medida
+        from backend.testing import PresupuestoSuperado, comprobar_presupuesto, sin_presupuesto
+
+        peticion_medida.connect(comprobar_presupuesto, dispatch_uid='presupuesto_consultas')
+        for i in range(5):
+            Alumno.objects.create(usuario=User.objects.create(username=f'60000000{i}'))
+        # Sin el select_related, una consulta de usuario por alumno
+        with mock.patch('usuarios.views.AlumnoViewSet.queryset', Alumno.objects.all()), \
+                self.assertLogs('backend.consultas', 'WARNING') as logs:
+            with self.assertRaisesMessage(
+                    PresupuestoSuperado, 'AlumnoViewSet.list): 6 consultas, presupuesto 1'):
+                self.client.get('/api/v1/alumnos/')
+            with sin_presupuesto():
+                self.assertEqual(self.client.get('/api/v1/alumnos/').status_code, 200)
+        self.assertTrue(any('5 veces (¿N+1?)' in m for m in logs.output))
+        self.assertTrue(any('presupuesto 1' in m for m in logs.output))
@@ -2,15 +2,19 @@
 from rest_framework.routers import DefaultRouter
 from .views import (
     ZonaViewSet,
+    PermisoViewSet,
     SolicitudViewSet,
     SalidaDisponibleViewSet,
     ReservaViewSet,
+    AgendaViewSet,
 )
 
 router = DefaultRouter()
 router.register("zonas",        ZonaViewSet,        basename="zonas")
+router.register("permisos",     PermisoViewSet,     basename="permisos")
 router.register("solicitudes",  SolicitudViewSet,   basename="solicitudes")
 router.register("salidas",      SalidaDisponibleViewSet, basename="salidas")
 router.register("reservas",     ReservaViewSet,     basename="reservas")
+router.register("agenda",       AgendaViewSet,      basename="agenda")
 
 urlpatterns = router.urls     # 👈 sin path extra
@@ -1,22 +1,55 @@
 # practicas/views.py
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, permissions, serializers, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from .models import Zona, Solicitud, SalidaDisponible, Reserva
+from backend.cache import RespuestaCacheadaMixin
+from backend.exportar import ExportarMixin
+from backend.lectura import ListadoRapidoMixin
+from .models import Zona, Permiso, PermisoFase, Solicitud, SalidaDisponible, Reserva
 from .serializers import (
     ZonaSerializer,
+    PermisoSerializer,
     SolicitudSerializer,
     SalidaDisponibleSerializer,
     ReservaSerializer,
+    SolicitudLectura,
+    ReservaLectura,
 )
-from citas.permissions import EsProfesor, EsProfesorDueño  # asegúrate de tenerlos
+from .agenda import construir_agenda
+from .asignacion import asignar_solicitudes
+from .examenes import leer_filas, registrar_resultados, resumen
+from .services import reservar_plaza, rechazar_reserva, cancelar_reserva, ReservaError
+from citas.permissions import EsProfesor, EsProfesorDueño, propios
+from citas.services import bloquear_profesores
+from usuarios.roles import rol_de
 # ---------------------------------------------------------------------------
 
+DIAS_AGENDA = 7
+MAX_DIAS_AGENDA = 31
+
+
+def _dia_param(params, nombre):
+    valor = params.get(nombre)
+    if not valor:
+        return None
+    try:
+        dia = parse_date(valor)
+    except ValueError:
+        dia = None
+    if dia is None:
+        raise serializers.ValidationError({nombre: "Fecha no válida, usa AAAA-MM-DD."})
+    return dia
+
 
 # ════════════════════════════════  ZONAS  ════════════════════════════════ #
-class ZonaViewSet(viewsets.ModelViewSet):
+class ZonaViewSet(RespuestaCacheadaMixin, viewsets.ModelViewSet):
     """
     CRUD completo de zonas de examen.
     Solo el personal administrativo o 'staff' puede gestionarlas.
@@ -24,23 +57,51 @@ class ZonaViewSet(viewsets.ModelViewSet):
     queryset = Zona.objects.all()
     serializer_class = ZonaSerializer
     permission_classes = [permissions.IsAdminUser]
+    cache_grupos = ("zonas",)
+    presupuesto_consultas = {"list": 1, "retrieve": 1}
+
+
+# ═══════════════════════════════  PERMISOS  ══════════════════════════════ #
+class PermisoViewSet(RespuestaCacheadaMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Catálogo de permisos con sus fases en orden (solo lectura).
+    Se gestiona desde el admin de Django.
+    """
+    queryset = Permiso.objects.prefetch_related(Prefetch(
+        "permisofases",
+        queryset=PermisoFase.objects.select_related("fase").order_by("orden", "id")))
+    serializer_class = PermisoSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    cache_grupos = ("permisos",)
+    # Permisos y sus fases (prefetch)
+    presupuesto_consultas = {"list": 2, "retrieve": 2}
 
 
 # ═══════════════════════════════  SOLICITUDES  ═══════════════════════════ #
-class SolicitudViewSet(viewsets.ModelViewSet):
+class SolicitudViewSet(ExportarMixin, ListadoRapidoMixin, viewsets.ModelViewSet):
     """
     Gestión de solicitudes de plaza para una zona y fecha concreta.
-    Cualquier usuario autenticado puede crear; listar o modificar
-    requiere rol de administrador.
+    Cualquier usuario autenticado puede crear; listar, exportar
+    (`/solicitudes/exportar/?formato=csv|xlsx`) o modificar requiere rol
+    de administrador.
     """
-    queryset = Solicitud.objects.all().order_by("fecha_inscripcion")
+    queryset = Solicitud.objects.select_related("alumno__usuario", "zona")
     serializer_class = SolicitudSerializer
+    lectura_class = SolicitudLectura
+    ordering = ("fecha_inscripcion", "id")
+    presupuesto_consultas = {"list": 1, "retrieve": 1}
 
     def get_permissions(self):
-        if self.action in {"list", "retrieve", "update",
-                           "partial_update", "destroy"}:
-            return [permissions.IsAdminUser()]
-        return [permissions.IsAuthenticated()]
+        if self.action == "create":
+            return [permissions.IsAuthenticated()]
+        return [permissions.IsAdminUser()]
+
+    def perform_create(self, serializer):
+        rol = rol_de(self.request.user)
+        if not rol.es_alumno:
+            raise serializers.ValidationError(
+                "Solo los alumnos pueden crear solicitudes.")
+        serializer.save(alumno_id=rol.alumno_id)
 
     @action(
         detail=True,
@@ -50,20 +111,65 @@ class SolicitudViewSet(viewsets.ModelViewSet):
     )
     def invitar(self, request, pk=None):
         """
-        Marca la solicitud como INVITADA y,
-        opcionalmente, crea una reserva pendiente.
+        Marca la solicitud como INVITADA y, si hay plaza en una salida
+        futura compatible, crea la reserva correspondiente.
         """
         solicitud: Solicitud = self.get_object()
-        solicitud.estado = Solicitud.Estados.INVITADA
-        solicitud.save(update_fields=["estado", "updated_at"])
+        resultado = asignar_solicitudes(
+            solicitudes=Solicitud.objects.filter(pk=solicitud.pk))
+
+        if not resultado.asignadas:
+            solicitud.estado = Solicitud.Estados.INVITADA
+            solicitud.save(update_fields=["estado"])
+        salida_id = resultado.pares[0][1] if resultado.pares else None
+        return Response({"status": "invitada", "salida": salida_id},
+                        status=status.HTTP_200_OK)
 
-        # ↪️  Hook: aquí podrías generar automáticamente una Reserva pendiente
-        #          asociada a la salida disponible que definas en tu dominio.
-        return Response({"status": "invitada"}, status=status.HTTP_200_OK)
+    @action(
+        detail=False,
+        methods=["post"],
+        permission_classes=[permissions.IsAdminUser],
+        url_path="asignar",
+    )
+    def asignar(self, request):
+        """
+        Reparte todas las solicitudes abiertas entre las plazas libres.
+        Con `{"simular": true}` solo devuelve el informe.
+        """
+        # "false", "0", "no"... → False (bool("false") sería True)
+        simular = serializers.BooleanField().run_validation(
+            request.data.get("simular", False))
+        resultado = asignar_solicitudes(simular=simular)
+        return Response(resultado.as_dict(), status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        permission_classes=[permissions.IsAdminUser],
+        url_path="resultados",
+    )
+    def resultados(self, request):
+        """
+        Carga masiva de resultados de examen.
+        Acepta un fichero `archivo` (.csv o .jsonl) o una lista JSON de
+        objetos `{solicitud, fase, aprobado}`. Devuelve el informe por fila.
+        """
+        archivo = request.FILES.get("archivo")
+        if archivo is not None:
+            filas = leer_filas(archivo.file, archivo.name)
+        elif isinstance(request.data, list):
+            filas = request.data
+        else:
+            return Response(
+                {"error": "Envía un fichero 'archivo' o una lista de resultados."},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(resumen(registrar_resultados(filas)),
+                        status=status.HTTP_200_OK)
 
 
 # ═══════════════════════════════  SALIDAS  ═══════════════════════════════ #
-class SalidaDisponibleViewSet(viewsets.ModelViewSet):
+class SalidaDisponibleViewSet(RespuestaCacheadaMixin, viewsets.ModelViewSet):
     """
     Gestión de 'salidas' o turnos de examen práctico.
     - Profesores: pueden crear/editar las de su agenda.
@@ -71,74 +177,118 @@ class SalidaDisponibleViewSet(viewsets.ModelViewSet):
     - Alumnos: solo listan las que correspondan a su zona.
     """
     queryset = (SalidaDisponible.objects
-                .select_related("profesor", "zona"))
+                .select_related("profesor__usuario", "zona"))
     serializer_class = SalidaDisponibleSerializer
+    # Cursor sobre un campo único: por fecha habría decenas de salidas por
+    # valor y cada página saltaría con OFFSET dentro del día
+    ordering = ("id",)
+    # Las plazas cambian con cada reserva; la zona del alumno con sus solicitudes
+    cache_grupos = ("salidas", "zona_activa")
+    presupuesto_consultas = {"list": 1, "retrieve": 1}
+
+    def alcance_cache(self, request):
+        # El listado depende del día y de quién lo pide
+        user = request.user
+        quien = ("admin" if user.is_staff else
+                 f"profesor{rol_de(user).profesor_id}" if rol_de(user).es_profesor else
+                 f"usuario{user.pk}")
+        return f"{timezone.localdate()}:{quien}"
 
     def get_permissions(self):
         if self.action in {"create", "update", "partial_update", "destroy"}:
-            return [permissions.IsAdminUser | EsProfesor]
+            return [(permissions.IsAdminUser | EsProfesor)()]
         return [permissions.IsAuthenticated()]
 
+    def perform_create(self, serializer):
+        self._guardar(serializer)
+
+    def perform_update(self, serializer):
+        self._guardar(serializer)
+
+    def _guardar(self, serializer):
+        # Mismo bloqueo que generar_salidas, para no colarse entre su lectura
+        # y su INSERT; lo que choque aun así lo paran las restricciones
+        profesores = {p.pk for p in [serializer.validated_data.get("profesor")] if p}
+        if serializer.instance is not None:
+            profesores.add(serializer.instance.profesor_id)
+        try:
+            with transaction.atomic():
+                bloquear_profesores(profesores)
+                serializer.save()
+        except IntegrityError:
+            raise serializers.ValidationError(
+                "Otra petición cambió esta salida a la vez; vuelve a intentarlo.")
+
     def get_queryset(self):
         qs = super().get_queryset().filter(fecha__gte=timezone.now().date())
         user = self.request.user
 
-        if user.is_staff:
-            return qs
-        if hasattr(user, "profesor"):
-            return qs.filter(profesor=user.profesor)
+        if user.is_staff or rol_de(user).es_profesor:
+            return propios(qs, user)
 
-        # Alumno → filtra por zona de su última solicitud
-        ult_solicitud = (Solicitud.objects
-                         .filter(alumno=user)
-                         .order_by("-fecha_inscripcion")
-                         .first())
-        return qs.filter(zona=ult_solicitud.zona) if ult_solicitud else qs.none()
+        # Alumno → zona de su última solicitud, desnormalizada en
+        # Alumno.zona_activa: un JOIN en la misma consulta del listado
+        return qs.filter(zona__alumnos_activos__usuario=user)
 
 
 # ═══════════════════════════════  RESERVAS  ══════════════════════════════ #
-class ReservaViewSet(viewsets.ModelViewSet):
+class ReservaViewSet(ExportarMixin, ListadoRapidoMixin, viewsets.ModelViewSet):
     """
     Reserva de un alumno para una 'SalidaDisponible'.
     Acciones extra:
+      • GET /reservas/exportar/?formato=csv|xlsx
       • POST /reservas/{id}/confirmar/
       • POST /reservas/{id}/rechazar/
+      • DELETE /reservas/{id}/cancelar/
+    La plaza se ocupa y se libera en `practicas.services`.
     """
     queryset = (Reserva.objects
-                .select_related("alumno", "salida", "salida__profesor"))
+                .select_related("alumno", "salida__profesor__usuario", "salida__zona"))
     serializer_class = ReservaSerializer
+    lectura_class = ReservaLectura
+    ordering = ("created_at", "id")
     permission_classes = [permissions.IsAuthenticated]
+    # Las escrituras incluyen savepoints, el UPDATE del cupo y la lista de espera
+    presupuesto_consultas = {"list": 1, "retrieve": 1, "create": 13, "confirmar": 2,
+                             "rechazar": 12, "cancelar": 10, "destroy": 10}
 
-    # ---------- Queryset filtrado por rol -------------------------------- #
+    # ---------- Queryset filtrado por dueño ------------------------------- #
     def get_queryset(self):
-        user = self.request.user
-        if user.is_staff:
-            return super().get_queryset()
-        if hasattr(user, "profesor"):
-            return super().get_queryset().filter(salida__profesor=user.profesor)
-        return super().get_queryset().filter(alumno=user)
+        return propios(super().get_queryset(), self.request.user)
 
     # ---------- Crear ----------------------------------------------------- #
     def perform_create(self, serializer):
         salida = serializer.validated_data["salida"]
 
-        # 1) No reservar si ya hay una reserva para esa salida
-        if Reserva.objects.filter(salida=salida).exists():
-            raise serializers.ValidationError(
-                "Esta salida ya tiene una reserva asociada."
-            )
-
-        # 2) Evita que el profesor reserve su propia salida
-        if (hasattr(self.request.user, "profesor")
-                and salida.profesor == self.request.user.profesor):
+        # Evita que el profesor reserve su propia salida
+        if salida.profesor_id == rol_de(self.request.user).profesor_id:
             raise serializers.ValidationError(
                 "No puedes reservar tu propia salida."
             )
 
-        serializer.save(
-            alumno=self.request.user,
-            estado=Reserva.Estados.PENDIENTE,
-        )
+        try:
+            serializer.instance = reservar_plaza(salida, self.request.user)
+        except ReservaError as exc:
+            raise serializers.ValidationError(str(exc))
+
+    # ---------- Editar --------------------------------------------------- #
+    # Cambiar estado o salida a mano descuadraría `plazas_ocupadas`
+    def update(self, *a, **kw):
+        return Response({"detail": "Usa /confirmar/, /rechazar/ o /cancelar/"},
+                        status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    partial_update = update
+
+    # ---------- Cancelar / borrar ----------------------------------------- #
+    def perform_destroy(self, instance):
+        try:
+            cancelar_reserva(instance)
+        except ReservaError as exc:
+            raise serializers.ValidationError(str(exc))
+
+    @action(detail=True, methods=["delete"], url_path="cancelar")
+    def cancelar(self, request, pk=None):
+        self.perform_destroy(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     # ---------- Confirmar ------------------------------------------------- #
     @action(
@@ -174,6 +324,48 @@ class ReservaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        reserva.estado = Reserva.Estados.RECHAZADA
-        reserva.save(update_fields=["estado", "updated_at"])
+        try:
+            rechazar_reserva(reserva)
+        except ReservaError as exc:
+            return Response({"error": str(exc)},
+                            status=status.HTTP_400_BAD_REQUEST)
         return Response(self.get_serializer(reserva).data)
+
+
+# ════════════════════════════════  AGENDA  ═══════════════════════════════ #
+class AgendaViewSet(viewsets.ViewSet):
+    """
+    Día o semana de un profesor con clases, huecos y salidas de examen.
+    Parámetros: `profesor` (solo staff; un profesor ve la suya), `desde` y
+    `hasta` como AAAA-MM-DD, ambos incluidos. Por defecto, la semana que
+    empieza hoy.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    # Clases, huecos libres y salidas (con sus reservas)
+    presupuesto_consultas = {"list": 3}
+
+    def list(self, request):
+        params = request.query_params
+        user = request.user
+
+        if user.is_staff:
+            profesor_id = params.get("profesor")
+            if not profesor_id or not profesor_id.isdigit():
+                raise serializers.ValidationError(
+                    {"profesor": "Indica el id numérico del profesor."})
+            profesor_id = int(profesor_id)
+        else:
+            profesor_id = rol_de(user).profesor_id
+            if profesor_id is None:
+                return Response({"error": "Solo los profesores tienen agenda."},
+                                status=status.HTTP_403_FORBIDDEN)
+
+        primer_dia = _dia_param(params, "desde") or timezone.localdate()
+        ultimo_dia = (_dia_param(params, "hasta")
+                      or primer_dia + timedelta(days=DIAS_AGENDA - 1))
+        if not 0 <= (ultimo_dia - primer_dia).days < MAX_DIAS_AGENDA:
+            raise serializers.ValidationError({"hasta": (
+                "El rango debe ir hacia delante y durar "
+                f"{MAX_DIAS_AGENDA} días como mucho.")})
+
+        return Response(construir_agenda(profesor_id, primer_dia, ultimo_dia))
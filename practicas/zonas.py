@@ -0,0 +1,203 @@
+# practicas/zonas.py
+"""
+Normalización y resolución de nombres de zona.
+
+Los datos de entrada escriben el mismo municipio de varias formas
+('Ejido', 'El ejido', 'EL EJIDO'). `normalizar` reduce cada nombre a una
+clave sin tildes, mayúsculas ni artículos iniciales, y la tabla
+`ZonaAlias` asocia cada clave a una única `Zona`.
+
+El mapa clave → zona_id se carga entero en memoria con una consulta y se
+mantiene al día con las señales de `ZonaAlias` (ver `CacheLocal`).
+"""
+import re
+import unicodedata
+
+from django.db import IntegrityError, transaction
+
+from backend.cache import CacheLocal, invalidar as invalidar_cache_api
+
+ARTICULOS = {'el', 'la', 'los', 'las', 'l'}
+
+
+def normalizar(nombre):
+    """'  Las Norias ' → 'norias'; 'Albuñol' → 'albunol'."""
+    texto = unicodedata.normalize('NFKD', nombre or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    palabras = re.sub(r'[^a-z0-9]+', ' ', texto.lower()).split()
+    while len(palabras) > 1 and palabras[0] in ARTICULOS:
+        palabras.pop(0)
+    return ' '.join(palabras)
+
+
+def nombre_canonico(nombre):
+    return ' '.join((nombre or '').split()).capitalize()
+
+
+def _cargar():
+    from .models import ZonaAlias
+    return dict(ZonaAlias.objects.values_list('clave', 'zona_id'))
+
+
+_claves = CacheLocal(_cargar)
+invalidar = _claves.invalidar
+
+
+def mapa_claves():
+    """Mapa clave → zona_id, cargado con una sola consulta."""
+    return _claves.obtener()
+
+
+def resolver(nombre, crear=False):
+    """
+    Devuelve el id de la zona que corresponde a `nombre`, o None.
+    Con `crear=True` da de alta la zona (y su alias) si no existe.
+    """
+    clave = normalizar(nombre)
+    if not clave:
+        return None
+    zona_id = mapa_claves().get(clave)
+    if zona_id is None and crear:
+        zona_id = _crear(nombre, clave)
+    return zona_id
+
+
+def _crear(nombre, clave):
+    from .models import Zona, ZonaAlias
+
+    try:
+        with transaction.atomic():
+            zona, _ = Zona.objects.get_or_create(nombre=nombre_canonico(nombre))
+            alias, _ = ZonaAlias.objects.get_or_create(
+                clave=clave, defaults={'nombre': nombre, 'zona': zona})
+    except IntegrityError:
+        # Otro proceso creó la misma zona a la vez
+        alias = ZonaAlias.objects.get(clave=clave)
+    mapa_claves()[clave] = alias.zona_id
+    return alias.zona_id
+
+
+def resolver_varios(nombres, crear=False):
+    """
+    `resolver` para muchos nombres a la vez: {nombre: zona_id o None}.
+    Con `crear=True` las zonas que faltan se dan de alta juntas, con un
+    bulk_create de zonas y otro de alias, sean cuantas sean.
+    """
+    claves = {nombre: normalizar(nombre) for nombre in nombres}
+    mapa = mapa_claves()
+    faltan = {}
+    for nombre, clave in claves.items():
+        if clave and clave not in mapa:
+            faltan.setdefault(clave, nombre)
+    if faltan and crear:
+        _crear_varios(faltan)
+    mapa = mapa_claves()
+    return {nombre: mapa.get(clave) for nombre, clave in claves.items()}
+
+
+def _crear_varios(faltan):
+    from .models import Zona, ZonaAlias
+
+    canonicos = {clave: nombre_canonico(nombre) for clave, nombre in faltan.items()}
+    with transaction.atomic():
+        # Lo que otro proceso cree a la vez se queda: después se relee
+        Zona.objects.bulk_create(
+            [Zona(nombre=n) for n in set(canonicos.values())], ignore_conflicts=True)
+        ids = dict(Zona.objects.filter(nombre__in=canonicos.values())
+                   .values_list('nombre', 'id'))
+        ZonaAlias.objects.bulk_create(
+            [ZonaAlias(clave=clave, nombre=nombre, zona_id=ids[canonicos[clave]])
+             for clave, nombre in faltan.items()],
+            ignore_conflicts=True)
+        creadas = dict(ZonaAlias.objects.filter(clave__in=faltan)
+                       .values_list('clave', 'zona_id'))
+    mapa_claves().update(creadas)
+    # bulk_create no lanza señales
+    invalidar_cache_api('zonas')
+
+
+# ───────────── Receptores de señales (ver practicas.signals) ───────────── #
+def alias_guardado(instance, **kwargs):
+    if _claves.cargado:
+        mapa_claves()[instance.clave] = instance.zona_id
+
+
+def alias_borrado(instance, **kwargs):
+    if _claves.cargado:
+        mapa_claves().pop(instance.clave, None)
+
+
+# ─────────────── Zona activa de cada alumno ─────────────── #
+def actualizar_zona_activa(alumno_ids):
+    """
+    Copia en `Alumno.zona_activa` la zona de la última solicitud de cada
+    alumno: un único UPDATE con subconsulta por lote.
+    """
+    from django.db.models import OuterRef, Subquery
+    from usuarios.models import Alumno
+    from .models import Solicitud
+
+    ultima = (Solicitud.objects
+              .filter(alumno_id=OuterRef('pk'))
+              .order_by('-fecha_inscripcion', '-id')
+              .values('zona_id')[:1])
+    alumno_ids = list(alumno_ids)
+    for i in range(0, len(alumno_ids), 500):
+        Alumno.objects.filter(pk__in=alumno_ids[i:i + 500]).update(
+            zona_activa=Subquery(ultima))
+    invalidar_cache_api('zona_activa')
+
+
+# ─────────────── Fusión de zonas duplicadas ─────────────── #
+def duplicados():
+    """
+    Mapa zona_id → zona_id destino de las zonas cuyo nombre resuelve,
+    por su clave o por un alias, a otra zona.
+    """
+    from .models import Zona, ZonaAlias
+
+    alias = dict(ZonaAlias.objects.values_list('clave', 'zona_id'))
+    destinos = {}
+    for zona_id, nombre in Zona.objects.values_list('id', 'nombre'):
+        destino = alias.get(normalizar(nombre))
+        if destino is not None and destino != zona_id:
+            destinos[zona_id] = destino
+
+    # Cadenas A → B → C: todo apunta al final
+    for zona_id in destinos:
+        destino, vistos = destinos[zona_id], {zona_id}
+        while destino in destinos and destino not in vistos:
+            vistos.add(destino)
+            destino = destinos[destino]
+        destinos[zona_id] = destino
+    return {z: d for z, d in destinos.items() if z != d}
+
+
+def fusionar(destinos):
+    """
+    Reapunta en bloque todas las claves ajenas a las zonas duplicadas
+    (un UPDATE por modelo y destino) y borra los duplicados. Devuelve
+    las filas movidas por modelo.
+    """
+    from .models import Zona
+
+    por_destino = {}
+    for zona_id, destino in destinos.items():
+        por_destino.setdefault(destino, []).append(zona_id)
+
+    movidas = {}
+    with transaction.atomic():
+        # Zona.solicitudes, Zona.salidas, Zona.alias... y cualquier FK nueva
+        for rel in Zona._meta.related_objects:
+            if not (rel.one_to_many or rel.one_to_one):
+                continue
+            modelo, campo = rel.related_model, rel.field.name
+            for destino, origenes in por_destino.items():
+                n = modelo.objects.filter(**{f'{campo}__in': origenes}).update(
+                    **{campo: destino})
+                if n:
+                    movidas[modelo._meta.label] = movidas.get(modelo._meta.label, 0) + n
+        Zona.objects.filter(pk__in=destinos).delete()
+    invalidar()
+    invalidar_cache_api('zonas', 'salidas', 'zona_activa')
+    return movidas
@@ -0,0 +1,39 @@
+# usuarios/authentication.py
+"""
+Autenticación JWT sin consulta por petición.
+
+Si el token trae los claims de rol, el usuario se construye a partir de
+ellos sin leer la fila de `User`: tiene id, username, rol e is_staff, y el
+`Rol` ya resuelto. Sirve para permisos, filtros y como clave foránea; el
+resto de campos están vacíos, así que quien necesite el perfil completo
+(p. ej. /users/yo/) debe leerlo.
+
+Un usuario desactivado, o al que se le cambia el rol o is_staff, conserva
+lo que dice su token de acceso hasta que caduca (ACCESS_TOKEN_LIFETIME).
+El refresco sí comprueba la base de datos: rechaza a los usuarios
+inactivos y emite el nuevo token con los claims leídos de nuevo
+(`TokenRefrescoConRolSerializer`), no con los del token de refresco.
+Los tokens sin claims siguen el camino normal de simplejwt.
+"""
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .roles import desde_claims
+
+
+class JWTConRol(JWTAuthentication):
+    def get_user(self, validated_token):
+        if 'rol' not in validated_token:
+            return super().get_user(validated_token)
+
+        user = User(
+            id=validated_token[api_settings.USER_ID_CLAIM],
+            username=validated_token.get('username', ''),
+            rol=validated_token['rol'],
+            is_staff=bool(validated_token.get('is_staff')),
+            is_active=True,
+        )
+        user._state.adding = False
+        user._rol = desde_claims(validated_token)
+        return user
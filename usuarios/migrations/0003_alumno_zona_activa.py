@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 07:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def rellenar_zona_activa(apps, schema_editor):
+    Alumno = apps.get_model('usuarios', 'Alumno')
+    Solicitud = apps.get_model('practicas', 'Solicitud')
+    ultima = (Solicitud.objects
+              .filter(alumno_id=OuterRef('pk'))
+              .order_by('-fecha_inscripcion', '-id')
+              .values('zona_id')[:1])
+    Alumno.objects.update(zona_activa=Subquery(ultima))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practicas', '0011_salidarecurrente'),
+        ('usuarios', '0002_alumno_address_alumno_city_alumno_genero_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alumno',
+            name='zona_activa',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alumnos_activos', to='practicas.zona'),
+        ),
+        migrations.RunPython(rellenar_zona_activa, migrations.RunPython.noop),
+    ]
@@ -96,6 +96,13 @@ class Alumno(models.Model):
                  ('O', _('Otro'))],
         blank=True, null=True,
     )
+    # Zona de la última solicitud; la mantienen las señales de practicas
+    zona_activa = models.ForeignKey(
+        'practicas.Zona',
+        on_delete=models.SET_NULL,
+        related_name='alumnos_activos',
+        blank=True, null=True, editable=False,
+    )
 
     # -------------------------------------------------------------------
     # 3️⃣  Rol del usuario (no editable por el propio usuario)
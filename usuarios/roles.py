@@ -0,0 +1,79 @@
+# usuarios/roles.py
+"""
+Rol del usuario de la petición, resuelto una sola vez.
+
+Los tokens JWT llevan el rol y los ids de perfil como claims
+(`usuarios.serializers.TokenConRolSerializer`) y `JWTConRol` deja el `Rol`
+ya montado en el usuario: ni la autenticación ni los permisos consultan
+la base de datos. Cada refresco vuelve a leer los claims
+(`TokenRefrescoConRolSerializer`), así que un cambio de rol tarda como
+mucho ACCESS_TOKEN_LIFETIME en aplicarse.
+
+Sin esos claims (admin de Django, force_authenticate, tokens emitidos antes
+del cambio) el rol se lee de `User.rol` y el id del perfil de su relación
+inversa, como mucho una consulta, y queda guardado en el propio usuario
+hasta el final de la petición.
+"""
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Rol:
+    es_staff: bool = False
+    profesor_id: int | None = None
+    alumno_id: int | None = None
+
+    @property
+    def es_profesor(self):
+        return self.profesor_id is not None
+
+    @property
+    def es_alumno(self):
+        return self.alumno_id is not None
+
+    @property
+    def nombre(self):
+        return ('admin' if self.es_staff else
+                'profesor' if self.es_profesor else
+                'alumno')
+
+
+ANONIMO = Rol()
+
+
+def _leer(user):
+    if not user.is_authenticated:
+        return ANONIMO
+    profesor = getattr(user, 'perfil_profesor', None) if user.is_profesor else None
+    alumno = getattr(user, 'perfil_alumno', None) if user.is_alumno else None
+    return Rol(es_staff=user.is_staff,
+               profesor_id=profesor and profesor.id,
+               alumno_id=alumno and alumno.id)
+
+
+def rol_de(user):
+    """`Rol` de `user`, calculado la primera vez y guardado en él."""
+    rol = getattr(user, '_rol', None)
+    if rol is None:
+        rol = _leer(user)
+        if user.is_authenticated:
+            user._rol = rol
+    return rol
+
+
+def claims(user):
+    """Claims de rol que se añaden a los tokens de `user`."""
+    rol = rol_de(user)
+    return {
+        'rol': user.rol,
+        'is_staff': user.is_staff,
+        'profesor_id': rol.profesor_id,
+        'alumno_id': rol.alumno_id,
+        'username': user.username,
+    }
+
+
+def desde_claims(token):
+    return Rol(es_staff=bool(token.get('is_staff')),
+               profesor_id=token.get('profesor_id'),
+               alumno_id=token.get('alumno_id'))
@@ -1,6 +1,14 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
 
 from .models import User, Profesor, Alumno
+from .roles import claims
 
 
 # ═══════════════════════════  USER  ════════════════════════════ #
@@ -114,3 +122,39 @@ class AlumnoSerializer(_ProfileSerializerMixin):
         user_data["rol"] = User.Roles.ALUMNO
         user = UserSerializer().create(user_data)
         return Alumno.objects.create(usuario=user, **validated_data)
+
+
+# ═════════════════════════  TOKEN JWT  ══════════════════════════ #
+class TokenConRolSerializer(TokenObtainPairSerializer):
+    """Tokens con el rol y los ids de perfil (ver `usuarios.roles`)."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for clave, valor in claims(user).items():
+            token[clave] = valor
+        return token
+
+
+class TokenRefrescoConRolSerializer(TokenRefreshSerializer):
+    """
+    simplejwt copia los claims del token de refresco al nuevo token de
+    acceso; aquí se vuelven a leer de la base de datos, para que un cambio
+    de rol o de is_staff se aplique en el siguiente refresco y no al
+    caducar el token de refresco.
+    """
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        user = (User.objects
+                .select_related('perfil_profesor', 'perfil_alumno')
+                .filter(pk=access[api_settings.USER_ID_CLAIM])
+                .first())
+        if user is None:
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'], 'no_active_account')
+        for clave, valor in claims(user).items():
+            access[clave] = valor
+        data['access'] = str(access)
+        return data
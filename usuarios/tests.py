@@ -1,3 +1,71 @@
 from django.test import TestCase
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from citas.models import HorarioDisponible
+from .models import User, Profesor, Alumno
+
+
+class TokenConRolTests(TestCase):
+    """Los tokens llevan el rol y la API no vuelve a leer el usuario."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='profe', password='1234', rol=User.Roles.PROFESOR)
+        self.profesor = Profesor.objects.create(usuario=self.user)
+        otro = Profesor.objects.create(usuario=User.objects.create(
+            username='otro', rol=User.Roles.PROFESOR))
+        manana = timezone.now() + timedelta(days=1)
+        for profesor in (self.profesor, otro):
+            HorarioDisponible.objects.create(profesor=profesor, fecha_hora_inicio=manana)
+        self.client = APIClient()
+
+    def _login(self, username, password='1234'):
+        response = self.client.post(
+            '/api/v1/token/', {'username': username, 'password': password})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_claims_de_rol(self):
+        alumno = Alumno.objects.create(usuario=User.objects.create_user(
+            username='600000001', password='1234'))
+        token = AccessToken(self._login('600000001')['access'])
+        self.assertEqual(
+            (token['rol'], token['alumno_id'], token['profesor_id'], token['is_staff']),
+            ('A', alumno.id, None, False))
+
+        tokens = self._login('profe')
+        self.assertEqual(AccessToken(tokens['access'])['profesor_id'], self.profesor.id)
+        response = self.client.post('/api/v1/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(AccessToken(response.data['access'])['profesor_id'], self.profesor.id)
+
+    def test_refresco_relee_el_rol(self):
+        tokens = self._login('profe')
+        User.objects.filter(pk=self.user.pk).update(is_staff=True, rol=User.Roles.ALUMNO)
+        self.profesor.delete()
+        alumno = Alumno.objects.create(usuario=self.user)
+
+        response = self.client.post('/api/v1/token/refresh/', {'refresh': tokens['refresh']})
+        access = AccessToken(response.data['access'])
+        self.assertEqual(
+            (access['rol'], access['is_staff'], access['profesor_id'], access['alumno_id']),
+            ('A', True, None, alumno.id))
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post('/api/v1/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_peticion_sin_consultas_de_autenticacion(self):
+        access = self._login('profe')['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with self.assertNumQueries(1):  # solo el listado
+            response = self.client.get('/api/v1/horarios-disponibles/')
+        self.assertEqual(
+            [h['id'] for h in response.data['results']],
+            list(self.profesor.horarios.values_list('id', flat=True)))
+
+        response = self.client.get('/api/v1/users/yo/')
+        self.assertEqual((response.data['username'], response.data['rol']),
+                         ('profe', 'profesor'))
@@ -4,6 +4,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from .models import User, Profesor, Alumno
+from .roles import rol_de
 from .serializers import UserSerializer, ProfesorSerializer, AlumnoSerializer
 
 
@@ -15,6 +16,8 @@ class UserViewSet(viewsets.ModelViewSet):
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    ordering = ("date_joined", "id")
+    presupuesto_consultas = {"list": 1, "retrieve": 1, "yo": 1}
     # ← por defecto solo admins
     # permission_classes = [permissions.IsAdminUser]
 
@@ -31,13 +34,9 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         Devuelve el propio usuario autenticado con un campo extra 'rol'.
         """
-        user = request.user
-        rol = (
-            "admin" if user.is_staff else
-            "profesor" if hasattr(user, "profesor") else
-            "alumno"
-        )
-        data = self.get_serializer(user).data | {"rol": rol}
+        # Con JWT el usuario de la petición solo trae los claims: se lee la fila
+        user = User.objects.get(pk=request.user.pk)
+        data = self.get_serializer(user).data | {"rol": rol_de(request.user).nombre}
         return Response(data)
 
 
@@ -57,6 +56,7 @@ class AlumnoViewSet(viewsets.ModelViewSet):
     """
     queryset = Alumno.objects.select_related("usuario")
     serializer_class = AlumnoSerializer
+    presupuesto_consultas = {"list": 1, "retrieve": 1}
 
     def get_permissions(self):
         if self.action == 'create':